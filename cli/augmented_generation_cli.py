@@ -1,6 +1,34 @@
 import argparse
 
-from lib.augmented_generation import citations_command, question_command, rag_command, summarize_command
+from lib.augmented_generation import PROMPT_BUILDERS, citations_command, question_command, rag_command, session_command, stream_command, summarize_command
+from lib.search_utils import RAG_CONTEXT_TOKEN_BUDGET
+from lib.tracing import add_profile_arguments, profiled
+
+STREAM_HEADINGS = {
+    "rag": "RAG Response:",
+    "summarize": "LLM Summary:",
+    "citations": "LLM Answer:",
+    "question": "Answer:",
+}
+
+
+def print_stream(command: str, query: str, limit: int, token_budget: int) -> None:
+    for event in stream_command(command, query, limit, token_budget):
+        match event["type"]:
+            case "error":
+                print(event["error"])
+            case "search_results":
+                print("Search Results:")
+                for result in event["search_results"]:
+                    print(f"- {result['title']}")
+                print(STREAM_HEADINGS[command])
+            case "token":
+                print(event["text"], end="", flush=True)
+            case "done":
+                print()
+                print(
+                    f"\nRetrieval: {event['retrieval_ms']:.0f}ms, first token: {event['time_to_first_token_ms']:.0f}ms, total: {event['total_ms']:.0f}ms"
+                )
 
 
 def main():
@@ -11,6 +39,9 @@ def main():
         "rag", help="Perform RAG (search + generate answer)"
     )
     rag_parser.add_argument("query", type=str, help="Search query for RAG")
+    rag_parser.add_argument(
+        "--stream", action="store_true", help="Stream the answer as it is generated"
+    )
 
     summarize_parser = subparsers.add_parser(
         "summarize", help="Summarize search results"
@@ -21,6 +52,9 @@ def main():
     summarize_parser.add_argument(
         "--limit", type=int, default=5, help="Limit the number of results to summarize"
     )
+    summarize_parser.add_argument(
+        "--stream", action="store_true", help="Stream the answer as it is generated"
+    )
 
     citations_parser = subparsers.add_parser(
         "citations", help="Get a list of citations for the query"
@@ -29,44 +63,110 @@ def main():
     citations_parser.add_argument(
         "--limit", type=int, default=5, help="Limit the number of results to cite"
     )
+    citations_parser.add_argument(
+        "--stream", action="store_true", help="Stream the answer as it is generated"
+    )
 
     question_parser = subparsers.add_parser(
         "question", help="Answer a user question"
     )
     question_parser.add_argument("query", type=str, help="User question")
     question_parser.add_argument("--limit", type=int, default=5, help="Limit the number of results")
+    question_parser.add_argument(
+        "--stream", action="store_true", help="Stream the answer as it is generated"
+    )
+
+    session_parser = subparsers.add_parser(
+        "session", help="Run several generation modes over one shared retrieval"
+    )
+    session_parser.add_argument("query", type=str, help="Search query")
+    session_parser.add_argument(
+        "--modes",
+        type=str,
+        nargs="+",
+        choices=list(PROMPT_BUILDERS),
+        default=["rag", "citations", "summarize"],
+        help="Generation modes to run concurrently",
+    )
+    session_parser.add_argument("--limit", type=int, default=5, help="Limit the number of results")
+
+    for subparser in (
+        rag_parser,
+        summarize_parser,
+        citations_parser,
+        question_parser,
+        session_parser,
+    ):
+        subparser.add_argument(
+            "--token-budget",
+            type=int,
+            default=RAG_CONTEXT_TOKEN_BUDGET,
+            help="Maximum estimated prompt tokens spent on retrieved context",
+        )
+
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
+    with profiled(args):
+        run(args, parser)
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
+    limit = getattr(args, "limit", 5)
+
+    if getattr(args, "stream", False):
+        print_stream(args.command, args.query, limit, args.token_budget)
+        return
 
     match args.command:
         case "question":
-            results = question_command(args.query)
+            results = question_command(args.query, limit, args.token_budget)
             print("Search Results:")
             for result in results["search_results"]:
                 print(f"- {result['title']}")
             print("Answer:")
             print(results["answer"])
         case "citations":
-            results = citations_command(args.query)
+            results = citations_command(args.query, limit, args.token_budget)
             print("Search Results:")
             for result in results["search_results"]:
                 print(f"- {result['title']}")
             print("LLM Answer:")
             print(results["citations"])
         case "summarize":
-            results = summarize_command(args.query)
+            results = summarize_command(args.query, limit, args.token_budget)
             print("Search Results:")
             for result in results["search_results"]:
                 print(f"- {result['title']}")
             print("LLM Summary:")
             print(results["summary"])
         case "rag":
-            results = rag_command(args.query)
+            results = rag_command(args.query, limit, args.token_budget)
             print("Search Results:")
             for result in results["search_results"]:
                 print(f"- {result['title']}")
             print("RAG Response:")
             print(results["answer"])
+        case "session":
+            results = session_command(
+                args.query, args.modes, limit, args.token_budget
+            )
+            if "error" in results:
+                print(results["error"])
+                return
+            print("Search Results:")
+            for result in results["search_results"]:
+                print(f"- {result['title']}")
+            for mode in args.modes:
+                print()
+                print(STREAM_HEADINGS[mode])
+                if mode in results["answers"]:
+                    print(results["answers"][mode])
+                else:
+                    print(f"Failed: {results['errors'][mode]}")
+            print(
+                f"\nRetrieval: {results['retrieval_ms']:.0f}ms, generation: {results['generation_ms']:.0f}ms"
+            )
         case _:
             parser.print_help()
 
@@ -0,0 +1,69 @@
+import argparse
+import sys
+
+from lib.benchmark import benchmark_command
+from lib.search_utils import (BENCHMARK_EMBEDDING_DIM,
+                              BENCHMARK_REGRESSION_THRESHOLD, BENCHMARK_SIZES)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval Benchmark CLI")
+    parser.add_argument(
+        "--sizes",
+        type=int,
+        nargs="+",
+        default=BENCHMARK_SIZES,
+        help="Synthetic catalog sizes to benchmark (pass 1000000 explicitly for the 1M run)",
+    )
+    parser.add_argument(
+        "--dim",
+        type=int,
+        default=BENCHMARK_EMBEDDING_DIM,
+        help="Fake embedding dimension",
+    )
+    parser.add_argument(
+        "-k",
+        "--only",
+        type=str,
+        nargs="+",
+        help="Only run benchmarks whose name contains one of these strings",
+    )
+    parser.add_argument("--output", type=str, help="Path to write JSON results")
+    parser.add_argument(
+        "--baseline", type=str, help="Baseline JSON results to compare against"
+    )
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=BENCHMARK_REGRESSION_THRESHOLD,
+        help="Relative median slowdown that counts as a regression",
+    )
+
+    args = parser.parse_args()
+    results = benchmark_command(
+        args.sizes, args.dim, args.only, args.output, args.baseline, args.threshold
+    )
+    print(f"Results written to {results['output']}")
+
+    if results["comparison"] is None:
+        return
+
+    print()
+    print(f"Comparison against {args.baseline}:")
+    regressions = 0
+    for row in results["comparison"]:
+        if row["status"] == "new":
+            print(f"- {row['name']} @ {row['size']}: new")
+            continue
+        print(
+            f"- {row['name']} @ {row['size']}: {row['baseline_ms']:.3f}ms -> {row['current_ms']:.3f}ms ({row['ratio']:.2f}x, {row['status']})"
+        )
+        regressions += row["status"] == "regression"
+
+    if regressions:
+        print(f"{regressions} regression(s) above {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
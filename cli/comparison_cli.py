@@ -0,0 +1,83 @@
+import argparse
+import json
+
+from lib.comparison import compare_command
+from lib.search_utils import DEFAULT_SEARCH_LIMIT
+from lib.tracing import add_profile_arguments, profiled
+
+
+def format_value(value, signed: bool = False) -> str:
+    if value is None:
+        return "n/a"
+    return f"{value:+.4f}" if signed else f"{value:.4f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Retrieval A/B Comparison CLI")
+    parser.add_argument(
+        "--a",
+        type=str,
+        default="",
+        help="Baseline config, e.g. method=rrf,k=60,k1=1.5,b=0.75,depth=2500",
+    )
+    parser.add_argument(
+        "--b",
+        type=str,
+        default="",
+        help="Candidate config, e.g. method=weighted,alpha=0.3",
+    )
+    parser.add_argument(
+        "--limit", type=int, default=DEFAULT_SEARCH_LIMIT, help="Rank cutoff k"
+    )
+    parser.add_argument(
+        "--query-log",
+        type=str,
+        help="Query log to compare on (defaults to the golden dataset queries)",
+    )
+    parser.add_argument("--output", type=str, help="Path to write JSON results")
+    add_profile_arguments(parser)
+
+    args = parser.parse_args()
+    with profiled(args):
+        try:
+            results = compare_command(args.a, args.b, args.limit, args.query_log)
+        except ValueError as e:
+            parser.error(str(e))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    for name in ("a", "b"):
+        config = results["configs"][name]
+        settings = ", ".join(f"{key}={value}" for key, value in config.items())
+        print(f"{name.upper()}: {settings}")
+    print()
+
+    k = results["limit"]
+    overlap = results["overlap"]
+    print(f"Rank overlap over {results['queries']} queries:")
+    print(f"- Jaccard@{k}: {format_value(overlap['jaccard'])}")
+    print(f"- RBO: {format_value(overlap['rbo'])}")
+    print(f"- Kendall tau: {format_value(overlap['kendall_tau'])}")
+
+    latency = results["latency"]
+    print("Latency:")
+    print(f"- p50 shared retrieval: {latency['shared_p50_ms']:.2f}ms")
+    print(
+        f"- p50 config-specific A: {latency['a_p50_ms']:.2f}ms, B: {latency['b_p50_ms']:.2f}ms"
+    )
+    print(
+        f"- delta mean: {latency['delta_mean_ms']:+.2f}ms, p95: {latency['delta_p95_ms']:+.2f}ms"
+    )
+
+    quality = results["quality"]
+    print("Golden dataset quality (A -> B):")
+    for metric in quality["a"]:
+        print(
+            f"- {metric}@{k}: {format_value(quality['a'][metric])} -> {format_value(quality['b'][metric])} ({format_value(quality['delta'][metric], signed=True)})"
+        )
+
+
+if __name__ == "__main__":
+    main()
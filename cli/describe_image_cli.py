@@ -5,6 +5,7 @@ import os
 from dotenv import load_dotenv
 from google import genai
 from google.genai import types
+from lib.tracing import add_profile_arguments, profiled, span
 
 load_dotenv()
 api_key = os.environ.get("GEMINI_API_KEY")
@@ -19,6 +20,8 @@ def main():
         "--query", type=str, help="Text query to rewrite based on image"
     )
 
+    add_profile_arguments(parser)
+
     args = parser.parse_args()
 
     mime, _ = mimetypes.guess_type(args.image)
@@ -40,7 +43,8 @@ def main():
         args.query.strip(),
     ]
 
-    response = client.models.generate_content(model=model, contents=parts)
+    with profiled(args), span("llm.generate"):
+        response = client.models.generate_content(model=model, contents=parts)
     assert response.text
     print(f"Rewritten query: {response.text.strip()}")
     if response.usage_metadata is not None:
@@ -1,6 +1,7 @@
 import argparse
 
 from lib.evaluation import evaluate_result
+from lib.tracing import add_profile_arguments, profiled
 
 
 def main():
@@ -11,18 +12,39 @@ def main():
         default=5,
         help="Number of results to evaluate (k for precision@k, recall@k)",
     )
+    parser.add_argument(
+        "--refresh", action="store_true", help="Re-run retrieval legs instead of using the cache"
+    )
+
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
     limit = args.limit
-    results = evaluate_result(limit)
+    with profiled(args):
+        results = evaluate_result(limit, refresh=args.refresh)
 
     print(f"k={limit}")
+    source = "cached" if results["cached"] else "fresh"
+    print(
+        f"Retrieval legs ({source}) for {results['test_cases_count']} queries: {results['retrieval_seconds']:.2f}s"
+    )
+    latency = results["latency_ms"]
+    print(
+        f"Latency per query: p50 {latency['p50']:.1f}ms, p95 {latency['p95']:.1f}ms, p99 {latency['p99']:.1f}ms, max {latency['max']:.1f}ms"
+    )
+    summary = results["summary"]
+    if summary:
+        print(
+            f"Mean: Precision@{limit} {summary['precision']:.4f}, Recall@{limit} {summary['recall']:.4f}, F1 {summary['f1']:.4f}, MRR {summary['mrr']:.4f}, nDCG@{limit} {summary['ndcg']:.4f}"
+        )
     print()
     for query, result in results["results"].items():
         print(f"- Query: {query}")
         print(f"  - Precision@{limit}: {result["precision"]:.4f}")
         print(f"  - Recall@{limit}: {result["recall"]:.4f}")
         print(f"  - F1 Score: {result["f1"]:.4f}")
+        print(f"  - MRR: {result["mrr"]:.4f}")
+        print(f"  - nDCG@{limit}: {result["ndcg"]:.4f}")
         print(f"  - Retrieved: {result["retrieved"]}")
         print(f"  - Relevant: {result["relevant"]}")
         print()
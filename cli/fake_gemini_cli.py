@@ -0,0 +1,39 @@
+import argparse
+
+from lib.fake_gemini import FakeGeminiServer
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fake Gemini Server CLI")
+    parser.add_argument("--port", type=int, default=8089, help="Port to listen on")
+    parser.add_argument(
+        "--latency", type=float, default=0.0, help="Seconds to wait per request"
+    )
+    parser.add_argument(
+        "--failure-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of requests answered with HTTP 503",
+    )
+    parser.add_argument(
+        "--chunk-latency",
+        type=float,
+        default=0.0,
+        help="Seconds to wait between streamed chunks",
+    )
+
+    args = parser.parse_args()
+
+    server = FakeGeminiServer(
+        args.port, args.latency, args.failure_rate, chunk_latency=args.chunk_latency
+    )
+    print(f"Fake Gemini listening on {server.base_url}")
+    print(f"Point the CLIs at it with GEMINI_BASE_URL={server.base_url}")
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import argparse
+import json
+
+from lib.footprint import FOOTPRINT_COMPONENTS, footprint_command
+
+
+def megabytes(value) -> str:
+    if value is None:
+        return "n/a"
+    return f"{value / (1024 * 1024):.1f}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Memory Footprint CLI")
+    parser.add_argument(
+        "--components",
+        type=str,
+        nargs="+",
+        choices=FOOTPRINT_COMPONENTS,
+        help="Components to load and measure (default: all)",
+    )
+    parser.add_argument(
+        "--format",
+        type=str,
+        choices=["table", "json"],
+        default="table",
+        help="Output format",
+    )
+
+    args = parser.parse_args()
+    results = footprint_command(args.components)
+
+    if args.format == "json":
+        print(json.dumps(results, indent=2))
+        return
+
+    print(
+        f"{'Component':<18} {'RSS delta':>10} {'Python':>10} {'Arrays':>10} {'Mapped':>10} {'Model':>10}  (MB)"
+    )
+    for row in results["components"]:
+        print(
+            f"{row['component']:<18} {megabytes(row['rss_delta_bytes']):>10} {megabytes(row.get('python_bytes')):>10} {megabytes(row.get('array_bytes')):>10} {megabytes(row.get('mapped_bytes')):>10} {megabytes(row.get('model_bytes')):>10}"
+        )
+    print(
+        f"\nProcess RSS: {megabytes(results['start_rss_bytes'])}MB -> {megabytes(results['end_rss_bytes'])}MB"
+    )
+
+    if results["mapped_files"]:
+        print("\nMapped cache files (MB):")
+        for path, pages in sorted(results["mapped_files"].items()):
+            print(
+                f"- {path}: resident {megabytes(pages['rss_bytes'])}, shared {megabytes(pages['shared_bytes'])}, private {megabytes(pages['private_bytes'])}"
+            )
+
+
+if __name__ == "__main__":
+    main()
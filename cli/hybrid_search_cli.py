@@ -1,9 +1,16 @@
 import argparse
 
 from lib.evaluation import llm_evaluation
-from lib.hybrid_search import (normalize_scores, rrf_search_command,
+from lib.facets import parse_filters
+from lib.hybrid_search import (iter_rrf_search_command,
+                               iter_weighted_search_command, normalize_scores,
+                               rrf_page_command, rrf_search_command,
                                weighted_search_command)
-from lib.search_utils import DEFAULT_K_VALUE
+from lib.search_utils import DEFAULT_K_VALUE, IMAGE_LEG_WEIGHT, write_jsonl
+from lib.tracing import add_profile_arguments, profiled
+
+RANK_LABELS = {"bm25_rank": "BM25 Rank", "semantic_rank": "Semantic Rank", "image_rank": "Image Rank"}
+SCORE_LABELS = {"bm25_score": "BM25", "semantic_score": "Semantic", "image_score": "Image"}
 
 
 def main() -> None:
@@ -20,18 +27,46 @@ def main() -> None:
     weighted_search_parser = subparsers.add_parser(
         "weighted-search", help="Perform weighted hybrid search"
     )
-    weighted_search_parser.add_argument("query", type=str, help="The query")
+    weighted_search_parser.add_argument(
+        "query", type=str, nargs="?", default="", help="The query (optional with --image)"
+    )
+    weighted_search_parser.add_argument(
+        "--image", type=str, help="Image to search with as an extra retrieval leg"
+    )
+    weighted_search_parser.add_argument(
+        "--image-weight",
+        type=float,
+        default=IMAGE_LEG_WEIGHT,
+        help="Weight of the image leg",
+    )
     weighted_search_parser.add_argument(
         "--alpha", type=float, default=0.5, help="Weight value"
     )
     weighted_search_parser.add_argument(
         "--limit", type=int, default=5, help="The number of results to return"
     )
+    weighted_search_parser.add_argument(
+        "--filter",
+        action="append",
+        help="Metadata filter as field=value[,value] or field=min..max (repeatable)",
+    )
+    weighted_search_parser.add_argument(
+        "--format",
+        type=str,
+        choices=["text", "jsonl"],
+        default="text",
+        help="Output format (jsonl streams one result per line)",
+    )
 
     rrf_search_parser = subparsers.add_parser(
         "rrf-search", help="Perform RRF hybrid search"
     )
-    rrf_search_parser.add_argument("query", type=str, help="The query")
+    rrf_search_parser.add_argument(
+        "query", type=str, nargs="?", default="", help="The query (optional with --image)"
+    )
+    rrf_search_parser.add_argument(
+        "--image", type=str, help="Image to search with as an extra retrieval leg"
+    )
     rrf_search_parser.add_argument(
         "--k", type=int, default=DEFAULT_K_VALUE, help="The k parameter"
     )
@@ -45,29 +80,127 @@ def main() -> None:
         help="Query enhancement method",
     )
     rrf_search_parser.add_argument(
-        "--rerank-method", type=str, choices=["individual", "batch", "cross_encoder"], help="Reranking method"
+        "--llm-enhance",
+        action="store_true",
+        help="Always use the LLM for spell/expand instead of the local fast path",
+    )
+    rrf_search_parser.add_argument(
+        "--speculative",
+        action="store_true",
+        help="Start retrieval on the original query while enhancement runs",
+    )
+    rrf_search_parser.add_argument(
+        "--rerank-method", type=str, choices=["individual", "batch", "cross_encoder", "cascade"], help="Reranking method"
     )
     rrf_search_parser.add_argument(
         "--evaluate", action="store_true", help="Evaluate search result"
     )
+    rrf_search_parser.add_argument(
+        "--filter",
+        action="append",
+        help="Metadata filter as field=value[,value] or field=min..max (repeatable)",
+    )
+    rrf_search_parser.add_argument(
+        "--format",
+        type=str,
+        choices=["text", "jsonl"],
+        default="text",
+        help="Output format (jsonl streams one result per line)",
+    )
+
+    rrf_page_parser = subparsers.add_parser(
+        "rrf-page", help="Page through RRF hybrid search results with a cursor"
+    )
+    rrf_page_parser.add_argument(
+        "query", type=str, nargs="?", default="", help="The query (omit with --cursor)"
+    )
+    rrf_page_parser.add_argument(
+        "--k", type=int, default=DEFAULT_K_VALUE, help="The k parameter"
+    )
+    rrf_page_parser.add_argument(
+        "--limit", type=int, default=5, help="The number of results per page"
+    )
+    rrf_page_parser.add_argument(
+        "--cursor", type=str, help="Cursor returned by the previous page"
+    )
+    rrf_page_parser.add_argument(
+        "--filter",
+        action="append",
+        help="Metadata filter as field=value[,value] or field=min..max (repeatable)",
+    )
+
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
 
+    if args.command in ("rrf-search", "weighted-search") and not (
+        args.query.strip() or args.image
+    ):
+        parser.error("a query or --image is required")
+
+    if "filter" in args:
+        try:
+            args.filters = parse_filters(args.filter)
+        except ValueError as e:
+            parser.error(str(e))
+
+    with profiled(args):
+        run(args, parser)
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
     match args.command:
         case "rrf-search":
+            if args.format == "jsonl" and not (
+                args.rerank_method or args.evaluate or args.speculative
+            ):
+                write_jsonl(
+                    iter_rrf_search_command(
+                        args.query,
+                        args.k,
+                        args.enhance,
+                        args.limit,
+                        args.filters,
+                        not args.llm_enhance,
+                        args.image,
+                    )
+                )
+                return
+
             results = rrf_search_command(
-                args.query, args.k, args.enhance, args.rerank_method, args.limit
+                args.query,
+                args.k,
+                args.enhance,
+                args.rerank_method,
+                args.limit,
+                args.filters,
+                not args.llm_enhance,
+                args.speculative,
+                args.image,
             )
 
+            if args.format == "jsonl":
+                write_jsonl(results["results"])
+                return
+
             if results["enhanced_query"]:
                 print(
                     f"Enhanced query ({results['enhanced_method']}): '{results['original_query']}' -> '{results['enhanced_query']}'\n"
                 )
+            if results["speculation"]:
+                print(
+                    f"Speculative retrieval: bm25 {results['speculation']['bm25']}, semantic {results['speculation']['semantic']}\n"
+                )
 
             if results["reranked"]:
                 print(
                     f"Reranking top {len(results['results'])} results using {results['rerank_method']} method...\n"
                 )
+            for stage in results["rerank_stages"]:
+                status = f" (skipped: {stage['skipped']})" if "skipped" in stage else ""
+                print(
+                    f"Stage {stage['stage']}: {stage['candidates']} candidates, {stage['ms']:.0f}ms{status}"
+                )
 
             if args.evaluate:
                 eval = llm_evaluation(args.query, results["results"])
@@ -80,28 +213,74 @@ def main() -> None:
                     print(
                         f"   Rerank Score: {result.get('individual_score', 0):.3f}/10"
                     )
+                if "rerank_error" in result:
+                    print(f"   Rerank Score: unavailable ({result['rerank_error']})")
                 if "batch_rank":
                     print(f"   Rerank Rank: {result.get('batch_rank', 0)}")
                 if "cross_encoder_score" in result:
                     print(f"   Cross Encoder Score: {result.get('cross_encoder_score', 0):3f}")
                 print(f"   RRF Score: {result.get("score", 0):.3f}")
                 metadata = result.get("metadata", {})
-                if "bm25_rank" in metadata and "semantic_rank" in metadata:
-                    print(
-                        f"   BM25 Rank: {metadata["bm25_rank"]}, Semantic Rank: {metadata["semantic_rank"]}"
-                    )
+                ranks = [
+                    f"{label}: {metadata[key]}"
+                    for key, label in RANK_LABELS.items()
+                    if key in metadata
+                ]
+                if ranks:
+                    print(f"   {', '.join(ranks)}")
+                print(f"   {result["document"][:100]}...")
+                print()
+        case "rrf-page":
+            try:
+                page = rrf_page_command(
+                    args.query,
+                    args.k,
+                    args.limit,
+                    args.cursor,
+                    args.filters,
+                )
+            except ValueError as e:
+                parser.error(str(e))
+            for i, result in enumerate(page["results"], page["offset"] + 1):
+                print(f"{i}. {result["title"]}")
+                print(f"   RRF Score: {result.get("score", 0):.3f}")
                 print(f"   {result["document"][:100]}...")
                 print()
+            if page["next_cursor"]:
+                print(f"Next cursor: {page["next_cursor"]}")
         case "weighted-search":
-            results = weighted_search_command(args.query, args.alpha, args.limit)
+            if args.format == "jsonl":
+                write_jsonl(
+                    iter_weighted_search_command(
+                        args.query,
+                        args.alpha,
+                        args.limit,
+                        args.filters,
+                        args.image,
+                        args.image_weight,
+                    )
+                )
+                return
+
+            results = weighted_search_command(
+                args.query,
+                args.alpha,
+                args.limit,
+                args.filters,
+                args.image,
+                args.image_weight,
+            )
             for i, result in enumerate(results["results"], 1):
                 print(f"{i}. {result["title"]}")
                 print(f"   Hybrid Score: {result.get("score", 0):.3f}")
                 metadata = result.get("metadata", {})
-                if "bm25_score" in metadata and "semantic_score" in metadata:
-                    print(
-                        f"   BM25: {metadata["bm25_score"]:.3f}, Semantic: {metadata["semantic_score"]:.3f}"
-                    )
+                scores = [
+                    f"{label}: {metadata[key]:.3f}"
+                    for key, label in SCORE_LABELS.items()
+                    if key in metadata
+                ]
+                if scores:
+                    print(f"   {', '.join(scores)}")
                 print(f"   {result["document"][:100]}...")
                 print()
         case "normalize":
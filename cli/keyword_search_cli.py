@@ -1,10 +1,11 @@
 import argparse
 
 from lib.keyword_search import (bm25_idf_command, bm25_search_command, bm25_tf_command,
-                                build_command, idf_command, search_command,
-                                tf_command, tfidf_command)
+                                build_command, idf_command, iter_bm25_search_command,
+                                search_command, tf_command, tfidf_command)
 
-from lib.search_utils import BM25_B, BM25_K1
+from lib.search_utils import BM25_B, BM25_K1, write_jsonl
+from lib.tracing import add_profile_arguments, profiled
 
 
 def main() -> None:
@@ -57,9 +58,23 @@ def main() -> None:
     )
     bm25_search_parser.add_argument("query", type=str, help="Search query")
     bm25_search_parser.add_argument("limit", type=int, nargs="?", default=5, help="Limit the number of docs return")
+    bm25_search_parser.add_argument(
+        "--format",
+        type=str,
+        choices=["text", "jsonl"],
+        default="text",
+        help="Output format (jsonl streams one result per line)",
+    )
+
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
 
+    with profiled(args):
+        run(args, parser)
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
     match args.command:
         case "search":
             print(f"Searching for: {args.query}")
@@ -90,13 +105,15 @@ def main() -> None:
                 f"BM25 TF score of '{args.term}' in document '{args.doc_id}': {bm25tf:.2f}"
             )
         case "bm25search":
+            if args.format == "jsonl":
+                write_jsonl(iter_bm25_search_command(args.query, args.limit))
+                return
+
             bm25search = bm25_search_command(args.query, args.limit)
-            counter = 1 
-            for k, v in bm25search.items():
-                movie_title = v[0]
-                score = v[1]
-                print(f"{counter}. ({k}) {movie_title} - Score: {score:.2f}")
-                counter += 1
+            for counter, result in enumerate(bm25search, 1):
+                print(
+                    f"{counter}. ({result['id']}) {result['title']} - Score: {result['score']:.2f}"
+                )
         case _:
             parser.exit(2, parser.format_help())
 
@@ -1,27 +1,56 @@
-import os
+import time
+from typing import Iterator, Optional
 
-from dotenv import load_dotenv
-from google import genai
+from lib.context_builder import build_context, format_context
 from lib.hybrid_search import HybridSearch
+from lib.llm_client import generate_text, get_llm, stream_text
 from lib.search_utils import (DEFAULT_K_VALUE, DEFAULT_SEARCH_LIMIT,
-                              SEARCH_MULTIPLIER, load_movies)
+                              RAG_CANDIDATE_MULTIPLIER,
+                              RAG_CONTEXT_TOKEN_BUDGET, load_movies)
+from lib.tracing import span, traced
+
+
+@traced("rag.retrieve")
+def retrieve_context(
+    hybrid_search: HybridSearch,
+    query: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+) -> tuple[list[dict], list[dict]]:
+    search_results = hybrid_search.rrf_search(
+        query, DEFAULT_K_VALUE, limit * RAG_CANDIDATE_MULTIPLIER
+    )
+    context = build_context(
+        hybrid_search.semantic_search, query, search_results, token_budget
+    )
+    return search_results, context
 
-load_dotenv()
-api_key = os.environ.get("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
-model = "gemini-2.0-flash"
 
+def format_documents(search_results: list[dict], limit: int = 5) -> str:
+    docs = ""
+    for result in search_results[:limit]:
+        docs += f"{result['title']}: {result['document']}\n\n"
+    return docs
 
-def question_command(query: str) -> dict:
-    return question(query)
 
+def question_command(
+    query: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+) -> dict:
+    return question(query, limit, token_budget)
 
-def question(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> dict:
+
+def question(
+    query: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+) -> dict:
     movies = load_movies()
     hybrid_search = HybridSearch(movies)
 
-    search_results = hybrid_search.rrf_search(
-        query, DEFAULT_K_VALUE, limit * SEARCH_MULTIPLIER
+    search_results, context = retrieve_context(
+        hybrid_search, query, limit, token_budget
     )
 
     if not search_results:
@@ -31,10 +60,12 @@ def question(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> dict:
             "error": "No results found",
         }
 
-    question_answer = generate_question_answer(search_results, query, limit)
+    with span("rag.generate"):
+        question_answer = generate_text(question_answer_prompt(format_context(context), query))
     return {
         "query": query,
         "search_results": search_results[:limit],
+        "context": context,
         "answer": question_answer,
     }
 
@@ -42,11 +73,10 @@ def question(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> dict:
 def generate_question_answer(
     search_results: list[dict], query: str, limit: int = 5
 ) -> str:
-    docs = ""
+    return generate_text(question_answer_prompt(format_documents(search_results, limit), query))
 
-    for result in search_results[:limit]:
-        docs += f"{result['title']}: {result['document']}\n\n"
 
+def question_answer_prompt(docs: str, query: str) -> str:
     prompt = f"""Answer the user's question based on the provided movies that are available on Hoopla.
 
 This should be tailored to Hoopla users. Hoopla is a movie streaming service.
@@ -64,20 +94,27 @@ Instructions:
 
 Answer:"""
 
-    response = client.models.generate_content(model=model, contents=prompt)
-    return (response.text or "").strip()
+    return prompt
 
 
-def citations_command(query: str) -> dict:
-    return citations(query)
+def citations_command(
+    query: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+) -> dict:
+    return citations(query, limit, token_budget)
 
 
-def citations(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> dict:
+def citations(
+    query: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+) -> dict:
     movies = load_movies()
     hybrid_search = HybridSearch(movies)
 
-    search_results = hybrid_search.rrf_search(
-        query, DEFAULT_K_VALUE, limit * SEARCH_MULTIPLIER
+    search_results, context = retrieve_context(
+        hybrid_search, query, limit, token_budget
     )
 
     if not search_results:
@@ -87,20 +124,21 @@ def citations(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> dict:
             "error": "No results found",
         }
 
-    citations = generate_citations(search_results, query, limit)
+    with span("rag.generate"):
+        citations = generate_text(citations_prompt(format_context(context), query))
     return {
         "query": query,
         "search_results": search_results[:limit],
+        "context": context,
         "citations": citations,
     }
 
 
 def generate_citations(search_results: list[dict], query: str, limit: int = 5) -> str:
-    docs = ""
+    return generate_text(citations_prompt(format_documents(search_results, limit), query))
 
-    for result in search_results[:limit]:
-        docs += f"{result['title']}: {result['document']}\n\n"
 
+def citations_prompt(docs: str, query: str) -> str:
     prompt = f"""Answer the question or provide information based on the provided documents.
 
 This should be tailored to Hoopla users. Hoopla is a movie streaming service.
@@ -121,20 +159,27 @@ Instructions:
 
 Answer:"""
 
-    response = client.models.generate_content(model=model, contents=prompt)
-    return (response.text or "").strip()
+    return prompt
 
 
-def summarize_command(query: str):
-    return summarize(query)
+def summarize_command(
+    query: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+):
+    return summarize(query, limit, token_budget)
 
 
-def summarize(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> dict:
+def summarize(
+    query: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+) -> dict:
     movies = load_movies()
     hybrid_search = HybridSearch(movies)
 
-    search_results = hybrid_search.rrf_search(
-        query, DEFAULT_K_VALUE, limit * SEARCH_MULTIPLIER
+    search_results, context = retrieve_context(
+        hybrid_search, query, limit, token_budget
     )
 
     if not search_results:
@@ -144,20 +189,21 @@ def summarize(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> dict:
             "error": "No results found",
         }
 
-    summary = generate_summary(search_results, query, limit)
+    with span("rag.generate"):
+        summary = generate_text(summary_prompt(format_context(context), query))
     return {
         "query": query,
         "search_results": search_results[:limit],
+        "context": context,
         "summary": summary,
     }
 
 
 def generate_summary(search_results: list[dict], query: str, limit: int = 5) -> str:
-    docs = ""
+    return generate_text(summary_prompt(format_documents(search_results, limit), query))
 
-    for result in search_results[:limit]:
-        docs += f"{result['title']}: {result['document']}\n\n"
 
+def summary_prompt(docs: str, query: str) -> str:
     prompt = f"""
 Provide information useful to this query by synthesizing information from multiple search results in detail.
 The goal is to provide comprehensive information so that users know what their options are.
@@ -169,40 +215,48 @@ Search Results:
 Provide a comprehensive 3–4 sentence answer that combines information from multiple sources:
 """
 
-    response = client.models.generate_content(model=model, contents=prompt)
-    return (response.text or "").strip()
+    return prompt
 
 
-def rag_command(query: str):
-    return rag(query)
+def rag_command(
+    query: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+):
+    return rag(query, limit, token_budget)
 
 
-def rag(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> dict:
+def rag(
+    query: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+) -> dict:
     movies = load_movies()
     hybrid_search = HybridSearch(movies)
 
-    search_results = hybrid_search.rrf_search(
-        query, DEFAULT_K_VALUE, limit * SEARCH_MULTIPLIER
+    search_results, context = retrieve_context(
+        hybrid_search, query, limit, token_budget
     )
 
     if not search_results:
         return {"query": query, "search_results": [], "error": "No results found"}
 
-    answer = generate_answer(search_results, query, limit)
+    with span("rag.generate"):
+        answer = generate_text(answer_prompt(format_context(context), query))
 
     return {
         "query": query,
         "search_results": search_results[:limit],
+        "context": context,
         "answer": answer,
     }
 
 
 def generate_answer(search_results: list[dict], query: str, limit: int = 5) -> str:
-    docs = ""
+    return generate_text(answer_prompt(format_documents(search_results, limit), query))
 
-    for result in search_results[:limit]:
-        docs += f"{result['title']}: {result['document']}\n\n"
 
+def answer_prompt(docs: str, query: str) -> str:
     prompt = f"""Answer the question or provide information based on the provided documents. This should be tailored to Hoopla users. Hoopla is a movie streaming service.
 
 Query: {query}
@@ -212,5 +266,134 @@ Documents:
 
 Provide a comprehensive answer that addresses the query:"""
 
-    response = client.models.generate_content(model=model, contents=prompt)
-    return (response.text or "").strip()
+    return prompt
+
+
+PROMPT_BUILDERS = {
+    "rag": answer_prompt,
+    "summarize": summary_prompt,
+    "citations": citations_prompt,
+    "question": question_answer_prompt,
+}
+
+
+class RAGSession:
+    def __init__(self, documents: Optional[list[dict]] = None):
+        self.hybrid_search = HybridSearch(
+            documents if documents is not None else load_movies()
+        )
+        self.retrievals: dict[tuple, tuple[list[dict], list[dict]]] = {}
+
+    def retrieve(
+        self,
+        query: str,
+        limit: int = DEFAULT_SEARCH_LIMIT,
+        token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+    ) -> tuple[list[dict], list[dict]]:
+        key = (query, limit, token_budget)
+        if key not in self.retrievals:
+            self.retrievals[key] = retrieve_context(
+                self.hybrid_search, query, limit, token_budget
+            )
+        return self.retrievals[key]
+
+    def run(
+        self,
+        query: str,
+        modes: list[str],
+        limit: int = DEFAULT_SEARCH_LIMIT,
+        token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+    ) -> dict:
+        start = time.perf_counter()
+        search_results, context = self.retrieve(query, limit, token_budget)
+        retrieval_ms = (time.perf_counter() - start) * 1000
+
+        if not search_results:
+            return {
+                "query": query,
+                "search_results": [],
+                "error": "No results found",
+            }
+
+        docs = format_context(context)
+        prompts = [PROMPT_BUILDERS[mode](docs, query) for mode in modes]
+
+        start = time.perf_counter()
+        with span("rag.generate"):
+            responses = get_llm().run_all(prompts)
+        generation_ms = (time.perf_counter() - start) * 1000
+
+        answers = {}
+        errors = {}
+        for mode, response in zip(modes, responses):
+            if isinstance(response, Exception):
+                errors[mode] = str(response)
+            else:
+                answers[mode] = response
+
+        return {
+            "query": query,
+            "search_results": search_results[:limit],
+            "context": context,
+            "answers": answers,
+            "errors": errors,
+            "retrieval_ms": retrieval_ms,
+            "generation_ms": generation_ms,
+        }
+
+
+def session_command(
+    query: str,
+    modes: list[str],
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+) -> dict:
+    return RAGSession().run(query, modes, limit, token_budget)
+
+
+def stream_command(
+    mode: str,
+    query: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+) -> Iterator[dict]:
+    movies = load_movies()
+    hybrid_search = HybridSearch(movies)
+
+    start = time.perf_counter()
+    search_results, context = retrieve_context(
+        hybrid_search, query, limit, token_budget
+    )
+    retrieval_ms = (time.perf_counter() - start) * 1000
+
+    if not search_results:
+        yield {"type": "error", "query": query, "error": "No results found"}
+        return
+
+    yield {
+        "type": "search_results",
+        "query": query,
+        "search_results": search_results[:limit],
+        "context": context,
+        "retrieval_ms": retrieval_ms,
+    }
+
+    prompt = PROMPT_BUILDERS[mode](format_context(context), query)
+    time_to_first_token_ms = None
+    chunks = stream_text(prompt)
+    while True:
+        with span("rag.stream"):
+            text = next(chunks, None)
+        if text is None:
+            break
+        if time_to_first_token_ms is None:
+            time_to_first_token_ms = (time.perf_counter() - start) * 1000
+        yield {"type": "token", "text": text}
+
+    total_ms = (time.perf_counter() - start) * 1000
+    yield {
+        "type": "done",
+        "retrieval_ms": retrieval_ms,
+        "time_to_first_token_ms": time_to_first_token_ms or total_ms,
+        "total_ms": total_ms,
+    }
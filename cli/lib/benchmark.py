@@ -0,0 +1,314 @@
+import itertools
+import json
+import os
+import platform
+import tempfile
+import time
+import zlib
+from typing import Callable, Optional
+
+import numpy as np
+from PIL import Image
+
+from lib.document_store import DocumentStore
+from lib.hybrid_search import combine_search_results, rrf_combine_search_results
+from lib.inverted_index import InvertedIndex
+from lib.multimodal_search import MultimodalSearch
+from lib.search_utils import (BENCHMARK_EMBEDDING_DIM, BENCHMARK_MAX_ROUNDS,
+                              BENCHMARK_MIN_ROUNDS, BENCHMARK_MIN_TIME_SECONDS,
+                              BENCHMARK_REGRESSION_THRESHOLD, CACHE_DIR,
+                              CANDIDATE_MULTIPLIER, DEFAULT_SEARCH_LIMIT,
+                              SearchHits, tokenize)
+from lib.semantic_search import (ChunkedSemanticSearch, SemanticSearch,
+                                 fixed_size_chunking, semantic_chunking)
+
+SYLLABLES = [
+    "ka", "lo", "mi", "ran", "te", "vo", "shi", "dar", "en", "qu",
+    "ba", "nor", "el", "fi", "gra", "us", "to", "mar", "zen", "pi",
+]
+VOCABULARY_SIZE = 20000
+TITLE_WORDS = (2, 5)
+SENTENCES = (3, 7)
+SENTENCE_WORDS = (6, 14)
+NUM_QUERIES = 20
+QUERY_WORDS = 3
+SAMPLE_DOCS = 1000
+FAKE_TABLE_ROWS = 4096
+
+
+class FakeEmbeddingModel:
+    def __init__(self, dim: int = BENCHMARK_EMBEDDING_DIM, seed: int = 0):
+        rng = np.random.default_rng(seed)
+        self.table = rng.standard_normal((FAKE_TABLE_ROWS, dim)).astype(np.float32)
+
+    def encode(self, sentences, batch_size: int = 32, **kwargs) -> np.ndarray:
+        single = isinstance(sentences, (str, Image.Image))
+        items = [sentences] if single else list(sentences)
+        keys = np.array([fingerprint(item) for item in items], dtype=np.uint32)
+        embeddings = (
+            self.table[keys % FAKE_TABLE_ROWS]
+            + 0.5 * self.table[(keys >> 16) % FAKE_TABLE_ROWS]
+        )
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return embeddings[0] if single else embeddings
+
+
+def fingerprint(item) -> int:
+    if isinstance(item, Image.Image):
+        return zlib.crc32(item.tobytes())
+    return zlib.crc32(str(item).encode("utf-8"))
+
+
+def synthetic_vocabulary(size: int = VOCABULARY_SIZE, seed: int = 0) -> list[str]:
+    rng = np.random.default_rng(seed)
+    words = set()
+    while len(words) < size:
+        count = int(rng.integers(2, 5))
+        words.add("".join(SYLLABLES[i] for i in rng.integers(0, len(SYLLABLES), count)))
+    return sorted(words)
+
+
+def synthetic_catalog(
+    num_docs: int, seed: int = 0, vocabulary: Optional[list[str]] = None
+) -> list[dict]:
+    vocabulary = vocabulary or synthetic_vocabulary(seed=seed)
+    rng = np.random.default_rng(seed)
+
+    def words(count: int) -> list[str]:
+        ranks = rng.zipf(1.2, count) % len(vocabulary)
+        return [vocabulary[r] for r in ranks]
+
+    documents = []
+    for doc_id in range(1, num_docs + 1):
+        title = " ".join(w.capitalize() for w in words(int(rng.integers(*TITLE_WORDS))))
+        sentences = []
+        for _ in range(int(rng.integers(*SENTENCES))):
+            sentence = " ".join(words(int(rng.integers(*SENTENCE_WORDS))))
+            sentences.append(sentence.capitalize() + ".")
+        documents.append(
+            {"id": doc_id, "title": title, "description": " ".join(sentences)}
+        )
+    return documents
+
+
+def synthetic_queries(
+    vocabulary: list[str], count: int = NUM_QUERIES, seed: int = 1
+) -> list[str]:
+    rng = np.random.default_rng(seed)
+    return [
+        " ".join(vocabulary[r] for r in rng.zipf(1.5, QUERY_WORDS) % len(vocabulary))
+        for _ in range(count)
+    ]
+
+
+def synthetic_leg(num_docs: int, depth: int, rng: np.random.Generator) -> SearchHits:
+    indices = rng.choice(num_docs, size=min(depth, num_docs), replace=False)
+    scores = np.sort(rng.random(indices.size).astype(np.float32))[::-1]
+    return SearchHits(indices.astype(np.int32), scores)
+
+
+def measure(
+    fn: Callable[[], object],
+    min_rounds: int = BENCHMARK_MIN_ROUNDS,
+    max_rounds: int = BENCHMARK_MAX_ROUNDS,
+    min_time: float = BENCHMARK_MIN_TIME_SECONDS,
+    warmup: bool = True,
+) -> dict:
+    if warmup:
+        fn()
+
+    timings = []
+    start = time.perf_counter()
+    while len(timings) < max_rounds and (
+        len(timings) < min_rounds or time.perf_counter() - start < min_time
+    ):
+        t = time.perf_counter()
+        fn()
+        timings.append((time.perf_counter() - t) * 1000)
+
+    values = np.array(timings)
+    return {
+        "rounds": int(values.size),
+        "min_ms": float(values.min()),
+        "median_ms": float(np.median(values)),
+        "mean_ms": float(values.mean()),
+        "p95_ms": float(np.percentile(values, 95)),
+        "max_ms": float(values.max()),
+        "stddev_ms": float(values.std()),
+    }
+
+
+def cycle(queries: list[str], search: Callable[[str], object]) -> Callable[[], object]:
+    queries_iter = itertools.cycle(queries)
+    return lambda: search(next(queries_iter))
+
+
+def run_benchmarks(
+    num_docs: int,
+    workdir: str,
+    dim: int = BENCHMARK_EMBEDDING_DIM,
+    only: Optional[list[str]] = None,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+) -> list[dict]:
+    vocabulary = synthetic_vocabulary()
+    documents = synthetic_catalog(num_docs, vocabulary=vocabulary)
+    queries = synthetic_queries(vocabulary)
+    sample = [doc["description"] for doc in documents[:SAMPLE_DOCS]]
+    model = FakeEmbeddingModel(dim)
+    results = []
+
+    def selected(name: str) -> bool:
+        return not only or any(pattern in name for pattern in only)
+
+    def record(name: str, fn: Callable[[], object], **kwargs) -> None:
+        if not selected(name):
+            return
+        stats = measure(fn, **kwargs)
+        results.append({"name": name, "size": num_docs, **stats})
+        print(f"  {name:<40} median {stats['median_ms']:10.3f}ms ({stats['rounds']} rounds)")
+
+    once = {"min_rounds": 1, "max_rounds": 1, "warmup": False}
+
+    store = DocumentStore()
+    store.store_dir = os.path.join(workdir, "doc_store")
+    store.build(documents)
+
+    record("tokenize", lambda: [tokenize(text) for text in sample])
+    record("chunking.fixed_size", lambda: [fixed_size_chunking(t) for t in sample])
+    record("chunking.semantic", lambda: [semantic_chunking(t) for t in sample])
+
+    if any(selected(f"inverted_index.{name}") for name in ("build", "load", "bm25_search")):
+        index = InvertedIndex(store)
+        index.index_path = os.path.join(workdir, "bm25_postings.npz")
+        index.vocabulary_path = os.path.join(workdir, "bm25_vocabulary.json")
+        record("inverted_index.build", lambda: index.build(documents), **once)
+        if not selected("inverted_index.build"):
+            index.build(documents)
+        index.save()
+        record("inverted_index.load", index.load)
+        record(
+            "inverted_index.bm25_search",
+            cycle(queries, lambda q: index.bm25_search(q, limit)),
+        )
+        del index
+
+    if selected("semantic.search"):
+        semantic = SemanticSearch(store=store, model=model)
+        semantic.embeddings_path = os.path.join(workdir, "movie_embeddings.npy")
+        semantic.build_embeddings(documents)
+        record("semantic.search", cycle(queries, lambda q: semantic.search(q, limit)))
+        del semantic
+
+    if selected("chunked.search_chunks"):
+        chunked = ChunkedSemanticSearch(store=store, model=model)
+        chunked.chunk_embeddings_path = os.path.join(workdir, "chunk_embeddings.npy")
+        chunked.chunk_metadata_path = os.path.join(workdir, "chunk_metadata.json")
+        chunked.build_chunk_embeddings(documents)
+        record(
+            "chunked.search_chunks",
+            cycle(queries, lambda q: chunked.search_chunks(q, limit)),
+        )
+        del chunked
+
+    rng = np.random.default_rng(0)
+    depth = limit * CANDIDATE_MULTIPLIER
+    bm25_leg = synthetic_leg(num_docs, depth, rng)
+    semantic_leg = synthetic_leg(num_docs, depth, rng)
+    record("fusion.weighted", lambda: combine_search_results(bm25_leg, semantic_leg))
+    record("fusion.rrf", lambda: rrf_combine_search_results(bm25_leg, semantic_leg))
+
+    if any(selected(name) for name in ("multimodal.image_search", "multimodal.batch_scoring")):
+        multimodal = MultimodalSearch(
+            docs=documents, store=store, model=model, cache_dir=workdir
+        )
+        image_path = os.path.join(workdir, "query.png")
+        Image.fromarray(
+            rng.integers(0, 255, (64, 64, 3), dtype=np.uint8)
+        ).save(image_path)
+        record(
+            "multimodal.image_search",
+            lambda: multimodal.image_search_hits(image_path, limit),
+        )
+        image_embeddings = model.encode([f"image {i}" for i in range(32)])
+        record(
+            "multimodal.batch_scoring",
+            lambda: multimodal.search_embedding_batch(image_embeddings, limit),
+        )
+        del multimodal, image_embeddings
+
+    return results
+
+
+def compare_results(
+    current: dict,
+    baseline: dict,
+    threshold: float = BENCHMARK_REGRESSION_THRESHOLD,
+) -> list[dict]:
+    previous = {(b["name"], b["size"]): b for b in baseline.get("benchmarks", [])}
+    rows = []
+    for bench in current["benchmarks"]:
+        base = previous.get((bench["name"], bench["size"]))
+        if base is None:
+            rows.append({"name": bench["name"], "size": bench["size"], "status": "new"})
+            continue
+
+        ratio = bench["median_ms"] / base["median_ms"] if base["median_ms"] else 1.0
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 - threshold:
+            status = "improvement"
+        else:
+            status = "ok"
+        rows.append(
+            {
+                "name": bench["name"],
+                "size": bench["size"],
+                "baseline_ms": base["median_ms"],
+                "current_ms": bench["median_ms"],
+                "ratio": ratio,
+                "status": status,
+            }
+        )
+    return rows
+
+
+def benchmark_command(
+    sizes: list[int],
+    dim: int = BENCHMARK_EMBEDDING_DIM,
+    only: Optional[list[str]] = None,
+    output: Optional[str] = None,
+    baseline: Optional[str] = None,
+    threshold: float = BENCHMARK_REGRESSION_THRESHOLD,
+) -> dict:
+    benchmarks = []
+    for size in sizes:
+        print(f"Benchmarking {size} synthetic documents")
+        with tempfile.TemporaryDirectory() as workdir:
+            benchmarks.extend(run_benchmarks(size, workdir, dim, only))
+
+    results = {
+        "meta": {
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "sizes": sizes,
+            "embedding_dim": dim,
+        },
+        "benchmarks": benchmarks,
+    }
+
+    if output is None:
+        output = os.path.join(
+            CACHE_DIR, "benchmarks", f"{time.strftime('%Y%m%d-%H%M%S')}.json"
+        )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+
+    comparison = None
+    if baseline is not None:
+        with open(baseline, "r") as f:
+            comparison = compare_results(results, json.load(f), threshold)
+
+    return {"output": output, "results": results, "comparison": comparison}
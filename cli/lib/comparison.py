@@ -0,0 +1,222 @@
+import time
+from typing import Optional
+
+import numpy as np
+from lib.hybrid_search import (HybridSearch, combine_search_results,
+                               rrf_combine_search_results)
+from lib.search_utils import (BM25_B, BM25_K1, CANDIDATE_MULTIPLIER,
+                              COMPARISON_RBO_P, DEFAULT_K_VALUE,
+                              DEFAULT_SEARCH_LIMIT, SearchHits,
+                              load_golden_dataset, load_movies,
+                              load_query_log, top_k_indices)
+from lib.tuning import bm25_param_rankings, ranking_metrics
+
+CONFIG_FIELDS = {
+    "method": str,
+    "k1": float,
+    "b": float,
+    "k": int,
+    "alpha": float,
+    "depth": int,
+}
+
+
+def parse_config(spec: str, limit: int = DEFAULT_SEARCH_LIMIT) -> dict:
+    config = {
+        "method": "rrf",
+        "k1": BM25_K1,
+        "b": BM25_B,
+        "k": DEFAULT_K_VALUE,
+        "alpha": 0.5,
+        "depth": limit * CANDIDATE_MULTIPLIER,
+    }
+    for part in filter(None, (p.strip() for p in spec.split(","))):
+        field, _, value = part.partition("=")
+        if field not in CONFIG_FIELDS or not value:
+            raise ValueError(f"Invalid config setting: {part}")
+        config[field] = CONFIG_FIELDS[field](value)
+    if config["method"] not in ("rrf", "weighted"):
+        raise ValueError(f"Unknown fusion method: {config['method']}")
+    return config
+
+
+def jaccard_at_k(a: np.ndarray, b: np.ndarray, k: int) -> float:
+    top_a, top_b = set(a[:k].tolist()), set(b[:k].tolist())
+    union = top_a | top_b
+    return len(top_a & top_b) / len(union) if union else 1.0
+
+
+def rank_biased_overlap(a: np.ndarray, b: np.ndarray, p: float = COMPARISON_RBO_P) -> float:
+    depth = min(len(a), len(b))
+    if depth == 0:
+        return 1.0 if len(a) == len(b) else 0.0
+
+    seen_a, seen_b = set(), set()
+    overlap = 0
+    weighted = 0.0
+    for d in range(1, depth + 1):
+        x, y = int(a[d - 1]), int(b[d - 1])
+        if x == y:
+            overlap += 1
+        else:
+            overlap += (x in seen_b) + (y in seen_a)
+        seen_a.add(x)
+        seen_b.add(y)
+        weighted += overlap / d * p**d
+    return overlap / depth * p**depth + (1 - p) / p * weighted
+
+
+def kendall_tau(a: np.ndarray, b: np.ndarray) -> Optional[float]:
+    common, pos_a, pos_b = np.intersect1d(a, b, return_indices=True)
+    if common.size < 2:
+        return None
+    order_a = np.argsort(pos_a)
+    ranks_b = pos_b[order_a]
+    pairs = np.sign(ranks_b[None, :] - ranks_b[:, None])[np.triu_indices(common.size, 1)]
+    return float(pairs.sum() / pairs.size)
+
+
+class ComparisonRunner:
+    def __init__(self, hybrid_search: HybridSearch, configs: dict[str, dict], limit: int):
+        self.hybrid_search = hybrid_search
+        self.configs = configs
+        self.limit = limit
+        self.results: dict[str, dict] = {}
+
+    def run_query(self, query: str) -> dict:
+        if query not in self.results:
+            self.results[query] = self.__run(query)
+        return self.results[query]
+
+    def __run(self, query: str) -> dict:
+        idx = self.hybrid_search.idx
+
+        start = time.perf_counter()
+        postings = idx.query_postings(query)
+        matched, doc_scores = self.hybrid_search.semantic_search.chunk_doc_scores(query)
+        shared_ms = (time.perf_counter() - start) * 1000
+
+        ranked = {}
+        latency_ms = {}
+        for name, config in self.configs.items():
+            depth = config["depth"]
+            start = time.perf_counter()
+            bm25 = bm25_param_rankings(
+                postings,
+                idx.doc_lengths,
+                idx.avg_doc_length(),
+                [(config["k1"], config["b"])],
+                depth,
+            )[0]
+            order = top_k_indices(doc_scores, depth)
+            semantic = SearchHits(matched[order], doc_scores[order])
+            if config["method"] == "rrf":
+                combined = rrf_combine_search_results(bm25, semantic, config["k"])
+            else:
+                combined = combine_search_results(bm25, semantic, config["alpha"])
+            ranked[name] = combined.indices[: self.limit]
+            latency_ms[name] = (time.perf_counter() - start) * 1000
+
+        return {
+            "query": query,
+            "ranked": ranked,
+            "shared_ms": shared_ms,
+            "latency_ms": latency_ms,
+        }
+
+
+def compare_rankings(a: np.ndarray, b: np.ndarray, k: int) -> dict:
+    return {
+        "jaccard": jaccard_at_k(a, b, k),
+        "rbo": rank_biased_overlap(a[:k], b[:k]),
+        "kendall_tau": kendall_tau(a[:k], b[:k]),
+    }
+
+
+def mean_of(rows: list[dict], field: str) -> Optional[float]:
+    values = [row[field] for row in rows if row[field] is not None]
+    return float(np.mean(values)) if values else None
+
+
+def compare_command(
+    config_a: str,
+    config_b: str,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+    query_log: Optional[str] = None,
+) -> dict:
+    configs = {"a": parse_config(config_a, limit), "b": parse_config(config_b, limit)}
+    movies = load_movies()
+    hybrid_search = HybridSearch(movies)
+    runner = ComparisonRunner(hybrid_search, configs, limit)
+
+    test_cases = load_golden_dataset()["test_cases"]
+    traffic = load_query_log(query_log) if query_log else [t["query"] for t in test_cases]
+    if not traffic:
+        raise ValueError("No queries to compare")
+    runner.run_query(traffic[0])
+    runner.results.clear()
+
+    per_query = []
+    for query in traffic:
+        result = runner.run_query(query)
+        overlap = compare_rankings(result["ranked"]["a"], result["ranked"]["b"], limit)
+        latency = result["latency_ms"]
+        per_query.append(
+            {
+                "query": query,
+                **overlap,
+                "shared_ms": result["shared_ms"],
+                "latency_a_ms": latency["a"],
+                "latency_b_ms": latency["b"],
+                "latency_delta_ms": latency["b"] - latency["a"],
+            }
+        )
+
+    title_to_indices: dict[str, list[int]] = {}
+    for idx in range(len(hybrid_search.store)):
+        title_to_indices.setdefault(hybrid_search.store.title(idx), []).append(idx)
+
+    totals = {name: {} for name in configs}
+    for test_case in test_cases:
+        relevant = np.array(
+            sorted(
+                {i for title in test_case["relevant_docs"] for i in title_to_indices.get(title, [])}
+            ),
+            dtype=np.int32,
+        )
+        ranked = runner.run_query(test_case["query"])["ranked"]
+        for name in configs:
+            metrics = ranking_metrics(
+                ranked[name][None, :], relevant, len(test_case["relevant_docs"]), limit
+            )
+            for metric, values in metrics.items():
+                totals[name][metric] = totals[name].get(metric, 0.0) + float(values[0])
+
+    quality = {
+        name: {metric: total / len(test_cases) for metric, total in metrics.items()}
+        for name, metrics in totals.items()
+    }
+    quality["delta"] = {
+        metric: quality["b"][metric] - quality["a"][metric] for metric in quality["a"]
+    }
+
+    deltas = np.array([row["latency_delta_ms"] for row in per_query])
+    return {
+        "configs": configs,
+        "limit": limit,
+        "queries": len(per_query),
+        "overlap": {
+            "jaccard": mean_of(per_query, "jaccard"),
+            "rbo": mean_of(per_query, "rbo"),
+            "kendall_tau": mean_of(per_query, "kendall_tau"),
+        },
+        "latency": {
+            "shared_p50_ms": float(np.percentile([r["shared_ms"] for r in per_query], 50)),
+            "a_p50_ms": float(np.percentile([r["latency_a_ms"] for r in per_query], 50)),
+            "b_p50_ms": float(np.percentile([r["latency_b_ms"] for r in per_query], 50)),
+            "delta_mean_ms": float(deltas.mean()),
+            "delta_p95_ms": float(np.percentile(deltas, 95)),
+        },
+        "quality": quality,
+        "per_query": per_query,
+    }
@@ -0,0 +1,84 @@
+import numpy as np
+from lib.search_utils import RAG_CONTEXT_TOKEN_BUDGET, RAG_DEDUP_THRESHOLD
+from lib.tracing import traced
+
+from .semantic_search import ChunkedSemanticSearch
+
+
+def estimate_tokens(text: str) -> int:
+    return (len(text) + 3) // 4
+
+
+@traced("rag.context")
+def build_context(
+    semantic_search: ChunkedSemanticSearch,
+    query: str,
+    search_results: list[dict],
+    token_budget: int = RAG_CONTEXT_TOKEN_BUDGET,
+    dedup_threshold: float = RAG_DEDUP_THRESHOLD,
+) -> list[dict]:
+    store = semantic_search.store
+    doc_indices = np.array(
+        [store.index_of(result["id"]) for result in search_results], dtype=np.int32
+    )
+    if doc_indices.size == 0:
+        return []
+
+    rows, scores = semantic_search.chunk_scores(query, doc_indices)
+    embeddings = semantic_search.chunk_embeddings[rows]
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    normalized = np.divide(
+        embeddings, norms, out=np.zeros_like(embeddings), where=norms != 0
+    )
+
+    selected: list[int] = []
+    selected_chunks: dict[int, list[tuple[int, str]]] = {}
+    best_scores: dict[int, float] = {}
+    used = 0
+    for pos in np.argsort(-scores, kind="stable"):
+        if selected and float(np.max(normalized[selected] @ normalized[pos])) >= dedup_threshold:
+            continue
+
+        row = int(rows[pos])
+        doc_idx = int(semantic_search.chunk_doc_indices[row])
+        text = semantic_search.chunk_text(row)
+        if not text:
+            continue
+
+        cost = estimate_tokens(text)
+        if doc_idx not in selected_chunks:
+            cost += estimate_tokens(f"{store.title(doc_idx)}: \n\n")
+        if used + cost > token_budget:
+            continue
+
+        used += cost
+        selected.append(int(pos))
+        selected_chunks.setdefault(doc_idx, []).append(
+            (semantic_search.chunk_metadata[row]["chunk_idx"], text)
+        )
+        best_scores.setdefault(doc_idx, float(scores[pos]))
+
+    context = []
+    for result, doc_idx in zip(search_results, doc_indices.tolist()):
+        chunks = selected_chunks.pop(doc_idx, None)
+        if not chunks:
+            continue
+        text = " ".join(chunk for _, chunk in sorted(chunks))
+        context.append(
+            {
+                "id": result["id"],
+                "title": result["title"],
+                "text": text,
+                "score": best_scores[doc_idx],
+                "tokens": estimate_tokens(f"{result['title']}: {text}\n\n"),
+            }
+        )
+
+    return context
+
+
+def format_context(context: list[dict]) -> str:
+    docs = ""
+    for entry in context:
+        docs += f"{entry['title']}: {entry['text']}\n\n"
+    return docs
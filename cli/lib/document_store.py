@@ -0,0 +1,180 @@
+import hashlib
+import json
+import os
+from typing import Iterator, Optional
+
+import numpy as np
+from lib.search_utils import CACHE_DIR, SearchHits, format_search_result
+
+
+class TextColumn:
+    def __init__(self, data: np.ndarray, offsets: np.ndarray):
+        self.data = data
+        self.offsets = offsets
+
+    @classmethod
+    def from_strings(cls, strings: list[str]) -> "TextColumn":
+        encoded = [s.encode("utf-8") for s in strings]
+        offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(e) for e in encoded])
+        data = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+        return cls(data, offsets)
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def __getitem__(self, idx: int) -> str:
+        start, end = self.offsets[idx], self.offsets[idx + 1]
+        return self.data[start:end].tobytes().decode("utf-8")
+
+
+class DocumentStore:
+    def __init__(self):
+        self.ids = np.empty(0, dtype=np.int64)
+        self.titles = TextColumn.from_strings([])
+        self.descriptions = TextColumn.from_strings([])
+        self.id_to_idx: dict[int, int] = {}
+        self.content_hash = ""
+        self.store_dir = os.path.join(CACHE_DIR, "doc_store")
+
+    @classmethod
+    def for_documents(cls, documents: list[dict]) -> "DocumentStore":
+        store = cls()
+        if store.load() and store.matches(documents):
+            return store
+
+        store.build(documents)
+        if documents:
+            store.save()
+            store.load()
+        return store
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def build(self, documents: list[dict]) -> None:
+        self.ids = np.array([doc["id"] for doc in documents], dtype=np.int64)
+        self.titles = TextColumn.from_strings(
+            [doc.get("title", "") for doc in documents]
+        )
+        self.descriptions = TextColumn.from_strings(
+            [doc.get("description", "") for doc in documents]
+        )
+        self.content_hash = documents_hash(documents)
+        self.__build_id_map()
+
+    def matches(self, documents: list[dict]) -> bool:
+        if len(documents) != len(self.ids):
+            return False
+        return documents_hash(documents) == self.content_hash
+
+    def index_of(self, doc_id: int) -> int:
+        if doc_id not in self.id_to_idx:
+            raise KeyError(f"Unknown document id: {doc_id}")
+        return self.id_to_idx[doc_id]
+
+    def doc_id(self, idx: int) -> int:
+        return int(self.ids[idx])
+
+    def title(self, idx: int) -> str:
+        return self.titles[idx]
+
+    def description(self, idx: int) -> str:
+        return self.descriptions[idx]
+
+    def document(self, idx: int) -> dict:
+        return {
+            "id": self.doc_id(idx),
+            "title": self.title(idx),
+            "description": self.description(idx),
+        }
+
+    def hydrate(
+        self,
+        hits: SearchHits,
+        limit: Optional[int] = None,
+        document_chars: Optional[int] = None,
+    ) -> list[dict]:
+        return list(self.iter_hydrate(hits, limit, document_chars))
+
+    def iter_hydrate(
+        self,
+        hits: SearchHits,
+        limit: Optional[int] = None,
+        document_chars: Optional[int] = None,
+    ) -> Iterator[dict]:
+        count = len(hits.indices) if limit is None else min(limit, len(hits.indices))
+        metadata = hits.metadata or {}
+        for pos in range(count):
+            yield self.result(
+                int(hits.indices[pos]),
+                float(hits.scores[pos]),
+                document_chars,
+                **{name: values[pos].item() for name, values in metadata.items()},
+            )
+
+    def result(
+        self,
+        idx: int,
+        score: float,
+        document_chars: Optional[int] = None,
+        **metadata,
+    ) -> dict:
+        document = self.description(idx)
+        if document_chars is not None:
+            document = document[:document_chars]
+        return format_search_result(
+            doc_id=self.doc_id(idx),
+            title=self.title(idx),
+            document=document,
+            score=score,
+            **metadata,
+        )
+
+    def save(self) -> None:
+        os.makedirs(self.store_dir, exist_ok=True)
+        np.save(os.path.join(self.store_dir, "ids.npy"), self.ids)
+        for name, column in (
+            ("titles", self.titles),
+            ("descriptions", self.descriptions),
+        ):
+            np.save(os.path.join(self.store_dir, f"{name}_data.npy"), column.data)
+            np.save(
+                os.path.join(self.store_dir, f"{name}_offsets.npy"), column.offsets
+            )
+        with open(os.path.join(self.store_dir, "manifest.json"), "w") as f:
+            json.dump({"content_hash": self.content_hash}, f)
+
+    def load(self) -> bool:
+        try:
+            with open(os.path.join(self.store_dir, "manifest.json"), "r") as f:
+                content_hash = json.load(f)["content_hash"]
+            self.ids = np.load(os.path.join(self.store_dir, "ids.npy"))
+            self.titles = self.__load_column("titles")
+            self.descriptions = self.__load_column("descriptions")
+        except (OSError, ValueError, KeyError):
+            return False
+
+        self.content_hash = content_hash
+
+        self.__build_id_map()
+        return True
+
+    def __load_column(self, name: str) -> TextColumn:
+        data = np.load(os.path.join(self.store_dir, f"{name}_data.npy"), mmap_mode="r")
+        offsets = np.load(
+            os.path.join(self.store_dir, f"{name}_offsets.npy"), mmap_mode="r"
+        )
+        return TextColumn(data, offsets)
+
+    def __build_id_map(self) -> None:
+        self.id_to_idx = {int(doc_id): i for i, doc_id in enumerate(self.ids)}
+
+
+def documents_hash(documents: list[dict]) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    for doc in documents:
+        for value in (str(doc["id"]), doc.get("title", ""), doc.get("description", "")):
+            digest.update(value.encode("utf-8"))
+            digest.update(b"\0")
+    return digest.hexdigest()
@@ -1,16 +1,14 @@
 import json
-import os
+import time
 
-from dotenv import load_dotenv
-from google import genai
-from lib.hybrid_search import HybridSearch
-from lib.search_utils import DEFAULT_K_VALUE, load_golden_dataset, load_movies
-from lib.semantic_search import SemanticSearch
-
-load_dotenv()
-api_key = os.environ.get("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
-model = "gemini-2.0-flash"
+import numpy as np
+from lib.hybrid_search import rrf_combine_search_results
+from lib.llm_client import generate_text
+from lib.search_utils import (BM25_B, BM25_K1, CANDIDATE_MULTIPLIER,
+                              DEFAULT_K_VALUE, SearchHits, load_golden_dataset,
+                              load_movies)
+from lib.tuning import (bm25_param_rankings, collect_leg_rankings,
+                        ranking_metrics)
 
 
 def llm_evaluation(query: str, rrf_results: list[dict]) -> list[int]:
@@ -37,8 +35,7 @@ Return ONLY the scores in the same order you were given the documents. Return a
 
 [2, 0, 3, 2, 0, 1]"""
 
-    response = client.models.generate_content(model=model, contents=prompt)
-    cleaned_response = (response.text or "").strip()
+    cleaned_response = generate_text(prompt)
     json_response = json.loads(cleaned_response)
 
     if len(json_response) == len(rrf_results):
@@ -49,66 +46,68 @@ Return ONLY the scores in the same order you were given the documents. Return a
     )
 
 
-def recall_at_k(
-    retrieved_docs: list[str], relevant_docs: set[str], k: int = 5
-) -> float:
-    retrieved_relevant = 0
-    for doc in retrieved_docs[:k]:
-        if doc in relevant_docs:
-            retrieved_relevant += 1
-    return retrieved_relevant / len(relevant_docs)
-
-
-def precision_at_k(
-    retrieved_docs: list[str], relevant_docs: set[str], k: int = 5
-) -> float:
-    top_k = retrieved_docs[:k]
-    relevant_count = 0
-    for doc in top_k:
-        if doc in relevant_docs:
-            relevant_count += 1
-    return relevant_count / k
-
-
-def evaluate_result(limit: int = 5) -> dict:
+def evaluate_result(
+    limit: int = 5, k: int = DEFAULT_K_VALUE, refresh: bool = False
+) -> dict:
     movies = load_movies()
     golden_data = load_golden_dataset()
     test_cases = golden_data["test_cases"]
 
-    semantic_search = SemanticSearch()
-    semantic_search.load_or_create_embeddings(movies)
-    hybrid_search = HybridSearch(movies)
+    start = time.perf_counter()
+    legs = collect_leg_rankings(
+        movies, test_cases, limit * CANDIDATE_MULTIPLIER, refresh
+    )
+    retrieval_s = time.perf_counter() - start
+    titles = legs["titles"]
+    depth = limit * CANDIDATE_MULTIPLIER
 
-    total_precision = 0
-    total_recall = 0
     results_by_query = {}
-    for test_case in test_cases:
-        query = test_case["query"]
-        relevant_docs = set(test_case["relevant_docs"])
-        search_results = hybrid_search.rrf_search(query, k=DEFAULT_K_VALUE, limit=limit)
-        retrieved_docs = []
-        for result in search_results:
-            title = result.get("title", "")
-            if title:
-                retrieved_docs.append(title)
-
-        precision = precision_at_k(retrieved_docs, relevant_docs, limit)
-        recall = recall_at_k(retrieved_docs, relevant_docs, limit)
-        f1 = 2 * (precision * recall) / (precision + recall)
-
-        results_by_query[query] = {
-            "precision": precision,
-            "recall": recall,
-            "f1": f1,
-            "retrieved": retrieved_docs[:limit],
-            "relevant": list(relevant_docs),
+    totals: dict[str, float] = {}
+    latencies = []
+    for q in legs["queries"]:
+        start = time.perf_counter()
+        bm25 = bm25_param_rankings(
+            q["bm25_postings"],
+            legs["doc_lengths"],
+            legs["avg_doc_length"],
+            [(BM25_K1, BM25_B)],
+            depth,
+        )[0]
+        semantic = SearchHits(
+            q["semantic_indices"][:depth], q["semantic_scores"][:depth]
+        )
+        ranked = rrf_combine_search_results(bm25, semantic, k).indices[:limit]
+        fusion_ms = (time.perf_counter() - start) * 1000
+        latencies.append(q["bm25_ms"] + q["semantic_ms"] + fusion_ms)
+
+        metrics = {
+            name: float(values[0])
+            for name, values in ranking_metrics(
+                ranked[None, :], q["relevant"], q["num_relevant"], limit
+            ).items()
         }
+        for name, value in metrics.items():
+            totals[name] = totals.get(name, 0.0) + value
 
-        total_precision += precision
-        total_recall += recall
+        results_by_query[q["query"]] = {
+            **metrics,
+            "retrieved": [titles[idx] for idx in ranked.tolist()],
+            "relevant": q["relevant_titles"],
+        }
 
+    count = max(len(legs["queries"]), 1)
+    latency = np.array(latencies) if latencies else np.zeros(1)
     return {
         "test_cases_count": len(test_cases),
         "limit": limit,
+        "cached": legs["cached"],
+        "retrieval_seconds": retrieval_s,
+        "summary": {name: total / count for name, total in totals.items()},
+        "latency_ms": {
+            "p50": float(np.percentile(latency, 50)),
+            "p95": float(np.percentile(latency, 95)),
+            "p99": float(np.percentile(latency, 99)),
+            "max": float(latency.max()),
+        },
         "results": results_by_query,
     }
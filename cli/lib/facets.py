@@ -0,0 +1,134 @@
+from typing import Any, Optional
+
+import numpy as np
+from lib.search_utils import FACET_FIELDS
+
+
+class FacetIndex:
+    def __init__(self, num_docs: int = 0):
+        self.num_docs = num_docs
+        self.masks: dict[str, dict[tuple, np.ndarray]] = {}
+
+    @classmethod
+    def build(
+        cls, documents: list[dict], fields: list[str] = FACET_FIELDS
+    ) -> "FacetIndex":
+        facets = cls(len(documents))
+        for field in fields:
+            value_masks = {}
+            for doc_idx, doc in enumerate(documents):
+                for value in facet_values(doc.get(field)):
+                    key = facet_key(value)
+                    if key not in value_masks:
+                        value_masks[key] = np.zeros(len(documents), dtype=np.bool_)
+                    value_masks[key][doc_idx] = True
+            facets.masks[field] = value_masks
+        return facets
+
+    def values(self, field: str) -> list:
+        return [value for _, value in sorted(self.masks.get(field, {}))]
+
+    def value_mask(self, field: str, value: Any) -> np.ndarray:
+        if field not in self.masks:
+            raise ValueError(f"Unknown facet: {field}")
+        mask = self.masks[field].get(facet_key(normalize_facet_value(value)))
+        if mask is None:
+            return np.zeros(self.num_docs, dtype=np.bool_)
+        return mask
+
+    def range_mask(
+        self, field: str, low: Optional[float] = None, high: Optional[float] = None
+    ) -> np.ndarray:
+        if field not in self.masks:
+            raise ValueError(f"Unknown facet: {field}")
+        mask = np.zeros(self.num_docs, dtype=np.bool_)
+        for (kind, value), value_mask in self.masks[field].items():
+            if kind != "number":
+                continue
+            if low is not None and value < low:
+                continue
+            if high is not None and value > high:
+                continue
+            mask |= value_mask
+        return mask
+
+    def compile(self, filters: Optional[dict]) -> Optional[np.ndarray]:
+        if not filters:
+            return None
+
+        mask = np.ones(self.num_docs, dtype=np.bool_)
+        for field, condition in filters.items():
+            if isinstance(condition, dict):
+                mask &= self.range_mask(field, condition.get("min"), condition.get("max"))
+                continue
+
+            field_mask = np.zeros(self.num_docs, dtype=np.bool_)
+            for value in facet_values(condition):
+                field_mask |= self.value_mask(field, value)
+            mask &= field_mask
+        return mask
+
+
+def normalize_facet_value(value: Any) -> Any:
+    if isinstance(value, str):
+        return value.strip().lower()
+    return value
+
+
+def facet_key(value: Any) -> tuple:
+    if isinstance(value, bool):
+        return ("bool", value)
+    if isinstance(value, (int, float)):
+        return ("number", value)
+    return (type(value).__name__, value)
+
+
+def facet_values(value: Any) -> list:
+    if value is None:
+        return []
+    if isinstance(value, (list, tuple, set)):
+        return [normalize_facet_value(v) for v in value]
+    return [normalize_facet_value(value)]
+
+
+def parse_filters(
+    expressions: Optional[list[str]], fields: list[str] = FACET_FIELDS
+) -> dict:
+    filters = {}
+    for expression in expressions or []:
+        if "=" not in expression:
+            raise ValueError(f"Invalid filter '{expression}', expected field=value")
+        field, value = expression.split("=", 1)
+        field = field.strip()
+        if field not in fields:
+            raise ValueError(
+                f"Unknown filter field '{field}', expected one of: {', '.join(fields)}"
+            )
+
+        if ".." in value:
+            low, high = value.split("..", 1)
+            try:
+                filters[field] = {
+                    "min": float(low) if low else None,
+                    "max": float(high) if high else None,
+                }
+            except ValueError:
+                raise ValueError(f"Invalid range in filter '{expression}'")
+            continue
+
+        values = [parse_facet_value(v) for v in value.split(",")]
+        filters.setdefault(field, [])
+        filters[field].extend(values)
+    return filters
+
+
+def parse_facet_value(value: str) -> Any:
+    value = value.strip()
+    if value.lower() in ("true", "false"):
+        return value.lower() == "true"
+    for cast in (int, float):
+        try:
+            return cast(value)
+        except ValueError:
+            continue
+    return value
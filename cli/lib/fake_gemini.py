@@ -0,0 +1,115 @@
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Optional
+
+
+def default_responder(prompt: str) -> str:
+    if "Rate 0-10" in prompt:
+        return "5"
+    ids = re.findall(r"^(\d+): ", prompt, flags=re.MULTILINE)
+    if ids:
+        return json.dumps([int(doc_id) for doc_id in ids])
+    return "This is a fake Gemini response."
+
+
+def candidate_payload(text: str) -> dict:
+    return {
+        "candidates": [
+            {
+                "content": {"role": "model", "parts": [{"text": text}]},
+                "finishReason": "STOP",
+            }
+        ]
+    }
+
+
+class FakeGeminiServer:
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.0,
+        failure_rate: float = 0.0,
+        responder: Optional[Callable[[str], str]] = None,
+        chunk_latency: float = 0.0,
+    ):
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.chunk_latency = chunk_latency
+        self.responder = responder or default_responder
+        self.request_count = 0
+        self.lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), self.__handler())
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length", 0))
+                body = json.loads(self.rfile.read(length) or b"{}")
+
+                with fake.lock:
+                    fake.request_count += 1
+                    count = fake.request_count
+
+                if fake.latency:
+                    time.sleep(fake.latency)
+
+                if fake.failure_rate and (count * fake.failure_rate) % 1 < fake.failure_rate:
+                    self.send_error(503, "Fake overload")
+                    return
+
+                prompt = "".join(
+                    part.get("text", "")
+                    for content in body.get("contents", [])
+                    for part in content.get("parts", [])
+                )
+                text = fake.responder(prompt)
+
+                if "streamGenerateContent" in self.path:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.end_headers()
+                    for chunk in re.findall(r"\S+\s*", text) or [text]:
+                        payload = json.dumps(candidate_payload(chunk))
+                        self.wfile.write(f"data: {payload}\r\n\r\n".encode("utf-8"))
+                        self.wfile.flush()
+                        if fake.chunk_latency:
+                            time.sleep(fake.chunk_latency)
+                    return
+
+                data = json.dumps(candidate_payload(text)).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self) -> "FakeGeminiServer":
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> "FakeGeminiServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
@@ -0,0 +1,243 @@
+import gc
+import mmap
+import os
+import sys
+import types
+from typing import Any, Callable, Optional
+
+import numpy as np
+from lib.document_store import DocumentStore
+from lib.facets import FacetIndex
+from lib.inverted_index import InvertedIndex
+from lib.multimodal_search import MultimodalSearch
+from lib.reranking import get_cross_encoder
+from lib.search_utils import CACHE_DIR, load_movies
+from lib.semantic_search import ChunkedSemanticSearch
+
+FOOTPRINT_COMPONENTS = [
+    "documents",
+    "document_store",
+    "facets",
+    "bm25_index",
+    "embedding_model",
+    "chunk_embeddings",
+    "cross_encoder",
+    "clip",
+]
+SKIPPED_TYPES = (type, types.ModuleType, types.FunctionType, types.MethodType)
+
+
+class ObjectSizes:
+    def __init__(self):
+        self.python_bytes = 0
+        self.array_bytes = 0
+        self.mapped_bytes = 0
+        self.seen: set[int] = set()
+        self.arrays: set[int] = set()
+
+    def add(self, obj: Any) -> "ObjectSizes":
+        stack = [obj]
+        while stack:
+            item = stack.pop()
+            if id(item) in self.seen or isinstance(item, SKIPPED_TYPES):
+                continue
+            self.seen.add(id(item))
+
+            if isinstance(item, np.ndarray):
+                self.__add_array(item)
+                continue
+            if hasattr(item, "parameters") and callable(item.parameters):
+                continue
+
+            self.python_bytes += sys.getsizeof(item)
+            if isinstance(item, dict):
+                stack.extend(item.keys())
+                stack.extend(item.values())
+            elif isinstance(item, (list, tuple, set, frozenset)):
+                stack.extend(item)
+            elif not isinstance(item, (str, bytes, int, float, bool)):
+                if hasattr(item, "__dict__"):
+                    stack.append(vars(item))
+                for slot in getattr(type(item), "__slots__", ()):
+                    if hasattr(item, slot):
+                        stack.append(getattr(item, slot))
+        return self
+
+    def __add_array(self, array: np.ndarray) -> None:
+        self.python_bytes += sys.getsizeof(array) - (
+            array.nbytes if array.base is None else 0
+        )
+        root = array
+        while isinstance(root.base, np.ndarray):
+            root = root.base
+        if id(root) in self.arrays:
+            return
+        self.arrays.add(id(root))
+        if isinstance(root, np.memmap) or isinstance(root.base, mmap.mmap):
+            self.mapped_bytes += root.nbytes
+        else:
+            self.array_bytes += root.nbytes
+
+    def as_dict(self) -> dict:
+        return {
+            "python_bytes": self.python_bytes,
+            "array_bytes": self.array_bytes,
+            "mapped_bytes": self.mapped_bytes,
+        }
+
+
+def object_sizes(*objects: Any) -> dict:
+    sizes = ObjectSizes()
+    for obj in objects:
+        sizes.add(obj)
+    return sizes.as_dict()
+
+
+def model_bytes(model: Any) -> int:
+    module = model if hasattr(model, "parameters") else getattr(model, "model", None)
+    if module is None:
+        return 0
+    total = 0
+    for tensor in list(module.parameters()) + list(module.buffers()):
+        total += tensor.numel() * tensor.element_size()
+    return total
+
+
+def rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/statm", "r") as f:
+            resident = int(f.read().split()[1])
+    except (OSError, ValueError, IndexError):
+        return None
+    return resident * os.sysconf("SC_PAGE_SIZE")
+
+
+def mapped_file_pages(directory: str = CACHE_DIR) -> dict[str, dict]:
+    try:
+        with open("/proc/self/smaps", "r") as f:
+            lines = f.readlines()
+    except OSError:
+        return {}
+
+    directory = os.path.realpath(directory)
+    pages: dict[str, dict] = {}
+    current = None
+    for line in lines:
+        fields = line.split()
+        if not fields:
+            continue
+        if not fields[0].endswith(":"):
+            path = fields[5] if len(fields) > 5 else ""
+            current = None
+            if path.startswith(directory):
+                current = pages.setdefault(
+                    os.path.relpath(path, directory),
+                    {"rss_bytes": 0, "shared_bytes": 0, "private_bytes": 0},
+                )
+            continue
+        if current is None:
+            continue
+        match fields[0]:
+            case "Rss:":
+                current["rss_bytes"] += int(fields[1]) * 1024
+            case "Shared_Clean:" | "Shared_Dirty:":
+                current["shared_bytes"] += int(fields[1]) * 1024
+            case "Private_Clean:" | "Private_Dirty:":
+                current["private_bytes"] += int(fields[1]) * 1024
+    return pages
+
+
+def measure(loader: Callable[[], Any]) -> tuple[Any, Optional[int]]:
+    gc.collect()
+    before = rss_bytes()
+    loaded = loader()
+    gc.collect()
+    after = rss_bytes()
+    if before is None or after is None:
+        return loaded, None
+    return loaded, after - before
+
+
+def footprint_command(components: Optional[list[str]] = None) -> dict:
+    selected = components or FOOTPRINT_COMPONENTS
+    report = []
+
+    def record(name: str, rss_delta: Optional[int], **details) -> None:
+        report.append({"component": name, "rss_delta_bytes": rss_delta, **details})
+
+    start_rss = rss_bytes()
+    documents, rss_delta = measure(load_movies)
+    if "documents" in selected:
+        record("documents", rss_delta, **object_sizes(documents))
+
+    store, rss_delta = measure(lambda: DocumentStore.for_documents(documents))
+    if "document_store" in selected:
+        record("document_store", rss_delta, **object_sizes(store))
+
+    if "facets" in selected:
+        facets, rss_delta = measure(lambda: FacetIndex.build(documents))
+        record("facets", rss_delta, **object_sizes(facets))
+
+    if "bm25_index" in selected:
+        def load_index() -> InvertedIndex:
+            index = InvertedIndex(store)
+            if os.path.exists(index.index_path):
+                index.load()
+            if index.content_hash != store.content_hash:
+                index.build(documents)
+            return index
+
+        index, rss_delta = measure(load_index)
+        record(
+            "bm25_index",
+            rss_delta,
+            **object_sizes(
+                index.vocabulary,
+                index.posting_offsets,
+                index.posting_docs,
+                index.posting_tfs,
+                index.doc_lengths,
+            ),
+        )
+
+    if "embedding_model" in selected or "chunk_embeddings" in selected:
+        semantic, rss_delta = measure(lambda: ChunkedSemanticSearch(store=store))
+        if "embedding_model" in selected:
+            record(
+                "embedding_model", rss_delta, model_bytes=model_bytes(semantic.model)
+            )
+
+    if "chunk_embeddings" in selected:
+        _, rss_delta = measure(
+            lambda: semantic.load_or_create_chunk_embeddings(documents)
+        )
+        record(
+            "chunk_embeddings",
+            rss_delta,
+            **object_sizes(
+                semantic.chunk_embeddings,
+                semantic.chunk_metadata,
+                semantic.chunk_doc_indices,
+            ),
+        )
+
+    if "cross_encoder" in selected:
+        cross_encoder, rss_delta = measure(get_cross_encoder)
+        record("cross_encoder", rss_delta, model_bytes=model_bytes(cross_encoder))
+
+    if "clip" in selected:
+        clip, rss_delta = measure(lambda: MultimodalSearch(docs=documents, store=store))
+        record(
+            "clip",
+            rss_delta,
+            model_bytes=model_bytes(clip.model),
+            **object_sizes(clip.text_embeddings, clip.texts),
+        )
+
+    end_rss = rss_bytes()
+    return {
+        "components": report,
+        "mapped_files": mapped_file_pages(),
+        "start_rss_bytes": start_rss,
+        "end_rss_bytes": end_rss,
+    }
@@ -1,44 +1,293 @@
 import os
-from typing import Optional
-
-from lib.reranking import rerank_result
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, Optional
+
+import numpy as np
+from lib.document_store import DocumentStore
+from lib.facets import FacetIndex
+from lib.multimodal_search import MultimodalSearch
+from lib.pagination import CursorCache, decode_cursor, encode_cursor
+from lib.reranking import cascade_rerank, rerank_result
 from lib.query_enhancement import enhance_query
-from lib.search_utils import DEFAULT_K_VALUE, format_search_result, load_movies
+from lib.search_utils import (BM25_B, BM25_K1, CANDIDATE_MULTIPLIER,
+                              DEFAULT_K_VALUE, IMAGE_LEG_WEIGHT, SearchHits,
+                              iter_top_k, load_movies,
+                              preprocess_text, tokenize)
+from lib.tracing import span, submit_in_context, traced
 
 from .keyword_search import InvertedIndex
 from .semantic_search import ChunkedSemanticSearch
 
 
 class HybridSearch:
-    def __init__(self, documents):
+    @traced("hybrid.init")
+    def __init__(self, documents, bm25_k1: float = BM25_K1, bm25_b: float = BM25_B):
         self.documents = documents
-        self.semantic_search = ChunkedSemanticSearch()
+        self.bm25_k1 = bm25_k1
+        self.bm25_b = bm25_b
+        with span("store.load"):
+            self.store = DocumentStore.for_documents(documents)
+        with span("facets.build"):
+            self.facets = FacetIndex.build(documents)
+        self.cursors = CursorCache()
+        self.semantic_search = ChunkedSemanticSearch(store=self.store)
         self.semantic_search.load_or_create_chunk_embeddings(documents)
+        self.multimodal_search: Optional[MultimodalSearch] = None
 
-        self.idx = InvertedIndex()
-        if not os.path.exists(self.idx.index_path):
-            self.idx.build()
+        self.idx = InvertedIndex(store=self.store)
+        if os.path.exists(self.idx.index_path):
+            self.idx.load()
+        if self.idx.content_hash != self.store.content_hash:
+            self.idx.build(documents)
             self.idx.save()
 
-    def _bm25_search(self, query: str, limit: int) -> list[dict]:
-        self.idx.load()
-        return self.idx.bm25_search(query, limit)
-
-    def weighted_search(self, query: str, alpha: float, limit: int = 5):
-        bm25_result = self._bm25_search(query, limit * 500)
-        semantic_search_result = self.semantic_search.search_chunks(query, limit * 500)
-
-        combined = combine_search_results(bm25_result, semantic_search_result, alpha)
+    def _bm25_search(
+        self, query: str, limit: int, mask: Optional[np.ndarray] = None
+    ) -> SearchHits:
+        return self.idx.bm25_search_hits(
+            query, limit, mask, self.bm25_k1, self.bm25_b
+        )
 
-        return combined[:limit]
+    @traced("image.search")
+    def _image_search(
+        self, image_path: str, limit: int, mask: Optional[np.ndarray] = None
+    ) -> SearchHits:
+        if self.multimodal_search is None:
+            self.multimodal_search = MultimodalSearch(
+                docs=self.documents, store=self.store
+            )
+        return self.multimodal_search.image_search_hits(image_path, limit, mask)
+
+    @traced("hybrid.legs")
+    def _search_legs(
+        self,
+        query: str,
+        depth: int,
+        mask: Optional[np.ndarray] = None,
+        image_path: Optional[str] = None,
+    ) -> dict[str, SearchHits]:
+        if not image_path:
+            return {
+                "bm25": self._bm25_search(query, depth, mask),
+                "semantic": self.semantic_search.search_chunk_hits(query, depth, mask),
+            }
 
-    def rrf_search(self, query: str, k, limit: int = 10):
-        bm25_result = self._bm25_search(query, limit * 500)
-        semantic_result = self.semantic_search.search_chunks(query, limit * 500)
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = {
+                "image": submit_in_context(
+                    executor, self._image_search, image_path, depth, mask
+                )
+            }
+            if query.strip():
+                futures["bm25"] = submit_in_context(
+                    executor, self._bm25_search, query, depth, mask
+                )
+                futures["semantic"] = submit_in_context(
+                    executor, self.semantic_search.search_chunk_hits, query, depth, mask
+                )
+            return {name: future.result() for name, future in futures.items()}
+
+    def weighted_search(
+        self,
+        query: str,
+        alpha: float,
+        limit: int = 5,
+        filters: Optional[dict] = None,
+        image_path: Optional[str] = None,
+        image_weight: float = IMAGE_LEG_WEIGHT,
+    ):
+        return list(
+            self.iter_weighted_search(
+                query, alpha, limit, filters, image_path, image_weight
+            )
+        )
 
-        combined = rrf_combine_search_results(bm25_result, semantic_result, k)
+    def iter_weighted_search(
+        self,
+        query: str,
+        alpha: float,
+        limit: int = 5,
+        filters: Optional[dict] = None,
+        image_path: Optional[str] = None,
+        image_weight: float = IMAGE_LEG_WEIGHT,
+    ) -> Iterator[dict]:
+        mask = self.facets.compile(filters)
+        depth = limit * CANDIDATE_MULTIPLIER
+        legs = self._search_legs(query, depth, mask, image_path)
+
+        text_weight = 1 - image_weight if "image" in legs else 1.0
+        weights = {
+            "bm25": alpha * text_weight,
+            "semantic": (1 - alpha) * text_weight,
+            "image": image_weight if len(legs) > 1 else 1.0,
+        }
+        yield from self._iter_fused(weighted_leg_scores(legs, weights), limit)
+
+    def _rrf_candidates(
+        self,
+        query: str,
+        k,
+        depth: int,
+        mask: Optional[np.ndarray] = None,
+        image_path: Optional[str] = None,
+    ) -> tuple[SearchHits, bool]:
+        legs = self._search_legs(query, depth, mask, image_path)
+        return self._fuse_rrf(legs, k, depth)
+
+    def _fuse_rrf(
+        self, legs: dict[str, SearchHits], k, depth: int
+    ) -> tuple[SearchHits, bool]:
+        combined = rrf_combine_legs(legs, k)
+        exhausted = all(len(hits.indices) < depth for hits in legs.values())
+        return combined, exhausted
+
+    def rrf_search(
+        self,
+        query: str,
+        k,
+        limit: int = 10,
+        filters: Optional[dict] = None,
+        image_path: Optional[str] = None,
+    ):
+        return list(self.iter_rrf_search(query, k, limit, filters, image_path))
+
+    def iter_rrf_search(
+        self,
+        query: str,
+        k,
+        limit: int = 10,
+        filters: Optional[dict] = None,
+        image_path: Optional[str] = None,
+    ) -> Iterator[dict]:
+        mask = self.facets.compile(filters)
+        legs = self._search_legs(query, limit * CANDIDATE_MULTIPLIER, mask, image_path)
+        yield from self._iter_fused(rrf_leg_scores(legs, k), limit)
+
+    def _iter_fused(self, fused: SearchHits, limit: int) -> Iterator[dict]:
+        metadata = fused.metadata or {}
+        for pos in iter_top_k(fused.scores, limit):
+            yield self.store.result(
+                int(fused.indices[pos]),
+                float(fused.scores[pos]),
+                **{name: values[pos].item() for name, values in metadata.items()},
+            )
+
+    def speculative_rrf_search(
+        self,
+        query: str,
+        enhance: Callable[[str], str],
+        k,
+        limit: int = 10,
+        filters: Optional[dict] = None,
+    ) -> tuple[list[dict], str, dict[str, str]]:
+        mask = self.facets.compile(filters)
+        depth = limit * CANDIDATE_MULTIPLIER
+
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            enhanced_future = submit_in_context(executor, enhance, query)
+            bm25_future = submit_in_context(
+                executor, self._bm25_search, query, depth, mask
+            )
+            semantic_future = submit_in_context(
+                executor, self.semantic_search.search_chunk_hits, query, depth, mask
+            )
+
+            enhanced_query = enhanced_future.result()
+            speculation = {"bm25": "reused", "semantic": "reused"}
+            if sorted(tokenize(enhanced_query)) != sorted(tokenize(query)):
+                bm25_future = submit_in_context(
+                    executor, self._bm25_search, enhanced_query, depth, mask
+                )
+                speculation["bm25"] = "rerun"
+            if preprocess_text(enhanced_query).split() != preprocess_text(query).split():
+                semantic_future = submit_in_context(
+                    executor,
+                    self.semantic_search.search_chunk_hits,
+                    enhanced_query,
+                    depth,
+                    mask,
+                )
+                speculation["semantic"] = "rerun"
+
+            combined, _ = self._fuse_rrf(
+                {"bm25": bm25_future.result(), "semantic": semantic_future.result()},
+                k,
+                depth,
+            )
+
+        return self.store.hydrate(combined, limit), enhanced_query, speculation
+
+    def rrf_search_page(
+        self,
+        query: str,
+        k=DEFAULT_K_VALUE,
+        limit: int = 5,
+        cursor: Optional[str] = None,
+        filters: Optional[dict] = None,
+    ) -> dict:
+        if cursor:
+            cursor_id, offset = decode_cursor(cursor)
+            state = self.cursors.get(cursor_id)
+            if state is None:
+                raise ValueError(f"Cursor expired or unknown: {cursor}")
+        else:
+            cursor_id, offset = None, 0
+            state = {
+                "query": query,
+                "k": k,
+                "filters": filters,
+                "depth": limit * CANDIDATE_MULTIPLIER,
+                "exhausted": False,
+                "indices": [],
+                "scores": [],
+                "metadata": {},
+            }
 
-        return combined[:limit]
+        self._extend_candidates(state, offset + limit + 1)
+        if cursor_id is None:
+            cursor_id = self.cursors.create(state)
+        else:
+            self.cursors.update(cursor_id, state)
+
+        end = offset + limit
+        page = SearchHits(
+            np.array(state["indices"][offset:end], dtype=np.int32),
+            np.array(state["scores"][offset:end]),
+            {
+                name: np.array(values[offset:end])
+                for name, values in state["metadata"].items()
+            },
+        )
+        has_more = end < len(state["indices"]) or not state["exhausted"]
+
+        return {
+            "query": state["query"],
+            "k": state["k"],
+            "filters": state["filters"],
+            "offset": offset,
+            "results": self.store.hydrate(page),
+            "next_cursor": encode_cursor(cursor_id, end) if has_more else None,
+        }
+
+    def _extend_candidates(self, state: dict, needed: int) -> None:
+        mask = self.facets.compile(state["filters"])
+        while len(state["indices"]) < needed and not state["exhausted"]:
+            if state["indices"]:
+                state["depth"] *= 2
+
+            combined, state["exhausted"] = self._rrf_candidates(
+                state["query"], state["k"], state["depth"], mask
+            )
+
+            served = set(state["indices"])
+            metadata = combined.metadata or {}
+            for pos, idx in enumerate(combined.indices.tolist()):
+                if idx in served:
+                    continue
+                state["indices"].append(idx)
+                state["scores"].append(float(combined.scores[pos]))
+                for name, values in metadata.items():
+                    state["metadata"].setdefault(name, []).append(values[pos].item())
 
 
 def rrf_search_command(
@@ -47,6 +296,10 @@ def rrf_search_command(
     enhance: Optional[str] = None,
     rerank_method: Optional[str] = None,
     limit: int = 5,
+    filters: Optional[dict] = None,
+    local_enhance: bool = True,
+    speculative: bool = False,
+    image_path: Optional[str] = None,
 ) -> dict:
     movies = load_movies()
     hybrid_search = HybridSearch(movies)
@@ -56,15 +309,31 @@ def rrf_search_command(
 
     original_query = query
     enhanced_query = None
-    if enhance:
-        enhanced_query = enhance_query(query, method=enhance)
-        query = enhanced_query
-
+    speculation = None
     search_limit = limit * 5 if rerank_method else limit
-    results = hybrid_search.rrf_search(query, k, search_limit)
+    if enhance and speculative and not image_path:
+        results, enhanced_query, speculation = hybrid_search.speculative_rrf_search(
+            query,
+            lambda q: enhance_query(q, method=enhance, local=local_enhance),
+            k,
+            search_limit,
+            filters,
+        )
+        query = enhanced_query
+    else:
+        if enhance:
+            enhanced_query = enhance_query(query, method=enhance, local=local_enhance)
+            query = enhanced_query
+        results = hybrid_search.rrf_search(
+            query, k, search_limit, filters, image_path
+        )
 
     reranked = False
-    if rerank_method:
+    rerank_stages = []
+    if rerank_method == "cascade":
+        results, rerank_stages = cascade_rerank(query, results, limit)
+        reranked = True
+    elif rerank_method:
         results = rerank_result(query, results, rerank_method, limit)
         reranked = True
 
@@ -72,28 +341,91 @@ def rrf_search_command(
         "original_query": original_query,
         "enhanced_query": enhanced_query,
         "enhanced_method": enhance,
+        "speculation": speculation,
         "query": query,
         "k": k,
+        "filters": filters,
+        "image_path": image_path,
         "rerank_method": rerank_method,
         "reranked": reranked,
+        "rerank_stages": rerank_stages,
         "results": results,
     }
 
 
-def weighted_search_command(query: str, alpha: float = 0.5, limit: int = 5) -> dict:
+def iter_rrf_search_command(
+    query: str,
+    k: int = DEFAULT_K_VALUE,
+    enhance: Optional[str] = None,
+    limit: int = 5,
+    filters: Optional[dict] = None,
+    local_enhance: bool = True,
+    image_path: Optional[str] = None,
+) -> Iterator[dict]:
+    movies = load_movies()
+    hybrid_search = HybridSearch(movies)
+
+    if enhance:
+        query = enhance_query(query, method=enhance, local=local_enhance)
+
+    yield from hybrid_search.iter_rrf_search(query, k, limit, filters, image_path)
+
+
+def rrf_page_command(
+    query: str,
+    k: int = DEFAULT_K_VALUE,
+    limit: int = 5,
+    cursor: Optional[str] = None,
+    filters: Optional[dict] = None,
+) -> dict:
+    movies = load_movies()
+    hybrid_search = HybridSearch(movies)
+
+    return hybrid_search.rrf_search_page(query, k, limit, cursor, filters)
+
+
+def weighted_search_command(
+    query: str,
+    alpha: float = 0.5,
+    limit: int = 5,
+    filters: Optional[dict] = None,
+    image_path: Optional[str] = None,
+    image_weight: float = IMAGE_LEG_WEIGHT,
+) -> dict:
     movies = load_movies()
     hybrid_search = HybridSearch(movies)
 
-    result = hybrid_search.weighted_search(query, alpha, limit)
+    result = hybrid_search.weighted_search(
+        query, alpha, limit, filters, image_path, image_weight
+    )
 
     return {
         "original_query": query,
         "query": query,
         "alpha": alpha,
+        "filters": filters,
+        "image_path": image_path,
+        "image_weight": image_weight,
         "results": result,
     }
 
 
+def iter_weighted_search_command(
+    query: str,
+    alpha: float = 0.5,
+    limit: int = 5,
+    filters: Optional[dict] = None,
+    image_path: Optional[str] = None,
+    image_weight: float = IMAGE_LEG_WEIGHT,
+) -> Iterator[dict]:
+    movies = load_movies()
+    hybrid_search = HybridSearch(movies)
+
+    yield from hybrid_search.iter_weighted_search(
+        query, alpha, limit, filters, image_path, image_weight
+    )
+
+
 def normalize_scores(scores: list[float]) -> list[float]:
     if not scores:
         return []
@@ -111,117 +443,105 @@ def normalize_scores(scores: list[float]) -> list[float]:
     return norm_scores
 
 
-def normalize_search_results(results: list[dict]) -> list[dict]:
-    scores = []
-    for result in results:
-        scores.append(result["score"])
+def normalize_score_array(scores: np.ndarray) -> np.ndarray:
+    if scores.size == 0:
+        return scores.astype(np.float32)
+
+    min_score = scores.min()
+    max_score = scores.max()
+
+    if min_score == max_score:
+        return np.ones(scores.size, dtype=np.float32)
+
+    return ((scores - min_score) / (max_score - min_score)).astype(np.float32)
 
-    norm_scores = normalize_scores(scores)
-    for i, result in enumerate(results):
-        result["normalized_score"] = norm_scores[i]
 
-    return results
+def scatter_to_union(
+    union: np.ndarray, indices: np.ndarray, values: np.ndarray
+) -> np.ndarray:
+    out = np.zeros(union.size, dtype=values.dtype)
+    out[np.searchsorted(union, indices)] = values
+    return out
 
 
-def hybrid_score(bm25_score: float, semantic_score: float, alpha: float = 0.5) -> float:
+def hybrid_score(bm25_score, semantic_score, alpha: float = 0.5):
     return alpha * bm25_score + (1 - alpha) * semantic_score
 
 
 def combine_search_results(
-    bm25_results: list[dict], semantic_results: list[dict], alpha: float = 0.5
-) -> list[dict]:
-    bm25_normalized = normalize_search_results(bm25_results)
-    semantic_normalized = normalize_search_results(semantic_results)
-
-    combined_scores = {}
-
-    for result in bm25_normalized:
-        doc_id = result["id"]
-        if doc_id not in combined_scores:
-            combined_scores[doc_id] = {
-                "title": result["title"],
-                "document": result["document"],
-                "bm25_score": 0.0,
-                "semantic_score": 0.0,
-            }
-        if result["normalized_score"] > combined_scores[doc_id]["bm25_score"]:
-            combined_scores[doc_id]["bm25_score"] = result["normalized_score"]
-
-    for result in semantic_normalized:
-        doc_id = result["id"]
-        if doc_id not in combined_scores:
-            combined_scores[doc_id] = {
-                "title": result["title"],
-                "document": result["document"],
-                "bm25_score": 0.0,
-                "semantic_score": 0.0,
-            }
-        if result["normalized_score"] > combined_scores[doc_id]["semantic_score"]:
-            combined_scores[doc_id]["semantic_score"] = result["normalized_score"]
-
-    hybrid_results = []
-    for doc_id, data in combined_scores.items():
-        score_value = hybrid_score(data["bm25_score"], data["semantic_score"], alpha)
-        result = format_search_result(
-            doc_id=doc_id,
-            title=data["title"],
-            document=data["document"],
-            score=score_value,
-            bm25_score=data["bm25_score"],
-            semantic_score=data["semantic_score"],
+    bm25_results: SearchHits, semantic_results: SearchHits, alpha: float = 0.5
+) -> SearchHits:
+    return combine_legs(
+        {"bm25": bm25_results, "semantic": semantic_results},
+        {"bm25": alpha, "semantic": 1 - alpha},
+    )
+
+
+def combine_legs(
+    legs: dict[str, SearchHits], weights: dict[str, float]
+) -> SearchHits:
+    return sort_hits(weighted_leg_scores(legs, weights))
+
+
+@traced("fusion.weighted")
+def weighted_leg_scores(
+    legs: dict[str, SearchHits], weights: dict[str, float]
+) -> SearchHits:
+    union = leg_union(legs)
+
+    scores = np.zeros(union.size, dtype=np.float64)
+    metadata = {}
+    for name, hits in legs.items():
+        leg_scores = scatter_to_union(
+            union, hits.indices, normalize_score_array(hits.scores)
         )
-        hybrid_results.append(result)
+        scores += weights[name] * leg_scores
+        metadata[f"{name}_score"] = leg_scores
 
-    return sorted(hybrid_results, key=lambda x: x["score"], reverse=True)
+    return SearchHits(union.astype(np.int32), scores, metadata)
 
 
-def rrf_score(rank: int, k: int = DEFAULT_K_VALUE) -> float:
+def rrf_score(rank, k: int = DEFAULT_K_VALUE):
     return 1 / (rank + k)
 
 
 def rrf_combine_search_results(
-    bm25_results: list[dict], semantic_results: list[dict], k: int = DEFAULT_K_VALUE
-):
-    combined = {}
-
-    for i, result in enumerate(bm25_results, 1):
-        doc_id = result["id"]
-        if doc_id not in combined:
-            combined[doc_id] = {
-                "title": result["title"],
-                "document": result["document"],
-                "bm25_rank": 0,
-                "semantic_rank": 0,
-            }
-        combined[doc_id]["bm25_rank"] = i
-
-    for i, result in enumerate(semantic_results, 1):
-        doc_id = int(result["id"])
-        if doc_id not in combined:
-            combined[doc_id] = {
-                "title": result["title"],
-                "document": result["document"],
-                "bm25_rank": 0,
-                "semantic_rank": 0,
-            }
-        combined[doc_id]["semantic_rank"] = i
-
-    hybrid_results = []
-    for doc_id, data in combined.items():
-        total_rrf = 0
-        if data["bm25_rank"] != 0:
-            total_rrf += rrf_score(data["bm25_rank"], k)
-        if data["semantic_rank"] != 0:
-            total_rrf += rrf_score(data["semantic_rank"], k)
-
-        result = format_search_result(
-            doc_id=doc_id,
-            title=data["title"],
-            document=data["document"],
-            score=total_rrf,
-            bm25_rank=data["bm25_rank"],
-            semantic_rank=data["semantic_rank"],
-        )
-        hybrid_results.append(result)
+    bm25_results: SearchHits, semantic_results: SearchHits, k: int = DEFAULT_K_VALUE
+) -> SearchHits:
+    return rrf_combine_legs({"bm25": bm25_results, "semantic": semantic_results}, k)
+
+
+def rrf_combine_legs(
+    legs: dict[str, SearchHits], k: int = DEFAULT_K_VALUE
+) -> SearchHits:
+    return sort_hits(rrf_leg_scores(legs, k))
+
+
+@traced("fusion.rrf")
+def rrf_leg_scores(legs: dict[str, SearchHits], k: int = DEFAULT_K_VALUE) -> SearchHits:
+    union = leg_union(legs)
+
+    scores = np.zeros(union.size, dtype=np.float64)
+    metadata = {}
+    for name, hits in legs.items():
+        ranks = scatter_to_union(union, hits.indices, np.arange(1, hits.indices.size + 1))
+        scores += np.where(ranks != 0, rrf_score(ranks, k), 0.0)
+        metadata[f"{name}_rank"] = ranks
+
+    return SearchHits(union.astype(np.int32), scores, metadata)
+
+
+def sort_hits(hits: SearchHits) -> SearchHits:
+    order = np.argsort(-hits.scores, kind="stable")
+    return SearchHits(
+        hits.indices[order],
+        hits.scores[order],
+        {name: values[order] for name, values in (hits.metadata or {}).items()},
+    )
+
 
-    return sorted(hybrid_results, key=lambda x: x["score"], reverse=True)
+def leg_union(legs: dict[str, SearchHits]) -> np.ndarray:
+    union = np.empty(0, dtype=np.int32)
+    for hits in legs.values():
+        union = np.union1d(union, hits.indices)
+    return union
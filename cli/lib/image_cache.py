@@ -0,0 +1,96 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+import numpy as np
+from lib.search_utils import IMAGE_CACHE_MAX_ENTRIES, IMAGE_CACHE_PATH
+
+
+def content_key(data: bytes, model_name: str) -> str:
+    digest = hashlib.blake2b(data, digest_size=16).hexdigest()
+    return f"{model_name}:{digest}"
+
+
+class ImageEmbeddingCache:
+    def __init__(
+        self,
+        path: str = IMAGE_CACHE_PATH,
+        max_entries: int = IMAGE_CACHE_MAX_ENTRIES,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.connection: Optional[sqlite3.Connection] = None
+
+    def __connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    embedding BLOB NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_accessed_at ON embeddings (accessed_at)"
+            )
+            self.connection.commit()
+        return self.connection
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys: list[str]) -> dict[str, np.ndarray]:
+        if not keys:
+            return {}
+
+        with self.lock:
+            connection = self.__connect()
+            placeholders = ",".join("?" * len(keys))
+            rows = connection.execute(
+                f"SELECT key, embedding FROM embeddings WHERE key IN ({placeholders})",
+                keys,
+            ).fetchall()
+            if rows:
+                connection.executemany(
+                    "UPDATE embeddings SET accessed_at = ? WHERE key = ?",
+                    [(time.time(), key) for key, _ in rows],
+                )
+                connection.commit()
+
+        return {
+            key: np.frombuffer(blob, dtype=np.float16).astype(np.float32)
+            for key, blob in rows
+        }
+
+    def put(self, key: str, embedding: np.ndarray) -> None:
+        self.put_many({key: embedding})
+
+    def put_many(self, embeddings: dict[str, np.ndarray]) -> None:
+        if not embeddings:
+            return
+
+        with self.lock:
+            connection = self.__connect()
+            now = time.time()
+            connection.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [
+                    (key, np.asarray(embedding, dtype=np.float16).tobytes(), now)
+                    for key, embedding in embeddings.items()
+                ],
+            )
+            (count,) = connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+            if count > self.max_entries:
+                connection.execute(
+                    """DELETE FROM embeddings WHERE key IN (
+                        SELECT key FROM embeddings ORDER BY accessed_at ASC LIMIT ?
+                    )""",
+                    (count - self.max_entries,),
+                )
+            connection.commit()
@@ -1,47 +1,53 @@
+import json
 import math
 import os
-import pickle
 from collections import Counter, defaultdict
+from typing import Iterator, Optional
 
-from lib.search_utils import (BM25_B, BM25_K1, PROJECT_ROOT,
-                              format_search_result, load_movies, tokenize)
+import numpy as np
+from lib.document_store import DocumentStore
+from lib.search_utils import (BM25_B, BM25_K1, PROJECT_ROOT, SearchHits,
+                              iter_top_k, load_movies, tokenize, top_k_indices)
+from lib.tracing import span, traced
 
 
 class InvertedIndex:
-    def __init__(self):
-        self.index = defaultdict(set)
-        self.docmap: dict[int, dict] = {}
-        self.index_path = os.path.join(PROJECT_ROOT, "cache", "index.pkl")
-        self.docmap_path = os.path.join(PROJECT_ROOT, "cache", "docmap.pkl")
-        self.term_frequencies = defaultdict(Counter)
-        self.term_frequencies_path = os.path.join(
-            PROJECT_ROOT, "cache", "term_frequencies.pkl"
+    def __init__(self, store: Optional[DocumentStore] = None):
+        self.store = store if store is not None else DocumentStore()
+        self.vocabulary: dict[str, int] = {}
+        self.posting_offsets = np.zeros(1, dtype=np.int64)
+        self.posting_docs = np.empty(0, dtype=np.int32)
+        self.posting_tfs = np.empty(0, dtype=np.int32)
+        self.doc_lengths = np.empty(0, dtype=np.int32)
+        self.content_hash = ""
+        self.index_path = os.path.join(PROJECT_ROOT, "cache", "bm25_postings.npz")
+        self.vocabulary_path = os.path.join(
+            PROJECT_ROOT, "cache", "bm25_vocabulary.json"
         )
-        self.doc_lengths = {}
-        self.doc_lengths_path = os.path.join(PROJECT_ROOT, "cache", "doc_lengths.pkl")
 
-    def __add_document(self, doc_id: int, text: str) -> None:
-        tokens = tokenize(text)
-        total_tokens = len(tokens)
-        self.doc_lengths[doc_id] = total_tokens
-        for token in set(tokens):
-            self.index[token].add(doc_id)
-        self.term_frequencies[doc_id].update(tokens)
+    def __postings(self, token: str) -> tuple[np.ndarray, np.ndarray]:
+        row = self.vocabulary.get(token)
+        if row is None:
+            return self.posting_docs[:0], self.posting_tfs[:0]
+        start, end = self.posting_offsets[row], self.posting_offsets[row + 1]
+        return self.posting_docs[start:end], self.posting_tfs[start:end]
+
+    def __term_frequency(self, doc_idx: int, token: str) -> int:
+        docs, tfs = self.__postings(token)
+        pos = np.searchsorted(docs, doc_idx)
+        if pos < len(docs) and docs[pos] == doc_idx:
+            return int(tfs[pos])
+        return 0
 
     def get_documents(self, term: str) -> list[int]:
-        doc_ids = self.index.get(term, set())
-        return sorted(list(doc_ids))
+        docs, _ = self.__postings(term)
+        return sorted(self.store.doc_id(int(doc_idx)) for doc_idx in docs)
 
     def __get_avg_doc_length(self) -> float:
         if len(self.doc_lengths) == 0:
             return 0.0
 
-        total_length = 0
-        total_docs = len(self.doc_lengths)
-        for length in self.doc_lengths.values():
-            total_length += length
-
-        return total_length / total_docs
+        return float(self.doc_lengths.mean())
 
     def get_tf(self, doc_id: int, term: str) -> int:
         tokens = tokenize(term)
@@ -49,14 +55,15 @@ class InvertedIndex:
             raise ValueError("term must be a single token")
         token = tokens[0]
 
-        return self.term_frequencies[doc_id][token]
+        return self.__term_frequency(self.store.index_of(doc_id), token)
 
     def get_bm25_tf(
         self, doc_id: int, term: str, k1: float = BM25_K1, b: float = BM25_B
     ) -> float:
         raw_tf = self.get_tf(doc_id, term)
         avg_doc_length = self.__get_avg_doc_length()
-        length_norm = 1 - b + b * (self.doc_lengths[doc_id] / avg_doc_length)
+        doc_length = self.doc_lengths[self.store.index_of(doc_id)]
+        length_norm = 1 - b + b * (doc_length / avg_doc_length)
         return (raw_tf * (k1 + 1)) / (raw_tf + k1 * length_norm)
 
     def get_idf(self, term: str) -> float:
@@ -65,8 +72,8 @@ class InvertedIndex:
             raise ValueError("term must be a single token")
         token = tokens[0]
 
-        doc_count = len(self.docmap)
-        term_doc_count = len(self.index[token])
+        doc_count = len(self.store)
+        term_doc_count = len(self.__postings(token)[0])
         idf = math.log((doc_count + 1) / (term_doc_count + 1))
         return idf
 
@@ -74,89 +81,150 @@ class InvertedIndex:
         tokens = tokenize(term)
         if len(tokens) != 1:
             raise ValueError("term must be a single token")
-        token = tokens[0]
 
-        doc_count = len(self.docmap)
-        term_doc_count = len(self.index[token])
+        return self.__bm25_idf(tokens[0])
+
+    def __bm25_idf(self, token: str) -> float:
+        doc_count = len(self.store)
+        term_doc_count = len(self.__postings(token)[0])
         return math.log((doc_count - term_doc_count + 0.5) / (term_doc_count + 0.5) + 1)
 
     def bm25(self, doc_id: int, term: str) -> float:
         return self.get_bm25_tf(doc_id, term) * self.get_bm25_idf(term)
 
+    def query_postings(
+        self, query: str
+    ) -> list[tuple[np.ndarray, np.ndarray, float]]:
+        postings = []
+        with span("tokenize"):
+            tokens = tokenize(query)
+        for token in tokens:
+            docs, tfs = self.__postings(token)
+            postings.append((docs, tfs, self.__bm25_idf(token)))
+        return postings
+
+    def avg_doc_length(self) -> float:
+        return self.__get_avg_doc_length()
+
+    @traced("bm25.score")
+    def bm25_scores(
+        self,
+        query: str,
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+        mask: Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        scores = np.zeros(len(self.store), dtype=np.float32)
+        avg_doc_length = self.__get_avg_doc_length()
+        if avg_doc_length == 0:
+            return scores
+
+        for docs, tfs, idf in self.query_postings(query):
+            if mask is not None:
+                allowed = mask[docs]
+                docs, tfs = docs[allowed], tfs[allowed]
+            if len(docs) == 0:
+                continue
+            length_norm = 1 - b + b * (self.doc_lengths[docs] / avg_doc_length)
+            bm25_tf = (tfs * (k1 + 1)) / (tfs + k1 * length_norm)
+            scores[docs] += bm25_tf * idf
+
+        return scores
+
+    def bm25_search_hits(
+        self,
+        query: str,
+        limit: int,
+        mask: Optional[np.ndarray] = None,
+        k1: float = BM25_K1,
+        b: float = BM25_B,
+    ) -> SearchHits:
+        scores = self.bm25_scores(query, k1, b, mask)
+        matched = np.flatnonzero(scores > 0).astype(np.int32)
+        order = top_k_indices(scores[matched], limit)
+        return SearchHits(matched[order], scores[matched][order])
+
     def bm25_search(self, query: str, limit: int) -> list[dict]:
-        tokens = tokenize(query)
-        scores = {}
-
-        for doc_id in self.docmap:
-            score = 0.0
-            for token in tokens:
-                score += self.bm25(doc_id, token)
-            scores[doc_id] = score
-
-        sorted_docs = sorted(scores.items(), key=lambda x: x[1], reverse=True)
-
-        results = []
-        for doc_id, score in sorted_docs[:limit]:
-            doc = self.docmap[doc_id]
-            formatted_result = format_search_result(
-                doc_id=doc["id"],
-                title=doc["title"],
-                document=doc["description"],
-                score=score,
-            )
-            results.append(formatted_result)
-
-        return results
+        return self.store.hydrate(self.bm25_search_hits(query, limit))
+
+    def iter_bm25_search(self, query: str, limit: int) -> Iterator[dict]:
+        scores = self.bm25_scores(query)
+        matched = np.flatnonzero(scores > 0).astype(np.int32)
+        matched_scores = scores[matched]
+        for pos in iter_top_k(matched_scores, limit):
+            yield self.store.result(int(matched[pos]), float(matched_scores[pos]))
 
     def get_tfidf(self, doc_id: int, term: str) -> float:
         tf = self.get_tf(doc_id, term)
         idf = self.get_idf(term)
         return tf * idf
 
-    def build(self):
-        movies = load_movies()
-        for movie in movies:
-            doc_id = movie.get("id", 0)
+    @traced("index.build")
+    def build(self, documents: Optional[list[dict]] = None):
+        movies = documents if documents is not None else load_movies()
+        if not self.store.matches(movies):
+            self.store = DocumentStore.for_documents(movies)
+
+        postings = defaultdict(list)
+        doc_lengths = []
+        for doc_idx, movie in enumerate(movies):
             text = f"{movie.get('title', '')} {movie.get('description')}"
-            self.__add_document(doc_id, text)
-            self.docmap[doc_id] = movie
+            tokens = tokenize(text)
+            doc_lengths.append(len(tokens))
+            for token, tf in Counter(tokens).items():
+                postings[token].append((doc_idx, tf))
+
+        self.vocabulary = {}
+        offsets = [0]
+        docs = []
+        tfs = []
+        for row, token in enumerate(sorted(postings)):
+            self.vocabulary[token] = row
+            for doc_idx, tf in postings[token]:
+                docs.append(doc_idx)
+                tfs.append(tf)
+            offsets.append(len(docs))
+
+        self.posting_offsets = np.array(offsets, dtype=np.int64)
+        self.posting_docs = np.array(docs, dtype=np.int32)
+        self.posting_tfs = np.array(tfs, dtype=np.int32)
+        self.doc_lengths = np.array(doc_lengths, dtype=np.int32)
+        self.content_hash = self.store.content_hash
 
     def save(self):
         os.makedirs(os.path.join(PROJECT_ROOT, "cache"), exist_ok=True)
 
-        with open(self.index_path, "wb") as f:
-            pickle.dump(self.index, f)
-
-        with open(self.docmap_path, "wb") as f:
-            pickle.dump(self.docmap, f)
-
-        with open(self.term_frequencies_path, "wb") as f:
-            pickle.dump(self.term_frequencies, f)
+        np.savez(
+            self.index_path,
+            posting_offsets=self.posting_offsets,
+            posting_docs=self.posting_docs,
+            posting_tfs=self.posting_tfs,
+            doc_lengths=self.doc_lengths,
+            content_hash=np.array(self.store.content_hash),
+        )
 
-        with open(self.doc_lengths_path, "wb") as f:
-            pickle.dump(self.doc_lengths, f)
+        with open(self.vocabulary_path, "w") as f:
+            json.dump(self.vocabulary, f)
 
+    @traced("index.load")
     def load(self):
-        try:
-            with open(self.index_path, "rb") as f:
-                self.index = pickle.load(f)
-        except Exception as e:
-            print(f"Unable to open index file: {e}")
+        if len(self.store) == 0 and not self.store.load():
+            print("Unable to open document store")
 
         try:
-            with open(self.docmap_path, "rb") as f:
-                self.docmap = pickle.load(f)
+            with np.load(self.index_path) as data:
+                self.posting_offsets = data["posting_offsets"]
+                self.posting_docs = data["posting_docs"]
+                self.posting_tfs = data["posting_tfs"]
+                self.doc_lengths = data["doc_lengths"]
+                self.content_hash = (
+                    str(data["content_hash"]) if "content_hash" in data else ""
+                )
         except Exception as e:
-            print(f"Unable to open docmap file: {e}")
-
-        try:
-            with open(self.term_frequencies_path, "rb") as f:
-                self.term_frequencies = pickle.load(f)
-        except Exception as e:
-            print(f"Unable to open term frequencies file: {e}")
+            print(f"Unable to open index file: {e}")
 
         try:
-            with open(self.doc_lengths_path, "rb") as f:
-                self.doc_lengths = pickle.load(f)
+            with open(self.vocabulary_path, "r") as f:
+                self.vocabulary = json.load(f)
         except Exception as e:
-            print(f"Unable to open doc lengths file: {e}")
+            print(f"Unable to open vocabulary file: {e}")
@@ -1,3 +1,5 @@
+from typing import Iterator
+
 from lib.inverted_index import InvertedIndex
 from lib.search_utils import BM25_B, BM25_K1, DEFAULT_SEARCH_LIMIT, tokenize
 
@@ -8,6 +10,12 @@ def bm25_search_command(query: str, limit: int = 5):
     return idx.bm25_search(query, limit)
 
 
+def iter_bm25_search_command(query: str, limit: int = 5) -> Iterator[dict]:
+    idx = InvertedIndex()
+    idx.load()
+    yield from idx.iter_bm25_search(query, limit)
+
+
 def bm25_tf_command(doc_id: int, term: str, k1: float = BM25_K1, b: float = BM25_B):
     idx = InvertedIndex()
     idx.load()
@@ -67,10 +75,7 @@ def search_command(query: str, limit: int = DEFAULT_SEARCH_LIMIT) -> list[dict]:
             if match in seen:
                 continue
             seen.add(match)
-            doc = idx.docmap.get(match, {})
-            if not doc:
-                continue
-            results.append(doc)
+            results.append(idx.store.document(idx.store.index_of(match)))
             if len(results) >= limit:
                 return results
     return results
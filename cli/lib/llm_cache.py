@@ -0,0 +1,124 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+from lib.search_utils import (LLM_CACHE_MAX_ENTRIES, LLM_CACHE_PATH,
+                              LLM_CACHE_TTL_SECONDS)
+
+CACHE_MODES = ("readwrite", "replay", "off")
+
+
+class LLMCacheMiss(Exception):
+    pass
+
+
+def encode_for_key(value: Any) -> Any:
+    if isinstance(value, bytes):
+        return {"sha256": hashlib.sha256(value).hexdigest()}
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json", exclude_none=True)
+    return str(value)
+
+
+class LLMCache:
+    def __init__(
+        self,
+        path: str = LLM_CACHE_PATH,
+        max_entries: int = LLM_CACHE_MAX_ENTRIES,
+        ttl: float = LLM_CACHE_TTL_SECONDS,
+        mode: Optional[str] = None,
+    ):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.mode = mode or os.environ.get("LLM_CACHE_MODE", "readwrite")
+        if self.mode not in CACHE_MODES:
+            raise ValueError(f"LLM_CACHE_MODE must be one of {CACHE_MODES}")
+        self.lock = threading.Lock()
+        self.connection: Optional[sqlite3.Connection] = None
+
+    def __connect(self) -> sqlite3.Connection:
+        if self.connection is None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self.connection = sqlite3.connect(self.path, check_same_thread=False)
+            self.connection.execute(
+                """CREATE TABLE IF NOT EXISTS responses (
+                    key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    response TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    accessed_at REAL NOT NULL
+                )"""
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)"
+            )
+            self.connection.commit()
+        return self.connection
+
+    def key(self, model: str, contents: Any, config: Any = None) -> str:
+        payload = json.dumps(
+            {"model": model, "contents": contents, "config": config},
+            sort_keys=True,
+            default=encode_for_key,
+        )
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        if self.mode == "off":
+            return None
+
+        with self.lock:
+            connection = self.__connect()
+            row = connection.execute(
+                "SELECT response, created_at FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            response, created_at = row
+            now = time.time()
+            if self.mode != "replay" and created_at + self.ttl < now:
+                connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                connection.commit()
+                return None
+
+            connection.execute(
+                "UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key)
+            )
+            connection.commit()
+            return response
+
+    def put(self, key: str, model: str, response: str) -> None:
+        if self.mode != "readwrite":
+            return
+
+        with self.lock:
+            connection = self.__connect()
+            now = time.time()
+            connection.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (key, model, response, now, now),
+            )
+            connection.execute(
+                "DELETE FROM responses WHERE created_at < ?", (now - self.ttl,)
+            )
+            (count,) = connection.execute("SELECT COUNT(*) FROM responses").fetchone()
+            if count > self.max_entries:
+                connection.execute(
+                    """DELETE FROM responses WHERE key IN (
+                        SELECT key FROM responses ORDER BY accessed_at ASC LIMIT ?
+                    )""",
+                    (count - self.max_entries,),
+                )
+            connection.commit()
+
+    def lookup(self, key: str) -> Optional[str]:
+        cached = self.get(key)
+        if cached is None and self.mode == "replay":
+            raise LLMCacheMiss(f"No cached LLM response for key {key[:12]}")
+        return cached
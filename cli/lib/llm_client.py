@@ -0,0 +1,174 @@
+import asyncio
+import os
+import random
+import threading
+import time
+import weakref
+from functools import lru_cache
+from typing import Any, Iterator, Optional
+
+from dotenv import load_dotenv
+from google import genai
+from google.genai import types
+from lib.llm_cache import LLMCache
+from lib.search_utils import (LLM_BACKOFF_SECONDS, LLM_BURST,
+                              LLM_MAX_CONCURRENCY, LLM_MAX_RETRIES, LLM_MODEL,
+                              LLM_REQUESTS_PER_SECOND, LLM_TIMEOUT_SECONDS)
+from lib.tracing import traced
+
+load_dotenv()
+
+
+def create_genai_client() -> genai.Client:
+    api_key = os.environ.get("GEMINI_API_KEY")
+    base_url = os.environ.get("GEMINI_BASE_URL")
+    if base_url:
+        return genai.Client(
+            api_key=api_key or "fake",
+            http_options=types.HttpOptions(base_url=base_url),
+        )
+    return genai.Client(api_key=api_key)
+
+
+@lru_cache(maxsize=1)
+def get_client() -> genai.Client:
+    return create_genai_client()
+
+
+llm_cache = LLMCache()
+
+
+@traced("llm.generate")
+def generate_text(prompt: Any, config: Any = None) -> str:
+    response = get_llm().run_all([prompt], config=config)[0]
+    if isinstance(response, Exception):
+        raise response
+    return response
+
+
+def stream_text(
+    prompt: Any, model: str = LLM_MODEL, config: Any = None
+) -> Iterator[str]:
+    key = llm_cache.key(model, prompt, config)
+    cached = llm_cache.lookup(key)
+    if cached is not None:
+        yield cached
+        return
+
+    asyncio.run(get_llm().bucket.acquire())
+    chunks = []
+    for chunk in get_client().models.generate_content_stream(
+        model=model, contents=prompt, config=config
+    ):
+        if chunk.text:
+            chunks.append(chunk.text)
+            yield chunk.text
+    llm_cache.put(key, model, "".join(chunks).strip())
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    async def acquire(self) -> None:
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated_at) * self.rate
+                )
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            await asyncio.sleep(wait)
+
+
+class AsyncLLMClient:
+    def __init__(
+        self,
+        model: str = LLM_MODEL,
+        max_concurrency: int = LLM_MAX_CONCURRENCY,
+        requests_per_second: float = LLM_REQUESTS_PER_SECOND,
+        burst: int = LLM_BURST,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff: float = LLM_BACKOFF_SECONDS,
+        timeout: float = LLM_TIMEOUT_SECONDS,
+        client: Optional[genai.Client] = None,
+    ):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.requests_per_second = requests_per_second
+        self.burst = burst
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self._client = client
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.semaphores: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self.lock = threading.Lock()
+
+    @property
+    def client(self) -> genai.Client:
+        if self._client is None:
+            return get_client()
+        return self._client
+
+    def semaphore(self) -> asyncio.Semaphore:
+        loop = asyncio.get_running_loop()
+        with self.lock:
+            if loop not in self.semaphores:
+                self.semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+            return self.semaphores[loop]
+
+    @traced("llm.request")
+    async def generate(self, contents: Any, config: Any = None) -> str:
+        key = llm_cache.key(self.model, contents, config)
+        cached = llm_cache.lookup(key)
+        if cached is not None:
+            return cached
+
+        attempt = 0
+        while True:
+            async with self.semaphore():
+                await self.bucket.acquire()
+                try:
+                    response = await asyncio.wait_for(
+                        self.client.aio.models.generate_content(
+                            model=self.model, contents=contents, config=config
+                        ),
+                        timeout=self.timeout,
+                    )
+                    text = (response.text or "").strip()
+                    llm_cache.put(key, self.model, text)
+                    return text
+                except Exception:
+                    if attempt >= self.max_retries:
+                        raise
+
+            await asyncio.sleep(random.uniform(0, self.backoff * (2**attempt)))
+            attempt += 1
+
+    async def generate_all(
+        self, prompts: list[Any], config: Any = None
+    ) -> list[str | Exception]:
+        tasks = [self.generate(prompt, config) for prompt in prompts]
+        return await asyncio.gather(*tasks, return_exceptions=True)
+
+    @traced("llm.run_all")
+    def run_all(
+        self, prompts: list[Any], timeout: Optional[float] = None, config: Any = None
+    ) -> list[str | Exception]:
+        return asyncio.run(
+            asyncio.wait_for(self.generate_all(prompts, config), timeout=timeout)
+        )
+
+
+@lru_cache(maxsize=1)
+def get_llm() -> AsyncLLMClient:
+    return AsyncLLMClient()
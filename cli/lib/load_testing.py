@@ -0,0 +1,260 @@
+import os
+import threading
+import time
+from collections import Counter
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import ExitStack
+from typing import Callable, Optional
+
+import numpy as np
+from lib.augmented_generation import answer_prompt, retrieve_context
+from lib.context_builder import format_context
+from lib.fake_gemini import FakeGeminiServer
+from lib.hybrid_search import HybridSearch
+from lib.llm_client import generate_text, get_client, llm_cache
+from lib.reranking import rerank_batch, rerank_cross_encoder
+from lib.search_utils import (DEFAULT_K_VALUE, DEFAULT_SEARCH_LIMIT,
+                              LOAD_TEST_CONCURRENCY,
+                              LOAD_TEST_DURATION_SECONDS,
+                              LOAD_TEST_LLM_LATENCY, LOAD_TEST_MAX_WORKERS,
+                              LOAD_TEST_PIPELINES, LOAD_TEST_QPS,
+                              LOAD_TEST_VARIANTS, load_golden_dataset,
+                              load_movies, load_query_log)
+
+QUERY_PREFIXES = ["movies about", "films with", "something like", "show me"]
+LLM_PIPELINES = {"rrf_llm_rerank", "rag"}
+
+
+def query_variants(query: str, count: int, rng: np.random.Generator) -> list[str]:
+    variants = []
+    words = query.split()
+    for _ in range(count):
+        variant = list(words)
+        match int(rng.integers(4)):
+            case 0 if len(variant) > 1:
+                del variant[int(rng.integers(len(variant)))]
+            case 1:
+                pos = int(rng.integers(len(variant)))
+                word = variant[pos]
+                if len(word) > 3:
+                    i = int(rng.integers(len(word) - 1))
+                    variant[pos] = word[:i] + word[i + 1] + word[i] + word[i + 2 :]
+            case 2:
+                variant = QUERY_PREFIXES[int(rng.integers(len(QUERY_PREFIXES)))].split() + variant
+            case _:
+                rng.shuffle(variant)
+        variants.append(" ".join(variant))
+    return variants
+
+
+def replay_queries(
+    query_log: Optional[str] = None, variants: int = LOAD_TEST_VARIANTS, seed: int = 0
+) -> list[str]:
+    if query_log is not None:
+        return load_query_log(query_log)
+
+    rng = np.random.default_rng(seed)
+    queries = []
+    for test_case in load_golden_dataset()["test_cases"]:
+        queries.append(test_case["query"])
+        queries.extend(query_variants(test_case["query"], variants, rng))
+    rng.shuffle(queries)
+    return queries
+
+
+def build_pipelines(
+    hybrid_search: HybridSearch, names: list[str], limit: int = DEFAULT_SEARCH_LIMIT
+) -> dict[str, Callable[[str], object]]:
+    def bm25(query: str) -> list[dict]:
+        return hybrid_search.idx.bm25_search(query, limit)
+
+    def rrf(query: str) -> list[dict]:
+        return hybrid_search.rrf_search(query, DEFAULT_K_VALUE, limit)
+
+    def rrf_cross_encoder(query: str) -> list[dict]:
+        results = hybrid_search.rrf_search(query, DEFAULT_K_VALUE, limit * 5)
+        return rerank_cross_encoder(query, results, limit)
+
+    def rrf_llm_rerank(query: str) -> list[dict]:
+        results = hybrid_search.rrf_search(query, DEFAULT_K_VALUE, limit * 5)
+        return rerank_batch(query, results, limit)
+
+    def rag(query: str) -> str:
+        _, context = retrieve_context(hybrid_search, query, limit)
+        return generate_text(answer_prompt(format_context(context), query))
+
+    available = {
+        "bm25": bm25,
+        "rrf": rrf,
+        "rrf_cross_encoder": rrf_cross_encoder,
+        "rrf_llm_rerank": rrf_llm_rerank,
+        "rag": rag,
+    }
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ValueError(f"Unknown pipelines: {', '.join(unknown)}")
+    return {name: available[name] for name in names}
+
+
+def timed_call(
+    pipeline: Callable[[str], object], query: str, scheduled: float
+) -> tuple[float, float, Optional[str]]:
+    start = time.perf_counter()
+    error = None
+    try:
+        pipeline(query)
+    except Exception as e:
+        error = type(e).__name__
+    end = time.perf_counter()
+    return (end - scheduled) * 1000, (end - start) * 1000, error
+
+
+def run_open_loop(
+    pipeline: Callable[[str], object],
+    queries: list[str],
+    qps: float = LOAD_TEST_QPS,
+    duration: float = LOAD_TEST_DURATION_SECONDS,
+    max_workers: int = LOAD_TEST_MAX_WORKERS,
+    seed: int = 0,
+) -> dict:
+    rng = np.random.default_rng(seed)
+    futures: list[Future] = []
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        start = time.perf_counter()
+        offset = 0.0
+        while offset < duration:
+            scheduled = start + offset
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            query = queries[len(futures) % len(queries)]
+            futures.append(executor.submit(timed_call, pipeline, query, scheduled))
+            offset += rng.exponential(1 / qps)
+        samples = [future.result() for future in futures]
+        elapsed = time.perf_counter() - start
+
+    summary = summarize_samples(samples, elapsed)
+    summary["target_qps"] = qps
+    summary["offered_qps"] = len(futures) / duration
+    return summary
+
+
+def run_closed_loop(
+    pipeline: Callable[[str], object],
+    queries: list[str],
+    concurrency: int = LOAD_TEST_CONCURRENCY,
+    duration: float = LOAD_TEST_DURATION_SECONDS,
+) -> dict:
+    lock = threading.Lock()
+    samples = []
+    issued = 0
+
+    def worker(deadline: float) -> None:
+        nonlocal issued
+        while time.perf_counter() < deadline:
+            with lock:
+                query = queries[issued % len(queries)]
+                issued += 1
+            sample = timed_call(pipeline, query, time.perf_counter())
+            with lock:
+                samples.append(sample)
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker, start + duration)
+    elapsed = time.perf_counter() - start
+
+    summary = summarize_samples(samples, elapsed)
+    summary["concurrency"] = concurrency
+    return summary
+
+
+def summarize_samples(
+    samples: list[tuple[float, float, Optional[str]]], elapsed: float
+) -> dict:
+    errors = Counter(error for _, _, error in samples if error is not None)
+    latencies = np.array([latency for latency, _, error in samples if error is None])
+    service = np.array([service for _, service, error in samples if error is None])
+    failed = sum(errors.values())
+
+    summary = {
+        "requests": len(samples),
+        "errors": failed,
+        "error_rate": failed / len(samples) if samples else 0.0,
+        "error_types": dict(errors),
+        "elapsed_seconds": elapsed,
+        "throughput_qps": latencies.size / elapsed if elapsed else 0.0,
+    }
+    if latencies.size == 0:
+        return summary
+
+    p50, p95, p99 = np.percentile(latencies, [50, 95, 99])
+    summary.update(
+        {
+            "latency_p50_ms": float(p50),
+            "latency_p95_ms": float(p95),
+            "latency_p99_ms": float(p99),
+            "latency_max_ms": float(latencies.max()),
+            "service_mean_ms": float(service.mean()),
+        }
+    )
+    return summary
+
+
+def use_fake_llm(stack: ExitStack, latency: float) -> str:
+    server = stack.enter_context(FakeGeminiServer(latency=latency))
+    previous = os.environ.get("GEMINI_BASE_URL")
+    previous_mode = llm_cache.mode
+
+    def restore() -> None:
+        if previous is None:
+            os.environ.pop("GEMINI_BASE_URL", None)
+        else:
+            os.environ["GEMINI_BASE_URL"] = previous
+        llm_cache.mode = previous_mode
+        get_client.cache_clear()
+
+    os.environ["GEMINI_BASE_URL"] = server.base_url
+    llm_cache.mode = "off"
+    get_client.cache_clear()
+    stack.callback(restore)
+    return server.base_url
+
+
+def load_test_command(
+    pipelines: list[str] = LOAD_TEST_PIPELINES,
+    mode: str = "open",
+    qps: float = LOAD_TEST_QPS,
+    concurrency: int = LOAD_TEST_CONCURRENCY,
+    duration: float = LOAD_TEST_DURATION_SECONDS,
+    query_log: Optional[str] = None,
+    variants: int = LOAD_TEST_VARIANTS,
+    llm_latency: float = LOAD_TEST_LLM_LATENCY,
+    limit: int = DEFAULT_SEARCH_LIMIT,
+) -> dict:
+    queries = replay_queries(query_log, variants)
+    if not queries:
+        raise ValueError("No queries to replay")
+
+    hybrid_search = HybridSearch(load_movies())
+    configured = build_pipelines(hybrid_search, pipelines, limit)
+
+    results = {}
+    with ExitStack() as stack:
+        if LLM_PIPELINES.intersection(pipelines):
+            use_fake_llm(stack, llm_latency)
+
+        for name, pipeline in configured.items():
+            pipeline(queries[0])
+            if mode == "closed":
+                results[name] = run_closed_loop(pipeline, queries, concurrency, duration)
+            else:
+                results[name] = run_open_loop(pipeline, queries, qps, duration)
+
+    return {
+        "mode": mode,
+        "queries": len(queries),
+        "duration_seconds": duration,
+        "results": results,
+    }
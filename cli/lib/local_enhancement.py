@@ -0,0 +1,250 @@
+import os
+import pickle
+from collections import Counter, defaultdict
+from functools import lru_cache
+from typing import Optional
+
+import numpy as np
+from lib.document_store import DocumentStore
+from lib.search_utils import (CACHE_DIR, LOCAL_EXPANSION_TERMS,
+                              LOCAL_SPELL_MAX_EDIT_DISTANCE,
+                              LOCAL_SPELL_PREFIX_LENGTH, load_movies,
+                              load_stopwords, preprocess_text)
+
+
+class LocalQueryEnhancer:
+    def __init__(
+        self,
+        max_edit_distance: int = LOCAL_SPELL_MAX_EDIT_DISTANCE,
+        prefix_length: int = LOCAL_SPELL_PREFIX_LENGTH,
+    ):
+        self.max_edit_distance = max_edit_distance
+        self.prefix_length = prefix_length
+        self.words: list[str] = []
+        self.word_ids: dict[str, int] = {}
+        self.doc_frequencies = np.empty(0, dtype=np.int32)
+        self.doc_offsets = np.zeros(1, dtype=np.int64)
+        self.doc_words = np.empty(0, dtype=np.int32)
+        self.doc_of_entry = np.empty(0, dtype=np.int64)
+        self.num_docs = 0
+        self.content_hash = ""
+        self.stopwords: set[str] = set()
+        self.deletes: dict[str, list[int]] = {}
+        self.vocabulary_path = os.path.join(CACHE_DIR, "local_vocabulary.pkl")
+
+    def build(self, store: DocumentStore) -> None:
+        doc_word_lists = []
+        doc_frequencies: Counter = Counter()
+        for idx in range(len(store)):
+            words = set(preprocess_text(f"{store.title(idx)} {store.description(idx)}").split())
+            doc_word_lists.append(words)
+            doc_frequencies.update(words)
+
+        self.words = sorted(doc_frequencies)
+        self.word_ids = {word: i for i, word in enumerate(self.words)}
+        self.doc_frequencies = np.array(
+            [doc_frequencies[word] for word in self.words], dtype=np.int32
+        )
+
+        offsets = [0]
+        doc_words = []
+        for words in doc_word_lists:
+            doc_words.extend(sorted(self.word_ids[word] for word in words))
+            offsets.append(len(doc_words))
+        self.doc_offsets = np.array(offsets, dtype=np.int64)
+        self.doc_words = np.array(doc_words, dtype=np.int32)
+        self.num_docs = len(store)
+        self.content_hash = store.content_hash
+        self.__prepare()
+
+    def save(self) -> None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(self.vocabulary_path, "wb") as f:
+            pickle.dump(
+                {
+                    "words": self.words,
+                    "doc_frequencies": self.doc_frequencies,
+                    "doc_offsets": self.doc_offsets,
+                    "doc_words": self.doc_words,
+                    "content_hash": self.content_hash,
+                },
+                f,
+            )
+
+    def load(self, store: DocumentStore) -> bool:
+        try:
+            with open(self.vocabulary_path, "rb") as f:
+                data = pickle.load(f)
+            if data["content_hash"] != store.content_hash:
+                return False
+            words = data["words"]
+            doc_frequencies = data["doc_frequencies"]
+            doc_offsets = data["doc_offsets"]
+            doc_words = data["doc_words"]
+        except (OSError, EOFError, KeyError, TypeError, pickle.UnpicklingError):
+            return False
+
+        if len(doc_offsets) - 1 != len(store):
+            return False
+
+        self.words = words
+        self.word_ids = {word: i for i, word in enumerate(self.words)}
+        self.doc_frequencies = doc_frequencies
+        self.doc_offsets = doc_offsets
+        self.doc_words = doc_words
+        self.num_docs = len(store)
+        self.content_hash = store.content_hash
+        self.__prepare()
+        return True
+
+    def load_or_build(self, documents: list[dict]) -> None:
+        store = DocumentStore.for_documents(documents)
+        if self.load(store):
+            return
+        self.build(store)
+        self.save()
+
+    def __prepare(self) -> None:
+        self.doc_of_entry = np.repeat(
+            np.arange(self.num_docs), np.diff(self.doc_offsets).astype(np.int64)
+        )
+        self.stopwords = set(load_stopwords())
+        self.deletes = defaultdict(list)
+        for word_id, word in enumerate(self.words):
+            prefix = word[: self.prefix_length]
+            self.deletes[prefix].append(word_id)
+            for deleted in edits(prefix, self.max_edit_distance):
+                self.deletes[deleted].append(word_id)
+
+    def correct_word(self, word: str) -> tuple[str, float]:
+        if len(word) <= 2 or word in self.stopwords or not word.isalpha():
+            return word, 1.0
+        if word in self.word_ids:
+            return word, 1.0
+
+        prefix = word[: self.prefix_length]
+        candidate_ids = set(self.deletes.get(prefix, []))
+        for deleted in edits(prefix, self.max_edit_distance):
+            candidate_ids.update(self.deletes.get(deleted, []))
+
+        matches = []
+        for word_id in candidate_ids:
+            candidate = self.words[word_id]
+            if abs(len(candidate) - len(word)) > self.max_edit_distance:
+                continue
+            distance = edit_distance(word, candidate, self.max_edit_distance)
+            if distance <= self.max_edit_distance:
+                matches.append((distance, -int(self.doc_frequencies[word_id]), candidate))
+
+        if not matches:
+            return word, 0.0
+
+        matches.sort()
+        distance, neg_df, best = matches[0]
+        confidence = 0.9 if distance == 1 else 0.7
+        if len(matches) > 1:
+            runner_distance, runner_neg_df, _ = matches[1]
+            if runner_distance == distance and -runner_neg_df * 2 > -neg_df:
+                confidence -= 0.3
+        return best, confidence
+
+    def spell_correct(self, query: str) -> tuple[str, float]:
+        corrected = []
+        confidence = 1.0
+        changed = False
+        for word in preprocess_text(query).split():
+            correction, word_confidence = self.correct_word(word)
+            corrected.append(correction)
+            confidence = min(confidence, word_confidence)
+            changed = changed or correction != word
+        if not changed:
+            return query, confidence
+        return " ".join(corrected), confidence
+
+    def expand(
+        self, query: str, max_terms: int = LOCAL_EXPANSION_TERMS
+    ) -> tuple[str, float]:
+        query_words = preprocess_text(query).split()
+        query_ids = [
+            self.word_ids[word]
+            for word in query_words
+            if word in self.word_ids and word not in self.stopwords
+        ]
+        if not query_ids:
+            return query, 0.0
+
+        scores = np.zeros(len(self.words), dtype=np.float64)
+        for word_id in query_ids:
+            docs = self.__documents_with(word_id)
+            co_occurrence = np.bincount(
+                np.concatenate(
+                    [self.doc_words[self.doc_offsets[d] : self.doc_offsets[d + 1]] for d in docs]
+                ),
+                minlength=len(self.words),
+            )
+            co_occurrence[co_occurrence < 2] = 0
+            scores += co_occurrence / np.sqrt(
+                self.doc_frequencies.astype(np.float64) * len(docs)
+            )
+
+        scores[query_ids] = 0
+        for word in self.stopwords:
+            if word in self.word_ids:
+                scores[self.word_ids[word]] = 0
+
+        top = [int(i) for i in np.argsort(-scores)[:max_terms] if scores[i] > 0]
+        if not top:
+            return query, 0.0
+
+        expansions = " ".join(self.words[i] for i in top)
+        confidence = min(1.0, float(scores[top[0]]) / len(query_ids))
+        return f"{query} {expansions}", confidence
+
+    def __documents_with(self, word_id: int) -> np.ndarray:
+        return self.doc_of_entry[self.doc_words == word_id]
+
+
+def edits(word: str, max_distance: int) -> set[str]:
+    results = set()
+    frontier = {word}
+    for _ in range(max_distance):
+        next_frontier = set()
+        for current in frontier:
+            for i in range(len(current)):
+                deleted = current[:i] + current[i + 1 :]
+                if deleted not in results:
+                    results.add(deleted)
+                    next_frontier.add(deleted)
+        frontier = next_frontier
+    return results
+
+
+def edit_distance(a: str, b: str, max_distance: int) -> int:
+    previous_previous: Optional[list[int]] = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            current[j] = min(
+                previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost
+            )
+            if (
+                previous_previous is not None
+                and i > 1
+                and j > 1
+                and a[i - 1] == b[j - 2]
+                and a[i - 2] == b[j - 1]
+            ):
+                current[j] = min(current[j], previous_previous[j - 2] + 1)
+        if min(current) > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+@lru_cache(maxsize=1)
+def get_local_enhancer() -> LocalQueryEnhancer:
+    enhancer = LocalQueryEnhancer()
+    enhancer.load_or_build(load_movies())
+    return enhancer
@@ -1,46 +1,312 @@
+import hashlib
+import io
+import json
+import os
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import BinaryIO, Callable, Iterator, Optional
+
+import numpy as np
 from PIL import Image
 from sentence_transformers import SentenceTransformer
 
-from lib.semantic_search import cosine_similarity
-from lib.search_utils import load_movies
+from lib.document_store import DocumentStore
+from lib.image_cache import ImageEmbeddingCache, content_key
+from lib.search_utils import (CACHE_DIR, CLIP_IMAGE_SIZE, IMAGE_BATCH_SIZE,
+                              IMAGE_CACHE_PATH, IMAGE_DECODE_WORKERS,
+                              IMAGE_EXTENSIONS, SearchHits, load_movies,
+                              top_k_indices)
 
 
 class MultimodalSearch:
-    def __init__(self, model_name="clip-ViT-B-32", docs=[]):
-        self.model = SentenceTransformer(model_name)
-        self.docs = docs
+    def __init__(
+        self,
+        model_name="clip-ViT-B-32",
+        docs=[],
+        store: Optional[DocumentStore] = None,
+        model=None,
+        cache_dir: str = CACHE_DIR,
+    ):
+        self.model_name = model_name
+        self.model = model if model is not None else SentenceTransformer(model_name)
+        self.store = store if store is not None else DocumentStore.for_documents(docs)
         self.texts = []
 
-        for doc in self.docs:
+        for doc in docs:
             self.texts.append(f"{doc['title']}: {doc['description']}")
 
-        self.text_embeddings = self.model.encode(self.texts, show_progress_bar=True)
+        self.image_cache = ImageEmbeddingCache(
+            os.path.join(cache_dir, os.path.basename(IMAGE_CACHE_PATH))
+        )
+        self.embeddings_dir = os.path.join(cache_dir, "clip_text_embeddings")
+        self.text_embeddings = self.load_or_create_text_embeddings()
+
+    def load_or_create_text_embeddings(self) -> np.ndarray:
+        if not self.texts:
+            return np.empty((0, 0), dtype=np.float32)
 
-    def search_with_image(self, image_path: str):
+        hashes = text_hashes(self.texts)
+        manifest = self.__load_manifest()
+        if (
+            manifest.get("model_name") == self.model_name
+            and manifest.get("content_hash") == content_hash(hashes)
+        ):
+            try:
+                return np.load(self.__path("embeddings.npy"), mmap_mode="r")
+            except (OSError, ValueError):
+                pass
+
+        return self.update_text_embeddings(hashes, manifest)
+
+    def update_text_embeddings(self, hashes: np.ndarray, manifest: dict) -> np.ndarray:
+        previous = None
+        row_of: dict[int, int] = {}
+        if manifest.get("model_name") == self.model_name:
+            try:
+                previous = np.load(self.__path("embeddings.npy"), mmap_mode="r")
+                previous_hashes = np.load(self.__path("hashes.npy"))
+                row_of = {int(h): row for row, h in enumerate(previous_hashes)}
+            except (OSError, ValueError):
+                previous = None
+
+        missing = [i for i, h in enumerate(hashes.tolist()) if h not in row_of]
+        reused = [i for i, h in enumerate(hashes.tolist()) if h in row_of]
+
+        encoded = None
+        if missing:
+            encoded = normalize_rows(
+                self.model.encode(
+                    [self.texts[i] for i in missing], show_progress_bar=True
+                )
+            )
+        dim = encoded.shape[1] if encoded is not None else previous.shape[1]
+
+        embeddings = np.empty((len(self.texts), dim), dtype=np.float32)
+        if reused:
+            embeddings[reused] = previous[[row_of[int(hashes[i])] for i in reused]]
+        if encoded is not None:
+            embeddings[missing] = encoded
+
+        os.makedirs(self.embeddings_dir, exist_ok=True)
+        self.__save_array("embeddings.npy", embeddings)
+        self.__save_array("hashes.npy", hashes)
+        with open(self.__path("manifest.json"), "w") as f:
+            json.dump(
+                {
+                    "model_name": self.model_name,
+                    "content_hash": content_hash(hashes),
+                    "count": len(self.texts),
+                    "dim": dim,
+                },
+                f,
+            )
+
+        return np.load(self.__path("embeddings.npy"), mmap_mode="r")
+
+    def __path(self, name: str) -> str:
+        return os.path.join(self.embeddings_dir, name)
+
+    def __load_manifest(self) -> dict:
+        try:
+            with open(self.__path("manifest.json"), "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def __save_array(self, name: str, array: np.ndarray) -> None:
+        tmp_path = self.__path(f"{name}.tmp")
+        with open(tmp_path, "wb") as f:
+            np.save(f, array)
+        os.replace(tmp_path, self.__path(name))
+
+    def search_with_image_hits(self, image_path: str, limit: int = 5) -> SearchHits:
+        return self.image_search_hits(image_path, limit)
+
+    def image_search_hits(
+        self, image_path: str, limit: int = 5, mask: Optional[np.ndarray] = None
+    ) -> SearchHits:
         image_embedding = self.embed_image(image_path)
+        if mask is None:
+            candidates = np.arange(len(self.text_embeddings), dtype=np.int32)
+            scores = self.text_embeddings @ image_embedding
+        else:
+            candidates = np.flatnonzero(mask).astype(np.int32)
+            scores = self.text_embeddings[candidates] @ image_embedding
+        order = top_k_indices(scores, limit)
+        return SearchHits(candidates[order], scores[order])
+
+    def search_with_image(self, image_path: str):
+        hits = self.search_with_image_hits(image_path)
 
         results = []
-        for i, txt in enumerate(self.text_embeddings):
-            doc = self.docs[i]
-            similarity = cosine_similarity(image_embedding, txt)
+        for idx, score in zip(hits.indices, hits.scores):
+            doc = self.store.document(int(idx))
             results.append(
                 {
                     "doc_id": doc["id"],
                     "title": doc["title"],
                     "description": doc["description"],
-                    "similarity_score": similarity,
+                    "similarity_score": float(score),
                 }
             )
+        return results
 
-        sorted_results = sorted(
-            results, key=lambda x: x["similarity_score"], reverse=True
+    def embed_image(self, image_path: str):
+        key, embedding, img = self.read_image(image_path)
+        if embedding is None:
+            embedding = self.embed_images([img])[0]
+            self.image_cache.put(key, embedding)
+        return embedding
+
+    def read_image(
+        self, image_path: str
+    ) -> tuple[str, Optional[np.ndarray], Optional[Image.Image]]:
+        with open(image_path, "rb") as f:
+            data = f.read()
+        key = content_key(data, f"{self.model_name}@{CLIP_IMAGE_SIZE}")
+        cached = self.image_cache.get(key)
+        if cached is not None:
+            return key, cached, None
+        return key, None, load_image(io.BytesIO(data))
+
+    def embed_images(self, images: list[Image.Image]) -> np.ndarray:
+        return normalize_rows(
+            self.model.encode(images, batch_size=len(images), show_progress_bar=False)  # type: ignore[arg-type]
         )
-        return sorted_results[:5]
 
-    def embed_image(self, image_path: str):
-        img = Image.open(image_path)
-        embedding = self.model.encode([img], show_progress_bar=True)  # type: ignore[arg-type]
-        return embedding[0]
+    def search_image_batch(
+        self, images: list[Image.Image], limit: int = 5
+    ) -> list[SearchHits]:
+        return self.search_embedding_batch(self.embed_images(images), limit)
+
+    def search_embedding_batch(
+        self, embeddings: np.ndarray, limit: int = 5
+    ) -> list[SearchHits]:
+        scores = embeddings @ self.text_embeddings.T
+
+        hits = []
+        for row in scores:
+            order = top_k_indices(row, limit)
+            hits.append(SearchHits(order, row[order]))
+        return hits
+
+    def iter_batch_search(
+        self,
+        image_paths: list[str],
+        limit: int = 5,
+        batch_size: int = IMAGE_BATCH_SIZE,
+        workers: int = IMAGE_DECODE_WORKERS,
+    ) -> Iterator[dict]:
+        for batch in iter_decoded_batches(
+            image_paths, batch_size, workers, self.read_image
+        ):
+            paths = []
+            embeddings: list[Optional[np.ndarray]] = []
+            misses = []
+            for path, future in batch:
+                try:
+                    key, embedding, img = future.result()
+                except Exception as e:
+                    yield {"image": path, "error": str(e)}
+                    continue
+                if embedding is None:
+                    misses.append((len(paths), key, img))
+                paths.append(path)
+                embeddings.append(embedding)
+
+            if not paths:
+                continue
+
+            if misses:
+                encoded = self.embed_images([img for _, _, img in misses])
+                for (pos, _, _), embedding in zip(misses, encoded):
+                    embeddings[pos] = embedding
+                self.image_cache.put_many(
+                    {key: embedding for (_, key, _), embedding in zip(misses, encoded)}
+                )
+
+            hits_by_image = self.search_embedding_batch(np.stack(embeddings), limit)
+            for path, hits in zip(paths, hits_by_image):
+                yield {
+                    "image": path,
+                    "results": self.store.hydrate(hits, document_chars=100),
+                }
+
+
+def load_image(
+    image_path: str | BinaryIO, size: int = CLIP_IMAGE_SIZE
+) -> Image.Image:
+    img = Image.open(image_path)
+    if img.format == "JPEG":
+        img.draft("RGB", (size, size))
+    img = img.convert("RGB")
+
+    scale = size / min(img.size)
+    if scale < 1:
+        img = img.resize(
+            (max(size, round(img.width * scale)), max(size, round(img.height * scale))),
+            Image.Resampling.BICUBIC,
+        )
+    return img
+
+
+def iter_decoded_batches(
+    image_paths: list[str],
+    batch_size: int,
+    workers: int,
+    loader: Callable = load_image,
+) -> Iterator[list[tuple[str, Future]]]:
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        pending = None
+        for start in range(0, len(image_paths), batch_size):
+            batch = image_paths[start : start + batch_size]
+            submitted = [(path, pool.submit(loader, path)) for path in batch]
+            if pending is not None:
+                yield pending
+            pending = submitted
+        if pending is not None:
+            yield pending
+
+
+def list_images(source: str) -> list[str]:
+    if os.path.isdir(source):
+        return sorted(
+            os.path.join(root, name)
+            for root, _, names in os.walk(source)
+            for name in names
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS
+        )
+
+    base_dir = os.path.dirname(os.path.abspath(source))
+    paths = []
+    with open(source, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            paths.append(line if os.path.isabs(line) else os.path.join(base_dir, line))
+    return paths
+
+
+def text_hashes(texts: list[str]) -> np.ndarray:
+    return np.array(
+        [
+            int.from_bytes(
+                hashlib.blake2b(text.encode("utf-8"), digest_size=8).digest(), "little"
+            )
+            for text in texts
+        ],
+        dtype=np.uint64,
+    )
+
+
+def content_hash(hashes: np.ndarray) -> str:
+    return hashlib.blake2b(hashes.tobytes(), digest_size=16).hexdigest()
+
+
+def normalize_rows(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return np.divide(matrix, norms, out=np.zeros_like(matrix), where=norms != 0)
 
 
 def verify_image_embedding(image_path: str):
@@ -53,3 +319,17 @@ def image_search_command(image_path: str):
     movies = load_movies()
     multimodal_search = MultimodalSearch(docs=movies)
     return multimodal_search.search_with_image(image_path)
+
+
+def batch_image_search_command(
+    source: str,
+    limit: int = 5,
+    batch_size: int = IMAGE_BATCH_SIZE,
+    workers: int = IMAGE_DECODE_WORKERS,
+) -> Iterator[dict]:
+    image_paths = list_images(source)
+    movies = load_movies()
+    multimodal_search = MultimodalSearch(docs=movies)
+    yield from multimodal_search.iter_batch_search(
+        image_paths, limit, batch_size, workers
+    )
@@ -0,0 +1,82 @@
+import json
+import os
+import re
+import time
+import uuid
+from typing import Optional
+
+from lib.search_utils import CACHE_DIR, CURSOR_TTL_SECONDS
+
+CURSOR_ID_PATTERN = re.compile(r"[0-9a-f]{16}")
+
+
+class CursorCache:
+    def __init__(self, ttl: float = CURSOR_TTL_SECONDS):
+        self.ttl = ttl
+        self.cursor_dir = os.path.join(CACHE_DIR, "cursors")
+
+    def __path(self, cursor_id: str) -> str:
+        if not CURSOR_ID_PATTERN.fullmatch(cursor_id):
+            raise ValueError(f"Invalid cursor id: {cursor_id}")
+        return os.path.join(self.cursor_dir, f"{cursor_id}.json")
+
+    def __remove(self, path: str) -> None:
+        cursor_dir = os.path.realpath(self.cursor_dir)
+        if os.path.dirname(os.path.realpath(path)) != cursor_dir:
+            return
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def create(self, state: dict) -> str:
+        self.purge_expired()
+        cursor_id = uuid.uuid4().hex[:16]
+        self.update(cursor_id, state)
+        return cursor_id
+
+    def get(self, cursor_id: str) -> Optional[dict]:
+        path = self.__path(cursor_id)
+        try:
+            with open(path, "r") as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if state.get("expires_at", 0) < time.time():
+            self.__remove(path)
+            return None
+        return state
+
+    def update(self, cursor_id: str, state: dict) -> None:
+        os.makedirs(self.cursor_dir, exist_ok=True)
+        state["expires_at"] = time.time() + self.ttl
+        with open(self.__path(cursor_id), "w") as f:
+            json.dump(state, f)
+
+    def purge_expired(self) -> None:
+        if not os.path.isdir(self.cursor_dir):
+            return
+        now = time.time()
+        for name in os.listdir(self.cursor_dir):
+            if not name.endswith(".json") or not CURSOR_ID_PATTERN.fullmatch(name[:-5]):
+                continue
+            path = os.path.join(self.cursor_dir, name)
+            try:
+                with open(path, "r") as f:
+                    expires_at = json.load(f).get("expires_at", 0)
+            except (OSError, ValueError):
+                expires_at = 0
+            if expires_at < now:
+                self.__remove(path)
+
+
+def encode_cursor(cursor_id: str, offset: int) -> str:
+    return f"{cursor_id}:{offset}"
+
+
+def decode_cursor(cursor: str) -> tuple[str, int]:
+    cursor_id, _, offset = cursor.partition(":")
+    if not CURSOR_ID_PATTERN.fullmatch(cursor_id) or not offset.isdigit():
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return cursor_id, int(offset)
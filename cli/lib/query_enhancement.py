@@ -1,13 +1,10 @@
-import os
-from typing import Optional
+import sys
+from typing import Callable, Optional
 
-from dotenv import load_dotenv
-from google import genai
-
-load_dotenv()
-api_key = os.environ.get("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
-model = "gemini-2.0-flash"
+from lib.llm_client import generate_text
+from lib.local_enhancement import get_local_enhancer
+from lib.search_utils import LOCAL_ENHANCE_MIN_CONFIDENCE
+from lib.tracing import traced
 
 
 def spell_correct(query: str) -> str:
@@ -20,8 +17,7 @@ Query: "{query}"
 If no errors, return the original query.
 Corrected:"""
 
-    response = client.models.generate_content(model=model, contents=prompt)
-    corrected = (response.text or "").strip().strip('"')
+    corrected = generate_text(prompt).strip('"')
     return corrected if corrected else query
 
 
@@ -45,8 +41,7 @@ Examples:
 
 Rewritten query:"""
 
-    response = client.models.generate_content(model=model, contents=prompt)
-    corrected = (response.text or "").strip().strip('"')
+    corrected = generate_text(prompt).strip('"')
     return corrected if corrected else query
 
 
@@ -66,18 +61,44 @@ Examples:
 Query: "{query}"
 """
 
-    response = client.models.generate_content(model=model, contents=prompt)
-    corrected = (response.text or "").strip().strip('"')
+    corrected = generate_text(prompt).strip('"')
     return corrected if corrected else query
 
 
-def enhance_query(query: str, method: Optional[str] = None) -> str:
+def local_or_llm(
+    query: str,
+    local: Callable[[str], tuple[str, float]],
+    fallback: Callable[[str], str],
+) -> str:
+    enhanced, confidence = local(query)
+    if confidence >= LOCAL_ENHANCE_MIN_CONFIDENCE:
+        return enhanced
+
+    try:
+        return fallback(query)
+    except Exception as e:
+        print(
+            f"LLM enhancement unavailable, using local result: {e}", file=sys.stderr
+        )
+        return enhanced
+
+
+@traced("enhance")
+def enhance_query(
+    query: str, method: Optional[str] = None, local: bool = True
+) -> str:
     match method:
         case "expand":
+            if local:
+                return local_or_llm(query, get_local_enhancer().expand, expand_query)
             return expand_query(query)
         case "rewrite":
             return rewrite_query(query)
         case "spell":
+            if local:
+                return local_or_llm(
+                    query, get_local_enhancer().spell_correct, spell_correct
+                )
             return spell_correct(query)
         case _:
             return query
@@ -1,27 +1,99 @@
-import os
-from time import sleep
+import asyncio
 import json
-
-from dotenv import load_dotenv
-from google import genai
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Any, Optional
+
+from lib.llm_client import get_llm
+from lib.search_utils import (BATCH_RERANK_DOC_CHARS, BATCH_RERANK_SURVIVORS,
+                              BATCH_RERANK_WINDOW_SIZE,
+                              CASCADE_CROSS_ENCODER_BUDGET_MS,
+                              CASCADE_CROSS_ENCODER_TOP_N, CASCADE_LLM_BUDGET_MS,
+                              CASCADE_LLM_TOP_M, CASCADE_MARGIN_THRESHOLD,
+                              CROSS_ENCODER_BATCH_SIZE, CROSS_ENCODER_CACHE_SIZE,
+                              CROSS_ENCODER_MODEL, CROSS_ENCODER_WORKERS)
+from lib.tracing import traced
 from sentence_transformers import CrossEncoder
 
-load_dotenv()
-api_key = os.environ.get("GEMINI_API_KEY")
-client = genai.Client(api_key=api_key)
-model = "gemini-2.0-flash"
+
+class ScoreCache:
+    def __init__(self, max_size: int = CROSS_ENCODER_CACHE_SIZE):
+        self.max_size = max_size
+        self.scores: OrderedDict[tuple, float] = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: tuple) -> Optional[float]:
+        with self.lock:
+            score = self.scores.get(key)
+            if score is not None:
+                self.scores.move_to_end(key)
+            return score
+
+    def put(self, key: tuple, score: float) -> None:
+        with self.lock:
+            self.scores[key] = score
+            self.scores.move_to_end(key)
+            while len(self.scores) > self.max_size:
+                self.scores.popitem(last=False)
+
+
+cross_encoder_cache = ScoreCache()
 
 
+@lru_cache(maxsize=1)
+def get_cross_encoder() -> CrossEncoder:
+    return CrossEncoder(CROSS_ENCODER_MODEL)
+
+
+@traced("cross_encoder.score")
+def cross_encoder_scores(
+    query: str,
+    docs: list[dict],
+    batch_size: int = CROSS_ENCODER_BATCH_SIZE,
+    workers: int = CROSS_ENCODER_WORKERS,
+) -> list[float]:
+    texts = []
+    keys: list[tuple[str, Any]] = []
+    for doc in docs:
+        text = f"{doc.get('title', '')} - {doc.get('document', '')}"
+        texts.append(text)
+        keys.append((query, doc.get("id", text)))
+
+    scores: list[Optional[float]] = [cross_encoder_cache.get(key) for key in keys]
+    pending = [i for i, score in enumerate(scores) if score is None]
+    if pending:
+        pending.sort(key=lambda i: len(texts[i]))
+        batches = [
+            pending[start : start + batch_size]
+            for start in range(0, len(pending), batch_size)
+        ]
+        cross_encoder = get_cross_encoder()
+
+        def score_batch(batch: list[int]):
+            pairs = [[query, texts[i]] for i in batch]
+            return cross_encoder.predict(
+                pairs, batch_size=len(pairs), show_progress_bar=False
+            )
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            for batch, batch_scores in zip(batches, pool.map(score_batch, batches)):
+                for i, score in zip(batch, batch_scores):
+                    scores[i] = float(score)
+                    cross_encoder_cache.put(keys[i], float(score))
+
+    return [score if score is not None else 0.0 for score in scores]
+
+
+@traced("rerank.cross_encoder")
 def rerank_cross_encoder(query: str, docs: list[dict], limit: int = 5) -> list[dict]:
     if not docs:
         return []
 
-    pairs = []
-    for doc in docs:
-        pairs.append([query, f"{doc.get('title', '')} - {doc.get('document', '')}"])
-
-    cross_encoder = CrossEncoder("cross-encoder/ms-marco-TinyBERT-L2-v2")
-    scores = cross_encoder.predict(pairs)
+    scores = cross_encoder_scores(query, docs)
 
     for i, score in enumerate(scores):
         docs[i]["cross_encoder_score"] = score
@@ -31,22 +103,92 @@ def rerank_cross_encoder(query: str, docs: list[dict], limit: int = 5) -> list[d
     return sorted_docs[:limit]
 
 
-def rerank_batch(query: str, docs: list[dict], limit: int = 5) -> list[dict]:
+@traced("rerank.batch")
+def rerank_batch(
+    query: str,
+    docs: list[dict],
+    limit: int = 5,
+    window_size: int = BATCH_RERANK_WINDOW_SIZE,
+    survivors: int = BATCH_RERANK_SURVIVORS,
+    timeout: Optional[float] = None,
+) -> list[dict]:
+    if window_size < 2:
+        raise ValueError("window_size must be at least 2")
     if not docs:
         return []
 
-    doc_map = {}
+    doc_map = {doc["id"]: doc for doc in docs}
+    remaining = list(doc_map)
+    keep = max(1, min(survivors, window_size - 1))
+    eliminated: list[list] = []
+    deadline = None if timeout is None else time.monotonic() + timeout
+
+    while True:
+        windows = [
+            remaining[start : start + window_size]
+            for start in range(0, len(remaining), window_size)
+        ]
+        responses = get_llm().run_all(
+            [
+                batch_rerank_prompt(query, [doc_map[doc_id] for doc_id in window])
+                for window in windows
+            ],
+            None if deadline is None else max(0.0, deadline - time.monotonic()),
+        )
+        rankings = [
+            parse_ranked_ids(response, window)
+            for window, response in zip(windows, responses)
+        ]
+        if len(windows) == 1:
+            ranked = rankings[0]
+            break
+
+        advancing = [
+            ranking[pos]
+            for pos in range(keep)
+            for ranking in rankings
+            if pos < len(ranking)
+        ]
+        if len(advancing) >= len(remaining):
+            ranked = [
+                ranking[pos]
+                for pos in range(window_size)
+                for ranking in rankings
+                if pos < len(ranking)
+            ]
+            break
+
+        remaining = advancing
+        eliminated.insert(
+            0,
+            [
+                ranking[pos]
+                for pos in range(keep, window_size)
+                for ranking in rankings
+                if pos < len(ranking)
+            ],
+        )
+
+    for losers in eliminated:
+        ranked.extend(losers)
+
+    reranked = []
+    for i, doc_id in enumerate(ranked[:limit]):
+        reranked.append({**doc_map[doc_id], "batch_rank": i + 1})
+
+    return reranked
+
+
+def batch_rerank_prompt(query: str, docs: list[dict]) -> str:
     doc_list = []
     for doc in docs:
-        doc_id = doc["id"]
-        doc_map[doc_id] = doc
         doc_list.append(
-            f"{doc_id}: {doc.get('title', '')} - {doc.get('document', '')[:200]}"
+            f"{doc['id']}: {doc.get('title', '')} - {doc.get('document', '')[:BATCH_RERANK_DOC_CHARS]}"
         )
 
     doc_list_str = "\n".join(doc_list)
 
-    prompt = f"""Rank these movies by relevance to the search query.
+    return f"""Rank these movies by relevance to the search query.
 
 Query: "{query}"
 
@@ -58,23 +200,61 @@ Return ONLY the IDs in order of relevance (best match first). Return a valid JSO
 [75, 12, 34, 2, 1]
 """
 
-    response = client.models.generate_content(model=model, contents=prompt)
-    cleaned_response = (response.text or "").strip()
-    json_response = json.loads(cleaned_response)
-
-    reranked = []
-    for i, doc_id in enumerate(json_response):
-        if doc_id in doc_map:
-            reranked.append({**doc_map[doc_id], "batch_rank": i + 1})
 
-    return reranked[:limit]
+def parse_ranked_ids(response: str | Exception, prior: list) -> list:
+    if isinstance(response, Exception):
+        return list(prior)
+
+    candidates: list = []
+    match = re.search(r"\[.*?\]", response, flags=re.DOTALL)
+    if match:
+        try:
+            parsed = json.loads(match.group())
+            if isinstance(parsed, list):
+                candidates = parsed
+        except ValueError:
+            pass
+    if not candidates:
+        candidates = re.findall(r"-?\d+", response)
+
+    valid = {str(doc_id): doc_id for doc_id in prior}
+    ranked = []
+    seen = set()
+    for candidate in candidates:
+        doc_id = valid.get(str(candidate).strip())
+        if doc_id is not None and doc_id not in seen:
+            seen.add(doc_id)
+            ranked.append(doc_id)
+
+    ranked.extend(doc_id for doc_id in prior if doc_id not in seen)
+    return ranked
+
+
+@traced("rerank.individual")
+def rerank_individual(
+    query: str, docs: list[dict], limit: int = 5, timeout: Optional[float] = None
+) -> list[dict]:
+    prompts = []
+    for doc in docs:
+        prompts.append(individual_rerank_prompt(query, doc))
 
+    responses = get_llm().run_all(prompts, timeout)
 
-def rerank_individual(query: str, docs: list[dict], limit: int = 5) -> list[dict]:
     scored_docs = []
+    failed_docs = []
+    for doc, response in zip(docs, responses):
+        score = parse_individual_score(response)
+        if score is None:
+            failed_docs.append({**doc, "rerank_error": rerank_error(response)})
+        else:
+            scored_docs.append({**doc, "individual_score": score})
+
+    scored_docs.sort(key=lambda x: x["individual_score"], reverse=True)
+    return (scored_docs + failed_docs)[:limit]
 
-    for doc in docs:
-        prompt = f"""Rate how well this movie matches the search query.
+
+def individual_rerank_prompt(query: str, doc: dict) -> str:
+    return f"""Rate how well this movie matches the search query.
 
     Query: "{query}"
     Movie: {doc.get("title", "")} - {doc.get("document", "")}
@@ -89,25 +269,111 @@ def rerank_individual(query: str, docs: list[dict], limit: int = 5) -> list[dict
 
     Score:"""
 
-        response = client.models.generate_content(model=model, contents=prompt)
-        score_text = (response.text or "").strip()
-        score = int(score_text)
-        scored_docs.append({**doc, "individual_score": score})
-        sleep(3)
 
-    scored_docs.sort(key=lambda x: x["individual_score"], reverse=True)
-    return scored_docs[:limit]
+def parse_individual_score(response: str | Exception) -> Optional[int]:
+    if isinstance(response, Exception):
+        return None
+    match = re.search(r"\d+", response)
+    if not match:
+        return None
+    return min(int(match.group()), 10)
+
+
+def rerank_error(response: str | Exception) -> str:
+    if isinstance(response, Exception):
+        return f"{type(response).__name__}: {response}"
+    return f"unparseable score: {response[:40]!r}"
+
+
+@traced("rerank.cascade")
+def cascade_rerank(
+    query: str,
+    docs: list[dict],
+    limit: int = 5,
+    cross_encoder_top_n: int = CASCADE_CROSS_ENCODER_TOP_N,
+    llm_top_m: int = CASCADE_LLM_TOP_M,
+    llm_method: str = "batch",
+    margin_threshold: float = CASCADE_MARGIN_THRESHOLD,
+    cross_encoder_budget_ms: float = CASCADE_CROSS_ENCODER_BUDGET_MS,
+    llm_budget_ms: float = CASCADE_LLM_BUDGET_MS,
+) -> tuple[list[dict], list[dict]]:
+    start = time.perf_counter()
+    stages = [{"stage": "fusion", "candidates": len(docs), "ms": 0.0}]
+
+    def elapsed_ms() -> float:
+        return (time.perf_counter() - start) * 1000
+
+    if not docs:
+        return [], stages
+
+    head = docs[:cross_encoder_top_n]
+    tail = docs[cross_encoder_top_n:]
+    head = rerank_cross_encoder(query, head, len(head))
+    stages.append(
+        {"stage": "cross_encoder", "candidates": len(head), "ms": elapsed_ms()}
+    )
+    ranked = head + tail
+
+    skip_reason = None
+    if elapsed_ms() > cross_encoder_budget_ms:
+        skip_reason = "cross-encoder stage exceeded its latency budget"
+    elif len(head) > limit:
+        margin = head[limit - 1]["cross_encoder_score"] - head[limit]["cross_encoder_score"]
+        if margin >= margin_threshold:
+            skip_reason = f"cross-encoder margin {margin:.2f} at rank {limit}"
+    elif len(head) <= 1:
+        skip_reason = "nothing to reorder"
+
+    if skip_reason or llm_top_m <= 0:
+        stages.append(
+            {
+                "stage": f"llm_{llm_method}",
+                "candidates": 0,
+                "ms": 0.0,
+                "skipped": skip_reason or "disabled",
+            }
+        )
+        return ranked[:limit], stages
+
+    llm_start = time.perf_counter()
+    top = ranked[:llm_top_m]
+    rest = ranked[llm_top_m:]
+    stage = {"stage": f"llm_{llm_method}", "candidates": len(top)}
+
+    try:
+        reranked = rerank_result(
+            query, top, llm_method, len(top), timeout=llm_budget_ms / 1000
+        )
+        seen = {doc.get("id") for doc in reranked}
+        reranked.extend(doc for doc in top if doc.get("id") not in seen)
+    except asyncio.TimeoutError:
+        reranked = top
+        stage["skipped"] = "llm stage exceeded its latency budget"
+    except Exception as e:
+        reranked = top
+        stage["skipped"] = f"llm stage failed: {e}"
+
+    stage["ms"] = (time.perf_counter() - llm_start) * 1000
+    stages.append(stage)
+
+    return (reranked + rest)[:limit], stages
 
 
 def rerank_result(
-    query: str, docs: list[dict], method: str = "batch", limit: int = 5
+    query: str,
+    docs: list[dict],
+    method: str = "batch",
+    limit: int = 5,
+    timeout: Optional[float] = None,
 ) -> list[dict]:
     match method:
+        case "cascade":
+            return cascade_rerank(query, docs, limit)[0]
         case "cross_encoder":
             return rerank_cross_encoder(query, docs, limit)
         case "batch":
-            return rerank_batch(query, docs, limit)
+            return rerank_batch(query, docs, limit, timeout=timeout)
         case "individual":
-            return rerank_individual(query, docs, limit)
+            return rerank_individual(query, docs, limit, timeout)
         case _:
             return docs[:limit]
@@ -1,24 +1,89 @@
 import json
 import os
 import string
-from typing import Any
+from functools import lru_cache
+from typing import Any, Iterable, Iterator, NamedTuple, Optional
 
+import numpy as np
 from nltk.stem import PorterStemmer
 
 DEFAULT_SEARCH_LIMIT = 5
 SCORE_PRECISION = 3
 DEFAULT_K_VALUE = 60
 SEARCH_MULTIPLIER = 10
+RAG_CANDIDATE_MULTIPLIER = 2
+RAG_CONTEXT_TOKEN_BUDGET = 1500
+RAG_DEDUP_THRESHOLD = 0.92
+CANDIDATE_MULTIPLIER = 500
+CURSOR_TTL_SECONDS = 300
+STREAM_BLOCK_SIZE = 10
+LLM_MODEL = "gemini-2.0-flash"
+LLM_MAX_CONCURRENCY = 5
+LLM_REQUESTS_PER_SECOND = 2.0
+LLM_BURST = 5
+LLM_MAX_RETRIES = 3
+LLM_BACKOFF_SECONDS = 1.0
+LLM_TIMEOUT_SECONDS = 30.0
+CROSS_ENCODER_MODEL = "cross-encoder/ms-marco-TinyBERT-L2-v2"
+CROSS_ENCODER_BATCH_SIZE = 16
+CROSS_ENCODER_WORKERS = 2
+CROSS_ENCODER_CACHE_SIZE = 10000
+CASCADE_CROSS_ENCODER_TOP_N = 25
+CASCADE_LLM_TOP_M = 10
+CASCADE_MARGIN_THRESHOLD = 2.0
+CASCADE_CROSS_ENCODER_BUDGET_MS = 2000
+CASCADE_LLM_BUDGET_MS = 15000
+BATCH_RERANK_WINDOW_SIZE = 20
+BATCH_RERANK_SURVIVORS = 10
+BATCH_RERANK_DOC_CHARS = 200
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
+CACHE_DIR = os.path.join(PROJECT_ROOT, "cache")
 MOVIES_PATH = os.path.join(PROJECT_ROOT, "data", "movies.json")
 STOPWORDS_PATH = os.path.join(PROJECT_ROOT, "data", "stopwords.txt")
 GOLDEN_DATASET_PATH = os.path.join(PROJECT_ROOT, "data", "golden_dataset.json")
+LLM_CACHE_PATH = os.path.join(CACHE_DIR, "llm_cache.sqlite")
+LLM_CACHE_MAX_ENTRIES = 20000
+LLM_CACHE_TTL_SECONDS = 7 * 24 * 60 * 60
+IMAGE_CACHE_PATH = os.path.join(CACHE_DIR, "image_embeddings.sqlite")
+IMAGE_CACHE_MAX_ENTRIES = 50000
 BM25_K1 = 1.5
 BM25_B = 0.75
 DEFAULT_CHUNK_SIZE = 200
 DEFAULT_CHUNK_OVERLAP = 1
 DEFAULT_MAX_CHUNK_SIZE = 4
+FACET_FIELDS = ["genre", "year", "rating", "availability"]
+LOCAL_SPELL_MAX_EDIT_DISTANCE = 2
+LOCAL_SPELL_PREFIX_LENGTH = 7
+LOCAL_EXPANSION_TERMS = 5
+LOCAL_ENHANCE_MIN_CONFIDENCE = 0.6
+CLIP_IMAGE_SIZE = 224
+IMAGE_BATCH_SIZE = 32
+IMAGE_DECODE_WORKERS = 4
+IMAGE_LEG_WEIGHT = 0.3
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png", ".webp", ".bmp", ".gif"}
+BENCHMARK_SIZES = [1_000, 100_000]
+BENCHMARK_EMBEDDING_DIM = 384
+BENCHMARK_MIN_ROUNDS = 5
+BENCHMARK_MAX_ROUNDS = 100
+BENCHMARK_MIN_TIME_SECONDS = 0.5
+BENCHMARK_REGRESSION_THRESHOLD = 0.2
+TRACE_MAX_SPANS = 10000
+TRACE_METRIC_PREFIX = "hoopla"
+LOAD_TEST_DURATION_SECONDS = 30.0
+LOAD_TEST_QPS = 10.0
+LOAD_TEST_CONCURRENCY = 4
+LOAD_TEST_MAX_WORKERS = 64
+LOAD_TEST_VARIANTS = 5
+LOAD_TEST_LLM_LATENCY = 0.2
+LOAD_TEST_PIPELINES = ["bm25", "rrf", "rrf_cross_encoder"]
+COMPARISON_RBO_P = 0.9
+
+
+class SearchHits(NamedTuple):
+    indices: np.ndarray
+    scores: np.ndarray
+    metadata: Optional[dict[str, np.ndarray]] = None
 
 
 def load_golden_dataset() -> dict:
@@ -32,11 +97,30 @@ def load_movies() -> list[dict]:
     return data.get("movies")
 
 
+def load_query_log(path: str) -> list[str]:
+    queries = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            if line.startswith("{"):
+                line = json.loads(line).get("query", "")
+            if line:
+                queries.append(line)
+    return queries
+
+
 def load_stopwords() -> list:
     with open(STOPWORDS_PATH, "r") as f:
         lines = f.read().splitlines()
     return lines
 
+
+@lru_cache(maxsize=1)
+def stopword_set() -> frozenset:
+    return frozenset(load_stopwords())
+
 def preprocess_text(text: str) -> str:
     text = text.lower()
     text = text.translate(str.maketrans("", "", string.punctuation))
@@ -49,7 +133,7 @@ def tokenize(input: str) -> list:
     for token in tokens:
         if token:
             valid_tokens.append(token)
-    stopwords = load_stopwords()
+    stopwords = stopword_set()
     filtered_words = []
     for word in valid_tokens:
         if word not in stopwords:
@@ -79,3 +163,43 @@ def format_search_result(doc_id: str, title: str, document: str, score: float, *
         "score": round(score, SCORE_PRECISION),
         "metadata": metadata if metadata else {},
     }
+
+
+def top_k_indices(scores: np.ndarray, limit: int) -> np.ndarray:
+    if limit <= 0 or scores.size == 0:
+        return np.empty(0, dtype=np.int32)
+
+    if limit >= scores.size:
+        order = np.argsort(-scores, kind="stable")
+    else:
+        candidates = np.argpartition(-scores, limit - 1)[:limit]
+        order = candidates[np.argsort(-scores[candidates], kind="stable")]
+
+    return order.astype(np.int32)
+
+
+def iter_top_k(
+    scores: np.ndarray, limit: int, block_size: int = STREAM_BLOCK_SIZE
+) -> Iterator[int]:
+    if limit <= 0 or scores.size == 0:
+        return
+
+    if limit < scores.size:
+        remaining = np.argpartition(-scores, limit - 1)[:limit]
+    else:
+        remaining = np.arange(scores.size)
+
+    while remaining.size > 0:
+        take = min(block_size, remaining.size)
+        if take < remaining.size:
+            split = np.argpartition(-scores[remaining], take - 1)
+            block, remaining = remaining[split[:take]], remaining[split[take:]]
+        else:
+            block, remaining = remaining, remaining[:0]
+        for pos in block[np.lexsort((block, -scores[block]))]:
+            yield int(pos)
+
+
+def write_jsonl(results: Iterable[dict]) -> None:
+    for result in results:
+        print(json.dumps(result), flush=True)
@@ -1,97 +1,144 @@
 import json
 import os
 import re
-from collections import defaultdict
+from typing import Iterator, Optional
 
 import numpy as np
+from lib.document_store import DocumentStore
 from lib.search_utils import (DEFAULT_CHUNK_OVERLAP, DEFAULT_CHUNK_SIZE,
-                              DEFAULT_MAX_CHUNK_SIZE, PROJECT_ROOT,
-                              format_search_result, load_movies)
+                              DEFAULT_MAX_CHUNK_SIZE, PROJECT_ROOT, SearchHits,
+                              iter_top_k, load_movies, top_k_indices)
+from lib.tracing import span, traced
 from sentence_transformers import SentenceTransformer
 
 
 class SemanticSearch:
-    def __init__(self, model_name="all-MiniLM-L6-v2"):
-        self.model = SentenceTransformer(model_name)
+    def __init__(
+        self,
+        model_name="all-MiniLM-L6-v2",
+        store: Optional[DocumentStore] = None,
+        model=None,
+    ):
+        with span("model.load"):
+            self.model = model if model is not None else SentenceTransformer(model_name)
         self.embeddings = None
-        self.documents = None
-        self.document_map = defaultdict()
+        self.store = store
+        self._last_query: Optional[tuple[str, np.ndarray]] = None
         self.embeddings_path = os.path.join(
             PROJECT_ROOT, "cache", "movie_embeddings.npy"
         )
 
-    def load_or_create_embeddings(self, documents: list[dict]):
-        self.documents = documents
+    def _attach_store(self, documents: list[dict]) -> None:
+        if self.store is None or not self.store.matches(documents):
+            self.store = DocumentStore.for_documents(documents)
 
-        for doc in documents:
-            self.document_map[doc["id"]] = doc
+    @traced("embeddings.load")
+    def load_or_create_embeddings(self, documents: list[dict]):
+        self._attach_store(documents)
 
         if os.path.exists(self.embeddings_path):
             with open(self.embeddings_path, "rb") as f:
                 self.embeddings = np.load(f)
 
-        if self.embeddings is not None and len(self.embeddings) == len(self.documents):
+        if (
+            self.embeddings is not None
+            and len(self.embeddings) == len(documents)
+            and self.__cached_content_hash() == self.store.content_hash
+        ):
             return self.embeddings
 
         return self.build_embeddings(documents)
 
     def build_embeddings(self, documents: list[dict]):
-        self.documents = documents
+        self._attach_store(documents)
 
         movie_strings = []
         for doc in documents:
-            self.document_map[doc["id"]] = doc
             movie_strings.append(f"{doc['title']}:{doc['description']}")
 
         self.embeddings = self.model.encode(movie_strings, show_progress_bar=True)
 
         with open(self.embeddings_path, "wb") as f:
             np.save(f, self.embeddings)
+        with open(self.__manifest_path(), "w") as f:
+            json.dump({"content_hash": self.store.content_hash}, f)
 
         return self.embeddings
 
+    def __manifest_path(self) -> str:
+        return os.path.splitext(self.embeddings_path)[0] + "_manifest.json"
+
+    def __cached_content_hash(self) -> Optional[str]:
+        try:
+            with open(self.__manifest_path(), "r") as f:
+                return json.load(f).get("content_hash")
+        except (OSError, ValueError):
+            return None
+
     def generate_embedding(self, text: str):
         if text == "" or text.isspace():
             raise ValueError("No input text provided")
 
-        embedding = self.model.encode([text])
-        return embedding[0]
-
-    def search(self, query: str, limit: int) -> list[dict]:
+        last_query = self._last_query
+        if last_query is not None and last_query[0] == text:
+            return last_query[1]
+
+        with span("embedding.encode"):
+            embedding = self.model.encode([text])[0]
+        self._last_query = (text, embedding)
+        return embedding
+
+    def search_hits(
+        self, query: str, limit: int, mask: Optional[np.ndarray] = None
+    ) -> SearchHits:
+        candidates, scores = self._candidate_scores(query, mask)
+        order = top_k_indices(scores, limit)
+        return SearchHits(candidates[order], scores[order])
+
+    @traced("semantic.score")
+    def _candidate_scores(
+        self, query: str, mask: Optional[np.ndarray] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
         if self.embeddings is None or self.embeddings.size == 0:
             raise ValueError("No embeddings loaded")
 
-        if self.documents is None or len(self.documents) == 0:
+        if self.store is None or len(self.store) == 0:
             raise ValueError("No documents loaded")
 
         embedding = self.generate_embedding(query)
+        if mask is None:
+            candidates = np.arange(len(self.embeddings), dtype=np.int32)
+            return candidates, cosine_similarities(self.embeddings, embedding)
 
-        scores = []
-        for i, e in enumerate(self.embeddings):
-            similarity = cosine_similarity(embedding, e)
-            scores.append((similarity, self.documents[i]))
-
-        sorted_scores = sorted(scores, key=lambda x: x[0], reverse=True)
+        candidates = np.flatnonzero(mask).astype(np.int32)
+        return candidates, cosine_similarities(self.embeddings[candidates], embedding)
 
-        result = []
-        for score, doc in sorted_scores[:limit]:
-            result.append(
-                {
-                    "doc_id": doc.get("id"),
-                    "score": score,
-                    "title": doc.get("title"),
-                    "description": doc.get("description"),
-                }
-            )
+    def search(self, query: str, limit: int) -> list[dict]:
+        return list(self.iter_search(query, limit))
 
-        return result
+    def iter_search(self, query: str, limit: int) -> Iterator[dict]:
+        candidates, scores = self._candidate_scores(query)
+        for pos in iter_top_k(scores, limit):
+            doc = self.store.document(int(candidates[pos]))
+            yield {
+                "doc_id": doc["id"],
+                "score": float(scores[pos]),
+                "title": doc["title"],
+                "description": doc["description"],
+            }
 
 
 class ChunkedSemanticSearch(SemanticSearch):
-    def __init__(self, model_name="all-MiniLM-L6-v2") -> None:
-        super().__init__(model_name)
+    def __init__(
+        self,
+        model_name="all-MiniLM-L6-v2",
+        store: Optional[DocumentStore] = None,
+        model=None,
+    ) -> None:
+        super().__init__(model_name, store, model)
         self.chunk_embeddings = None
         self.chunk_metadata = None
+        self.chunk_doc_indices = np.empty(0, dtype=np.int32)
         self.chunk_embeddings_path = os.path.join(
             PROJECT_ROOT, "cache", "chunk_embeddings.npy"
         )
@@ -100,10 +147,7 @@ class ChunkedSemanticSearch(SemanticSearch):
         )
 
     def build_chunk_embeddings(self, documents: list[dict]) -> np.ndarray:
-        self.documents = documents
-        self.document_map = {}
-        for doc in documents:
-            self.document_map[doc["id"]] = doc
+        self._attach_store(documents)
 
         all_chunks = []
         metadata = []
@@ -127,77 +171,139 @@ class ChunkedSemanticSearch(SemanticSearch):
                 )
         self.chunk_embeddings = self.model.encode(all_chunks, show_progress_bar=True)
         self.chunk_metadata = metadata
+        self.__index_chunk_metadata()
 
         np.save(self.chunk_embeddings_path, self.chunk_embeddings)
 
         with open(self.chunk_metadata_path, "w") as f:
             json.dump(
-                {"chunks": self.chunk_metadata, "total_chunks": len(all_chunks)},
+                {
+                    "chunks": self.chunk_metadata,
+                    "total_chunks": len(all_chunks),
+                    "content_hash": self.store.content_hash,
+                },
                 f,
                 indent=2,
             )
 
         return self.chunk_embeddings
 
+    @traced("chunk_embeddings.load")
     def load_or_create_chunk_embeddings(self, documents: list[dict]) -> np.ndarray:
-        self.documents = documents
-        self.document_map = {}
-        for doc in documents:
-            self.document_map[doc["id"]] = doc
+        self._attach_store(documents)
 
         if os.path.exists(self.chunk_embeddings_path) and os.path.exists(
             self.chunk_metadata_path
         ):
-            self.chunk_embeddings = np.load(self.chunk_embeddings_path)
-
             with open(self.chunk_metadata_path, "r") as f:
                 data = json.load(f)
+            if data.get("content_hash") == self.store.content_hash:
+                self.chunk_embeddings = np.load(self.chunk_embeddings_path)
                 self.chunk_metadata = data["chunks"]
-            return self.chunk_embeddings
+                self.__index_chunk_metadata()
+                return self.chunk_embeddings
 
         return self.build_chunk_embeddings(documents)
 
-    def search_chunks(self, query: str, limit: int = 10) -> list[dict]:
+    def __index_chunk_metadata(self) -> None:
+        self.chunk_doc_indices = np.array(
+            [chunk["movie_idx"] for chunk in self.chunk_metadata or []],
+            dtype=np.int32,
+        )
+
+    def search_chunk_hits(
+        self, query: str, limit: int = 10, mask: Optional[np.ndarray] = None
+    ) -> SearchHits:
+        matched, scores = self.chunk_doc_scores(query, mask)
+        order = top_k_indices(scores, limit)
+        return SearchHits(matched[order], scores[order])
+
+    @traced("chunk.score")
+    def chunk_doc_scores(
+        self, query: str, mask: Optional[np.ndarray] = None
+    ) -> tuple[np.ndarray, np.ndarray]:
         if self.chunk_embeddings is None or self.chunk_metadata is None:
             raise ValueError("No chunk embeddings loaded")
 
         query_embedding = self.generate_embedding(query)
-        chunk_score = []
+        chunk_embeddings = self.chunk_embeddings
+        chunk_doc_indices = self.chunk_doc_indices
+        if mask is not None:
+            allowed = np.flatnonzero(mask[chunk_doc_indices])
+            chunk_embeddings = chunk_embeddings[allowed]
+            chunk_doc_indices = chunk_doc_indices[allowed]
+        chunk_scores = cosine_similarities(chunk_embeddings, query_embedding)
+
+        doc_scores = np.full(len(self.store), -np.inf, dtype=np.float32)
+        np.maximum.at(doc_scores, chunk_doc_indices, chunk_scores)
+
+        matched = np.flatnonzero(np.isfinite(doc_scores)).astype(np.int32)
+        return matched, doc_scores[matched]
+
+    @traced("chunk.score_batch")
+    def search_chunk_hits_batch(
+        self, queries: list[str], limit: int = 10
+    ) -> list[SearchHits]:
+        if self.chunk_embeddings is None or self.chunk_metadata is None:
+            raise ValueError("No chunk embeddings loaded")
+        if not queries:
+            return []
+        if len(self.chunk_doc_indices) == 0:
+            empty = SearchHits(np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32))
+            return [empty] * len(queries)
+
+        query_embeddings = np.asarray(self.model.encode(queries), dtype=np.float32)
+        query_embeddings /= np.maximum(
+            np.linalg.norm(query_embeddings, axis=1, keepdims=True), 1e-12
+        )
+        chunk_norms = np.linalg.norm(self.chunk_embeddings, axis=1, keepdims=True)
+        chunk_scores = (self.chunk_embeddings @ query_embeddings.T) / np.where(
+            chunk_norms == 0, 1, chunk_norms
+        )
 
-        for i, chunk in enumerate(self.chunk_embeddings):
-            score = cosine_similarity(query_embedding, chunk)
-            chunk_metadata = self.chunk_metadata[i]
-            chunk_score.append(
-                {
-                    "chunk_idx": i,
-                    "movie_idx": chunk_metadata["movie_idx"],
-                    "score": score,
-                }
-            )
+        order = np.argsort(self.chunk_doc_indices, kind="stable")
+        doc_indices = self.chunk_doc_indices[order]
+        starts = np.flatnonzero(np.r_[True, doc_indices[1:] != doc_indices[:-1]])
+        matched = doc_indices[starts].astype(np.int32)
+        doc_scores = np.maximum.reduceat(chunk_scores[order], starts, axis=0)
+
+        hits = []
+        for column in doc_scores.T:
+            top = top_k_indices(column, limit)
+            hits.append(SearchHits(matched[top], column[top]))
+        return hits
+
+    def chunk_scores(
+        self, query: str, doc_indices: np.ndarray
+    ) -> tuple[np.ndarray, np.ndarray]:
+        if self.chunk_embeddings is None or self.chunk_metadata is None:
+            raise ValueError("No chunk embeddings loaded")
 
-        movies_to_scores = {}
-        for score in chunk_score:
-            movie_idx = score["movie_idx"]
-            if (
-                movie_idx not in movies_to_scores
-                or movies_to_scores[movie_idx] < score["score"]
-            ):
-                movies_to_scores[movie_idx] = score["score"]
-
-        sorted_movies = sorted(movies_to_scores.items(), key=lambda x: x[1], reverse=True)
-
-        results = []
-        for movie_idx, score in sorted_movies[:limit]:
-            doc = self.documents[movie_idx]
-            result = format_search_result(
-                doc_id=doc["id"],
-                title=doc["title"],
-                document=doc["description"][:100],
-                score=score,
-            )
-            results.append(result)
+        rows = np.flatnonzero(np.isin(self.chunk_doc_indices, doc_indices))
+        scores = cosine_similarities(
+            self.chunk_embeddings[rows], self.generate_embedding(query)
+        )
+        return rows, scores
+
+    def chunk_text(self, row: int) -> str:
+        chunk = self.chunk_metadata[row]
+        chunks = semantic_chunking(
+            self.store.description(chunk["movie_idx"]),
+            DEFAULT_MAX_CHUNK_SIZE,
+            DEFAULT_CHUNK_OVERLAP,
+        )
+        if chunk["chunk_idx"] >= len(chunks):
+            return ""
+        return chunks[chunk["chunk_idx"]]
 
-        return results
+    def search_chunks(self, query: str, limit: int = 10) -> list[dict]:
+        hits = self.search_chunk_hits(query, limit)
+        return self.store.hydrate(hits, document_chars=100)
+
+    def iter_search_chunks(self, query: str, limit: int = 10) -> Iterator[dict]:
+        matched, scores = self.chunk_doc_scores(query)
+        for pos in iter_top_k(scores, limit):
+            yield self.store.result(int(matched[pos]), float(scores[pos]), 100)
 
 
 def search_chunked(query: str, limit: int = 10) -> list[dict]:
@@ -208,6 +314,14 @@ def search_chunked(query: str, limit: int = 10) -> list[dict]:
     return search.search_chunks(query, limit)
 
 
+def iter_search_chunked(query: str, limit: int = 10) -> Iterator[dict]:
+    movies = load_movies()
+    search = ChunkedSemanticSearch()
+    search.load_or_create_chunk_embeddings(movies)
+
+    yield from search.iter_search_chunks(query, limit)
+
+
 def embed_chunks():
     movies = load_movies()
     search = ChunkedSemanticSearch()
@@ -288,6 +402,14 @@ def fixed_size_chunking(
     return chunks
 
 
+def iter_search_command(query: str, limit: int) -> Iterator[dict]:
+    semantic_search = SemanticSearch()
+    movies = load_movies()
+    semantic_search.load_or_create_embeddings(movies)
+
+    yield from semantic_search.iter_search(query, limit)
+
+
 def search_command(query: str, limit: int):
     semantic_search = SemanticSearch()
     movies = load_movies()
@@ -305,6 +427,17 @@ def search_command(query: str, limit: int):
         print()
 
 
+def cosine_similarities(matrix: np.ndarray, vec: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1) * np.linalg.norm(vec)
+    dot_products = matrix @ vec
+    return np.divide(
+        dot_products,
+        norms,
+        out=np.zeros_like(dot_products),
+        where=norms != 0,
+    )
+
+
 def cosine_similarity(vec1, vec2) -> float:
     dot_product = np.dot(vec1, vec2)
     norm1 = np.linalg.norm(vec1)
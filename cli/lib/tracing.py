@@ -0,0 +1,208 @@
+import argparse
+import contextvars
+import functools
+import inspect
+import json
+import sys
+import threading
+import time
+from concurrent.futures import Executor, Future
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Iterator, Optional
+
+from lib.search_utils import TRACE_MAX_SPANS, TRACE_METRIC_PREFIX
+
+NULL_SPAN = nullcontext()
+PROFILE_FORMATS = ["table", "json", "prometheus"]
+
+
+class Tracer:
+    def __init__(self, max_spans: int = TRACE_MAX_SPANS):
+        self.enabled = False
+        self.max_spans = max_spans
+        self.lock = threading.Lock()
+        self.current: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar(
+            "current_span", default=None
+        )
+        self.reset()
+
+    def reset(self) -> None:
+        with self.lock:
+            self.spans: list[dict] = []
+            self.stages: dict[str, dict] = {}
+            self.dropped = 0
+            self.origin = time.perf_counter()
+
+    def enable(self) -> None:
+        self.reset()
+        self.enabled = True
+
+    def disable(self) -> None:
+        self.enabled = False
+
+    def span(self, name: str, **attributes):
+        if not self.enabled:
+            return NULL_SPAN
+        return self.__record(name, attributes)
+
+    @contextmanager
+    def __record(self, name: str, attributes: dict) -> Iterator[None]:
+        parent = self.current.get()
+        token = self.current.set(name)
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            end = time.perf_counter()
+            self.current.reset(token)
+            self.__add(name, parent, start, end, attributes)
+
+    def __add(
+        self, name: str, parent: Optional[str], start: float, end: float, attributes: dict
+    ) -> None:
+        duration_ms = (end - start) * 1000
+        with self.lock:
+            stage = self.stages.get(name)
+            if stage is None:
+                stage = {"count": 0, "total_ms": 0.0, "max_ms": 0.0}
+                self.stages[name] = stage
+            stage["count"] += 1
+            stage["total_ms"] += duration_ms
+            stage["max_ms"] = max(stage["max_ms"], duration_ms)
+
+            if len(self.spans) >= self.max_spans:
+                self.dropped += 1
+                return
+            self.spans.append(
+                {
+                    "name": name,
+                    "parent": parent,
+                    "start_ms": (start - self.origin) * 1000,
+                    "duration_ms": duration_ms,
+                    "thread": threading.current_thread().name,
+                    **attributes,
+                }
+            )
+
+    def summary(self) -> dict[str, dict]:
+        with self.lock:
+            return {
+                name: {**stage, "mean_ms": stage["total_ms"] / stage["count"]}
+                for name, stage in self.stages.items()
+            }
+
+    def to_json(self) -> dict:
+        with self.lock:
+            spans = list(self.spans)
+            dropped = self.dropped
+        return {"stages": self.summary(), "spans": spans, "dropped_spans": dropped}
+
+    def to_prometheus(self, prefix: str = TRACE_METRIC_PREFIX) -> str:
+        metric = f"{prefix}_stage_duration_seconds"
+        lines = [
+            f"# HELP {metric} Time spent in each search pipeline stage.",
+            f"# TYPE {metric} summary",
+        ]
+        stages = self.summary()
+        for name, stage in stages.items():
+            lines.append(f'{metric}_sum{{stage="{name}"}} {stage["total_ms"] / 1000:.6f}')
+            lines.append(f'{metric}_count{{stage="{name}"}} {stage["count"]}')
+        lines.append(f"# HELP {prefix}_stage_duration_max_seconds Slowest single call per stage.")
+        lines.append(f"# TYPE {prefix}_stage_duration_max_seconds gauge")
+        for name, stage in stages.items():
+            lines.append(
+                f'{prefix}_stage_duration_max_seconds{{stage="{name}"}} {stage["max_ms"] / 1000:.6f}'
+            )
+        return "\n".join(lines) + "\n"
+
+    def format_breakdown(self) -> str:
+        stages = self.summary()
+        if not stages:
+            return "No spans recorded"
+
+        wall_ms = stages["total"]["total_ms"] if "total" in stages else None
+        lines = [
+            f"{'Stage':<28} {'Calls':>6} {'Total ms':>10} {'Mean ms':>10} {'Max ms':>10} {'% wall':>7}"
+        ]
+        for name, stage in sorted(
+            stages.items(), key=lambda item: item[1]["total_ms"], reverse=True
+        ):
+            share = f"{stage['total_ms'] / wall_ms:.1%}" if wall_ms else "-"
+            lines.append(
+                f"{name:<28} {stage['count']:>6} {stage['total_ms']:>10.1f} {stage['mean_ms']:>10.2f} {stage['max_ms']:>10.1f} {share:>7}"
+            )
+        return "\n".join(lines)
+
+
+tracer = Tracer()
+
+
+def span(name: str, **attributes):
+    return tracer.span(name, **attributes)
+
+
+def submit_in_context(executor: Executor, fn: Callable, *args, **kwargs) -> Future:
+    return executor.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+def traced(name: str) -> Callable:
+    def decorate(fn: Callable) -> Callable:
+        if inspect.iscoroutinefunction(fn):
+
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with tracer.span(name):
+                    return await fn(*args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not tracer.enabled:
+                return fn(*args, **kwargs)
+            with tracer.span(name):
+                return fn(*args, **kwargs)
+
+        return wrapper
+
+    return decorate
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print a per-stage latency breakdown to stderr",
+    )
+    parser.add_argument(
+        "--profile-format",
+        type=str,
+        choices=PROFILE_FORMATS,
+        default="table",
+        help="Profile output format",
+    )
+
+
+def export_profile(profile_format: str = "table") -> str:
+    match profile_format:
+        case "json":
+            return json.dumps(tracer.to_json(), indent=2)
+        case "prometheus":
+            return tracer.to_prometheus()
+        case _:
+            return tracer.format_breakdown()
+
+
+@contextmanager
+def profiled(args: argparse.Namespace) -> Iterator[None]:
+    if not getattr(args, "profile", False):
+        yield
+        return
+
+    tracer.enable()
+    try:
+        with tracer.span("total"):
+            yield
+    finally:
+        tracer.disable()
+        print(export_profile(args.profile_format), file=sys.stderr)
@@ -0,0 +1,388 @@
+import os
+import pickle
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import product
+from typing import Optional
+
+import numpy as np
+from lib.hybrid_search import (HybridSearch, combine_search_results,
+                               normalize_score_array,
+                               rrf_combine_search_results)
+from lib.search_utils import (CACHE_DIR, MOVIES_PATH, SearchHits,
+                              load_golden_dataset, load_movies)
+
+LEG_CACHE_PATH = os.path.join(CACHE_DIR, "tuning_legs.pkl")
+INDEX_ARTIFACTS = (
+    "bm25_postings.npz",
+    "bm25_vocabulary.json",
+    "chunk_embeddings.npy",
+    "chunk_metadata.json",
+)
+
+
+def index_fingerprint() -> list:
+    fingerprint = []
+    for path in [MOVIES_PATH] + [os.path.join(CACHE_DIR, name) for name in INDEX_ARTIFACTS]:
+        try:
+            stat = os.stat(path)
+            fingerprint.append((os.path.basename(path), stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            fingerprint.append((os.path.basename(path), None, None))
+    return fingerprint
+
+
+def collect_leg_rankings(
+    documents: list[dict],
+    test_cases: list[dict],
+    max_depth: int,
+    refresh: bool = False,
+    depths: Optional[list[int]] = None,
+) -> dict:
+    depths = sorted(set(depths or []) | {max_depth})
+    max_depth = depths[-1]
+    signature = {
+        "queries": [test_case["query"] for test_case in test_cases],
+        "num_docs": len(documents),
+        "index": index_fingerprint(),
+    }
+
+    if not refresh and os.path.exists(LEG_CACHE_PATH):
+        with open(LEG_CACHE_PATH, "rb") as f:
+            cached = pickle.load(f)
+        if (
+            cached.get("signature") == signature
+            and cached.get("max_depth", 0) >= max_depth
+            and set(depths) <= set(cached.get("semantic_ms_by_depth", {}))
+        ):
+            cached["cached"] = True
+            return cached
+
+    hybrid_search = HybridSearch(documents)
+    signature["index"] = index_fingerprint()
+
+    title_to_indices: dict[str, list[int]] = {}
+    for idx in range(len(hybrid_search.store)):
+        title_to_indices.setdefault(hybrid_search.store.title(idx), []).append(idx)
+
+    query_texts = signature["queries"]
+
+    def bm25_leg(query: str) -> tuple[list, float]:
+        start = time.perf_counter()
+        postings = hybrid_search.idx.query_postings(query)
+        return postings, (time.perf_counter() - start) * 1000
+
+    def semantic_legs() -> tuple[list[SearchHits], dict[int, float]]:
+        timings = {}
+        for depth in depths:
+            start = time.perf_counter()
+            hits = hybrid_search.semantic_search.search_chunk_hits_batch(
+                query_texts, depth
+            )
+            timings[depth] = (
+                (time.perf_counter() - start) * 1000 / max(len(query_texts), 1)
+            )
+        return hits, timings
+
+    with ThreadPoolExecutor() as pool:
+        semantic_future = pool.submit(semantic_legs)
+        bm25_legs = list(pool.map(bm25_leg, query_texts))
+        semantic_hits, semantic_ms_by_depth = semantic_future.result()
+    semantic_ms = semantic_ms_by_depth[max_depth]
+
+    queries = []
+    for test_case, (postings, bm25_ms), semantic in zip(
+        test_cases, bm25_legs, semantic_hits
+    ):
+        relevant = []
+        for title in test_case["relevant_docs"]:
+            relevant.extend(title_to_indices.get(title, []))
+
+        queries.append(
+            {
+                "query": test_case["query"],
+                "relevant": np.array(sorted(set(relevant)), dtype=np.int32),
+                "num_relevant": len(test_case["relevant_docs"]),
+                "relevant_titles": list(test_case["relevant_docs"]),
+                "bm25_postings": postings,
+                "semantic_indices": semantic.indices,
+                "semantic_scores": semantic.scores,
+                "bm25_ms": bm25_ms,
+                "semantic_ms": semantic_ms,
+            }
+        )
+
+    cached = {
+        "signature": signature,
+        "max_depth": max_depth,
+        "titles": [hybrid_search.store.title(idx) for idx in range(len(hybrid_search.store))],
+        "doc_lengths": hybrid_search.idx.doc_lengths.copy(),
+        "avg_doc_length": hybrid_search.idx.avg_doc_length(),
+        "semantic_ms_by_depth": semantic_ms_by_depth,
+        "queries": queries,
+    }
+
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    with open(LEG_CACHE_PATH, "wb") as f:
+        pickle.dump(cached, f)
+
+    cached["cached"] = False
+    return cached
+
+
+def bm25_param_rankings(
+    postings: list[tuple[np.ndarray, np.ndarray, float]],
+    doc_lengths: np.ndarray,
+    avg_doc_length: float,
+    params: list[tuple[float, float]],
+    depth: int,
+) -> list[SearchHits]:
+    non_empty = [p for p in postings if len(p[0]) > 0]
+    if not non_empty or avg_doc_length == 0:
+        empty = SearchHits(np.empty(0, dtype=np.int32), np.empty(0))
+        return [empty] * len(params)
+
+    candidates = np.unique(np.concatenate([docs for docs, _, _ in non_empty]))
+    k1 = np.array([p[0] for p in params])[:, None]
+    b = np.array([p[1] for p in params])[:, None]
+
+    scores = np.zeros((len(params), candidates.size))
+    for docs, tfs, idf in non_empty:
+        length_norm = 1 - b + b * (doc_lengths[docs][None, :] / avg_doc_length)
+        bm25_tf = (tfs[None, :] * (k1 + 1)) / (tfs[None, :] + k1 * length_norm)
+        scores[:, np.searchsorted(candidates, docs)] += bm25_tf * idf
+
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :depth]
+    return [
+        SearchHits(candidates[row].astype(np.int32), scores[i, row])
+        for i, row in enumerate(order)
+    ]
+
+
+def rank_matrix(union: np.ndarray, hits: SearchHits) -> np.ndarray:
+    ranks = np.zeros(union.size)
+    ranks[np.searchsorted(union, hits.indices)] = np.arange(1, hits.indices.size + 1)
+    return ranks
+
+
+def score_vector(union: np.ndarray, hits: SearchHits) -> np.ndarray:
+    scores = np.zeros(union.size)
+    scores[np.searchsorted(union, hits.indices)] = normalize_score_array(hits.scores)
+    return scores
+
+
+def rrf_sweep(
+    bm25: SearchHits, semantic: SearchHits, k_values: np.ndarray, limit: int
+) -> tuple[np.ndarray, np.ndarray]:
+    union = np.union1d(bm25.indices, semantic.indices)
+    bm25_ranks = rank_matrix(union, bm25)
+    semantic_ranks = rank_matrix(union, semantic)
+
+    k = k_values[:, None]
+    scores = np.where(bm25_ranks > 0, 1 / (bm25_ranks + k), 0.0)
+    scores += np.where(semantic_ranks > 0, 1 / (semantic_ranks + k), 0.0)
+
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :limit]
+    return union, order
+
+
+def weighted_sweep(
+    bm25: SearchHits, semantic: SearchHits, alphas: np.ndarray, limit: int
+) -> tuple[np.ndarray, np.ndarray]:
+    union = np.union1d(bm25.indices, semantic.indices)
+    bm25_scores = score_vector(union, bm25)
+    semantic_scores = score_vector(union, semantic)
+
+    alpha = alphas[:, None]
+    scores = alpha * bm25_scores + (1 - alpha) * semantic_scores
+
+    order = np.argsort(-scores, axis=1, kind="stable")[:, :limit]
+    return union, order
+
+
+def ranking_metrics(
+    ranked: np.ndarray, relevant: np.ndarray, num_relevant: int, limit: int
+) -> dict[str, np.ndarray]:
+    hits = np.isin(ranked, relevant)
+    hit_count = hits.sum(axis=1)
+
+    precision = hit_count / limit
+    recall = hit_count / num_relevant if num_relevant else np.zeros(len(ranked))
+    denominator = precision + recall
+    f1 = np.divide(
+        2 * precision * recall,
+        denominator,
+        out=np.zeros_like(denominator),
+        where=denominator > 0,
+    )
+
+    first_hit = np.where(hits.any(axis=1), hits.argmax(axis=1) + 1, 0)
+    mrr = np.divide(
+        1.0, first_hit, out=np.zeros(len(ranked)), where=first_hit > 0
+    )
+
+    discounts = 1 / np.log2(np.arange(2, hits.shape[1] + 2))
+    dcg = (hits * discounts).sum(axis=1)
+    ideal = discounts[: min(num_relevant, hits.shape[1])].sum()
+    ndcg = dcg / ideal if ideal > 0 else np.zeros(len(ranked))
+
+    return {
+        "precision": precision,
+        "recall": recall,
+        "f1": f1,
+        "mrr": mrr,
+        "ndcg": ndcg,
+    }
+
+
+def config_latency_ms(
+    legs: dict,
+    params: list[tuple[float, float]],
+    depths: list[int],
+    k: int,
+    alpha: float,
+) -> dict[tuple, float]:
+    samples: dict[tuple, list[float]] = {}
+    for depth in depths:
+        for q in legs["queries"]:
+            semantic = SearchHits(
+                q["semantic_indices"][:depth], q["semantic_scores"][:depth]
+            )
+            for k1, b in params:
+                start = time.perf_counter()
+                bm25 = bm25_param_rankings(
+                    q["bm25_postings"],
+                    legs["doc_lengths"],
+                    legs["avg_doc_length"],
+                    [(k1, b)],
+                    depth,
+                )[0]
+                scored = time.perf_counter()
+                rrf_combine_search_results(bm25, semantic, k)
+                fused_rrf = time.perf_counter()
+                combine_search_results(bm25, semantic, alpha)
+                fused_weighted = time.perf_counter()
+
+                base_ms = q["bm25_ms"] + legs["semantic_ms_by_depth"][depth]
+                scoring_ms = (scored - start) * 1000
+                samples.setdefault(("rrf", k1, b, depth), []).append(
+                    base_ms + scoring_ms + (fused_rrf - scored) * 1000
+                )
+                samples.setdefault(("weighted", k1, b, depth), []).append(
+                    base_ms + scoring_ms + (fused_weighted - fused_rrf) * 1000
+                )
+    return {key: float(np.median(values)) for key, values in samples.items()}
+
+
+def sweep(
+    legs: dict,
+    limit: int,
+    depths: list[int],
+    k_values: list[int],
+    alphas: list[float],
+    k1_values: list[float],
+    b_values: list[float],
+) -> list[dict]:
+    queries = legs["queries"]
+    if not queries:
+        return []
+
+    params = list(product(k1_values, b_values))
+    k_array = np.array(k_values, dtype=np.float64)
+    alpha_array = np.array(alphas, dtype=np.float64)
+    max_depth = max(depths)
+
+    totals: dict[tuple, dict[str, float]] = {}
+
+    def accumulate(key: tuple, metrics: dict[str, np.ndarray], row: int) -> None:
+        entry = totals.setdefault(key, {name: 0.0 for name in metrics})
+        for name, values in metrics.items():
+            entry[name] += float(values[row])
+
+    for q in queries:
+        bm25_rankings = bm25_param_rankings(
+            q["bm25_postings"],
+            legs["doc_lengths"],
+            legs["avg_doc_length"],
+            params,
+            max_depth,
+        )
+        for depth in depths:
+            semantic = SearchHits(
+                q["semantic_indices"][:depth], q["semantic_scores"][:depth]
+            )
+            for (k1, b), ranking in zip(params, bm25_rankings):
+                bm25 = SearchHits(ranking.indices[:depth], ranking.scores[:depth])
+
+                union, order = rrf_sweep(bm25, semantic, k_array, limit)
+                metrics = ranking_metrics(
+                    union[order], q["relevant"], q["num_relevant"], limit
+                )
+                for row, k in enumerate(k_values):
+                    accumulate(("rrf", k1, b, k, depth), metrics, row)
+
+                union, order = weighted_sweep(bm25, semantic, alpha_array, limit)
+                metrics = ranking_metrics(
+                    union[order], q["relevant"], q["num_relevant"], limit
+                )
+                for row, alpha in enumerate(alphas):
+                    accumulate(("weighted", k1, b, alpha, depth), metrics, row)
+
+    latency_ms = config_latency_ms(legs, params, depths, k_values[0], alphas[0])
+
+    rows = []
+    for (method, k1, b, value, depth), metrics in totals.items():
+        row = {
+            "method": method,
+            "k1": k1,
+            "b": b,
+            "k" if method == "rrf" else "alpha": value,
+            "depth": depth,
+            "latency_ms": latency_ms[(method, k1, b, depth)],
+        }
+        for name, total in metrics.items():
+            row[name] = total / len(queries)
+        rows.append(row)
+    return rows
+
+
+def pareto_front(rows: list[dict], metric: str = "f1") -> list[dict]:
+    quality = np.array([row[metric] for row in rows])
+    depth = np.array([row["depth"] for row in rows])
+    latency = np.array([row["latency_ms"] for row in rows])
+
+    front = []
+    for i, row in enumerate(rows):
+        no_worse = (
+            (quality >= quality[i]) & (depth <= depth[i]) & (latency <= latency[i])
+        )
+        better = (quality > quality[i]) | (depth < depth[i]) | (latency < latency[i])
+        if not np.any(no_worse & better):
+            front.append(row)
+
+    return sorted(front, key=lambda x: (-x[metric], x["depth"], x["latency_ms"]))
+
+
+def tune_command(
+    limit: int,
+    depths: list[int],
+    k_values: list[int],
+    alphas: list[float],
+    k1_values: list[float],
+    b_values: list[float],
+    metric: str = "f1",
+    refresh: bool = False,
+) -> dict:
+    movies = load_movies()
+    test_cases = load_golden_dataset()["test_cases"]
+
+    legs = collect_leg_rankings(movies, test_cases, max(depths), refresh, depths)
+    rows = sweep(legs, limit, depths, k_values, alphas, k1_values, b_values)
+
+    return {
+        "test_cases_count": len(test_cases),
+        "limit": limit,
+        "metric": metric,
+        "configurations": len(rows),
+        "pareto_front": pareto_front(rows, metric),
+    }
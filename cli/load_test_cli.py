@@ -0,0 +1,103 @@
+import argparse
+import json
+
+from lib.load_testing import load_test_command
+from lib.search_utils import (DEFAULT_SEARCH_LIMIT, LOAD_TEST_CONCURRENCY,
+                              LOAD_TEST_DURATION_SECONDS, LOAD_TEST_LLM_LATENCY,
+                              LOAD_TEST_PIPELINES, LOAD_TEST_QPS,
+                              LOAD_TEST_VARIANTS)
+from lib.tracing import add_profile_arguments, profiled
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load Testing CLI")
+    parser.add_argument(
+        "--pipelines",
+        type=str,
+        nargs="+",
+        choices=["bm25", "rrf", "rrf_cross_encoder", "rrf_llm_rerank", "rag"],
+        default=LOAD_TEST_PIPELINES,
+        help="Pipeline configurations to drive",
+    )
+    parser.add_argument(
+        "--mode",
+        type=str,
+        choices=["open", "closed"],
+        default="open",
+        help="Open loop (Poisson arrivals at --qps) or closed loop (--concurrency workers)",
+    )
+    parser.add_argument(
+        "--qps", type=float, default=LOAD_TEST_QPS, help="Target arrival rate"
+    )
+    parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=LOAD_TEST_CONCURRENCY,
+        help="Closed-loop worker count",
+    )
+    parser.add_argument(
+        "--duration",
+        type=float,
+        default=LOAD_TEST_DURATION_SECONDS,
+        help="Seconds to drive each pipeline",
+    )
+    parser.add_argument(
+        "--query-log",
+        type=str,
+        help="Query log to replay (one query or JSON object per line)",
+    )
+    parser.add_argument(
+        "--variants",
+        type=int,
+        default=LOAD_TEST_VARIANTS,
+        help="Synthetic variants per golden dataset query",
+    )
+    parser.add_argument(
+        "--llm-latency",
+        type=float,
+        default=LOAD_TEST_LLM_LATENCY,
+        help="Seconds the fake LLM waits per request",
+    )
+    parser.add_argument(
+        "--limit", type=int, default=DEFAULT_SEARCH_LIMIT, help="Results per query"
+    )
+    parser.add_argument("--output", type=str, help="Path to write JSON results")
+    add_profile_arguments(parser)
+
+    args = parser.parse_args()
+    with profiled(args):
+        results = load_test_command(
+            args.pipelines,
+            args.mode,
+            args.qps,
+            args.concurrency,
+            args.duration,
+            args.query_log,
+            args.variants,
+            args.llm_latency,
+            args.limit,
+        )
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    print(
+        f"{results['mode'].capitalize()} loop, {results['queries']} replay queries, {results['duration_seconds']:.0f}s per pipeline"
+    )
+    print()
+    for name, summary in results["results"].items():
+        print(f"- {name}")
+        print(
+            f"  - requests: {summary['requests']}, throughput: {summary['throughput_qps']:.1f} qps, errors: {summary['errors']} ({summary['error_rate']:.1%})"
+        )
+        if "latency_p50_ms" in summary:
+            print(
+                f"  - latency p50: {summary['latency_p50_ms']:.1f}ms, p95: {summary['latency_p95_ms']:.1f}ms, p99: {summary['latency_p99_ms']:.1f}ms, max: {summary['latency_max_ms']:.1f}ms"
+            )
+        for error, count in summary["error_types"].items():
+            print(f"  - {error}: {count}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,9 @@
 import argparse
 
-from lib.multimodal_search import image_search_command, verify_image_embedding
+from lib.multimodal_search import (batch_image_search_command,
+                                   image_search_command, verify_image_embedding)
+from lib.search_utils import IMAGE_BATCH_SIZE, IMAGE_DECODE_WORKERS, write_jsonl
+from lib.tracing import add_profile_arguments, profiled
 
 
 def main():
@@ -13,14 +16,43 @@ def main():
     image_search_parser = subparsers.add_parser("image_search", help="Search from image")
     image_search_parser.add_argument("image_path", type=str, help="The path of the image")
 
+    batch_image_search_parser = subparsers.add_parser(
+        "batch_image_search", help="Search from every image in a directory or manifest"
+    )
+    batch_image_search_parser.add_argument(
+        "source", type=str, help="Image directory or manifest file (one path per line)"
+    )
+    batch_image_search_parser.add_argument(
+        "--limit", type=int, default=5, help="Number of results per image"
+    )
+    batch_image_search_parser.add_argument(
+        "--batch-size", type=int, default=IMAGE_BATCH_SIZE, help="Images per CLIP batch"
+    )
+    batch_image_search_parser.add_argument(
+        "--workers", type=int, default=IMAGE_DECODE_WORKERS, help="Image decode threads"
+    )
+
+    add_profile_arguments(parser)
+
     args = parser.parse_args()
 
+    with profiled(args):
+        run(args, parser)
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
     match args.command:
         case "image_search":
             results = image_search_command(args.image_path)
             for i, result in enumerate(results, 1):
                 print(f"{i}. {result['title']} (similarity: {result['similarity_score']:.3f})") 
                 print(f"   {result['description'][:100]}")
+        case "batch_image_search":
+            write_jsonl(
+                batch_image_search_command(
+                    args.source, args.limit, args.batch_size, args.workers
+                )
+            )
         case "verify_image_embedding":
             verify_image_embedding(args.image_path)
         case _:
@@ -2,9 +2,12 @@ import argparse
 
 from lib.search_utils import (DEFAULT_CHUNK_OVERLAP, DEFAULT_CHUNK_SIZE,
                               DEFAULT_MAX_CHUNK_SIZE)
-from lib.semantic_search import (chunk_text, embed_chunks, embed_query_text, embed_text, search_chunked,
+from lib.search_utils import write_jsonl
+from lib.semantic_search import (chunk_text, embed_chunks, embed_query_text, embed_text,
+                                 iter_search_chunked, iter_search_command, search_chunked,
                                  search_command, semantic_chunk_text, verify_embeddings,
                                  verify_model)
+from lib.tracing import add_profile_arguments, profiled
 
 
 def main():
@@ -36,6 +39,13 @@ def main():
     search_parser.add_argument(
         "--limit", type=int, default=5, help="How many results to return"
     )
+    search_parser.add_argument(
+        "--format",
+        type=str,
+        choices=["text", "jsonl"],
+        default="text",
+        help="Output format (jsonl streams one result per line)",
+    )
 
     chunk_parser = subparsers.add_parser("chunk", help="Chunk the input text")
     chunk_parser.add_argument("text", type=str, help="The text to chunk")
@@ -71,12 +81,30 @@ def main():
     search_chunked_parser = subparsers.add_parser("search_chunked", help="Search chunked content")
     search_chunked_parser.add_argument("query", type=str, help="The query to search")
     search_chunked_parser.add_argument("--limit", type=int, default=10, help="An optional limit to results")
+    search_chunked_parser.add_argument(
+        "--format",
+        type=str,
+        choices=["text", "jsonl"],
+        default="text",
+        help="Output format (jsonl streams one result per line)",
+    )
+
 
+    add_profile_arguments(parser)
 
     args = parser.parse_args()
 
+    with profiled(args):
+        run(args, parser)
+
+
+def run(args: argparse.Namespace, parser: argparse.ArgumentParser) -> None:
     match args.command:
         case "search_chunked":
+            if args.format == "jsonl":
+                write_jsonl(iter_search_chunked(args.query, args.limit))
+                return
+
             results = search_chunked(args.query, args.limit)
             for i, result in enumerate(results, 1):
                 description = result["document"][:100]
@@ -90,6 +118,10 @@ def main():
         case "chunk":
             chunk_text(args.text, args.chunk_size, args.overlap)
         case "search":
+            if args.format == "jsonl":
+                write_jsonl(iter_search_command(args.query, args.limit))
+                return
+
             search_command(args.query, args.limit)
         case "embedquery":
             embed_query_text(args.query)
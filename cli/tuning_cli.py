@@ -0,0 +1,93 @@
+import argparse
+
+from lib.search_utils import BM25_B, BM25_K1, DEFAULT_K_VALUE
+from lib.tracing import add_profile_arguments, profiled
+from lib.tuning import tune_command
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fusion Tuning CLI")
+    parser.add_argument(
+        "--limit", type=int, default=5, help="Number of results to evaluate"
+    )
+    parser.add_argument(
+        "--depths",
+        type=int,
+        nargs="+",
+        default=[25, 50, 100, 250, 500],
+        help="Per-leg candidate depths to sweep",
+    )
+    parser.add_argument(
+        "--k-values",
+        type=int,
+        nargs="+",
+        default=[10, 20, 40, DEFAULT_K_VALUE, 80, 120],
+        help="RRF k values to sweep",
+    )
+    parser.add_argument(
+        "--alphas",
+        type=float,
+        nargs="+",
+        default=[0.1, 0.3, 0.5, 0.7, 0.9],
+        help="Weighted search alpha values to sweep",
+    )
+    parser.add_argument(
+        "--k1-values",
+        type=float,
+        nargs="+",
+        default=[1.2, BM25_K1, 2.0],
+        help="BM25 k1 values to sweep",
+    )
+    parser.add_argument(
+        "--b-values",
+        type=float,
+        nargs="+",
+        default=[0.5, BM25_B, 0.9],
+        help="BM25 b values to sweep",
+    )
+    parser.add_argument(
+        "--metric",
+        type=str,
+        choices=["precision", "recall", "f1", "mrr", "ndcg"],
+        default="f1",
+        help="Quality metric for the Pareto front",
+    )
+    parser.add_argument(
+        "--refresh", action="store_true", help="Re-run retrieval legs"
+    )
+
+    add_profile_arguments(parser)
+
+    args = parser.parse_args()
+    with profiled(args):
+        results = tune_command(
+            args.limit,
+            args.depths,
+            args.k_values,
+            args.alphas,
+            args.k1_values,
+            args.b_values,
+            args.metric,
+            args.refresh,
+        )
+
+    print(
+        f"Swept {results['configurations']} configurations over {results['test_cases_count']} queries (k={args.limit})"
+    )
+    print(f"Pareto front ({args.metric} vs depth vs latency):")
+    print()
+    for row in results["pareto_front"]:
+        if row["method"] == "rrf":
+            setting = f"rrf k={row['k']}"
+        else:
+            setting = f"weighted alpha={row['alpha']:.2f}"
+        print(
+            f"- {setting}, k1={row['k1']:.2f}, b={row['b']:.2f}, depth={row['depth']}"
+        )
+        print(
+            f"  - {args.metric}: {row[args.metric]:.4f}, latency: {row['latency_ms']:.1f}ms"
+        )
+
+
+if __name__ == "__main__":
+    main()